@@ -0,0 +1,113 @@
+import bisect
+import datetime
+from django.db.models import Q
+from django.utils import timezone
+
+class IntervalIndex:
+    """
+    One resource's busy time as sorted, merged [start, end) intervals held
+    in two parallel lists, so overlap checks and free-slot searches bisect
+    instead of scanning.
+    """
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start, end):
+        """Mark [start, end) busy, merging it with any intervals it touches"""
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def is_free(self, start, end):
+        i = bisect.bisect_right(self.ends, start)
+        return i == len(self.starts) or self.starts[i] >= end
+
+    def first_free(self, start, duration):
+        """Earliest t >= start with [t, t + duration) free"""
+        i = bisect.bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < start + duration:
+            start = max(start, self.ends[i])
+            i += 1
+        return start
+
+class LabAvailability:
+    """
+    Busy intervals of every technician and piece of equipment between two
+    times, loaded from LabSchedule with one query. Intervals use the real
+    duration_minutes and are indexed per resource across day boundaries,
+    so a slot that runs past midnight still blocks the next morning.
+    book() records new schedules, letting callers place many tests against
+    one snapshot. LabSchedule stores UTC wall-clock dates and times.
+    """
+    # Loaded schedules may start this long before the window and still overlap it
+    MAX_DURATION = datetime.timedelta(days=1)
+
+    def __init__(self):
+        self.technicians = {}
+        self.equipment = {}
+
+    @classmethod
+    def load(cls, start, end, lab_department=None):
+        """Schedules overlapping [start, end), optionally only one lab department's"""
+        from .models import LabSchedule
+        availability = cls()
+        start, end = cls.naive(start), cls.naive(end)
+        schedules = LabSchedule.objects.filter(
+            scheduled_date__range=[(start - cls.MAX_DURATION).date(), end.date()]
+        )
+        if lab_department is not None:
+            schedules = schedules.filter(
+                Q(technician__lab_department=lab_department) | Q(equipment__lab_department=lab_department)
+            )
+        rows = schedules.values_list('technician_id', 'equipment_id', 'scheduled_date', 'scheduled_time', 'duration_minutes')
+        for technician_id, equipment_id, scheduled_date, scheduled_time, duration_minutes in rows:
+            slot_start = datetime.datetime.combine(scheduled_date, scheduled_time)
+            availability._book(technician_id, equipment_id, slot_start, datetime.timedelta(minutes=duration_minutes))
+        return availability
+
+    @staticmethod
+    def naive(value):
+        return timezone.make_naive(value, datetime.timezone.utc) if timezone.is_aware(value) else value
+
+    @staticmethod
+    def aware(value):
+        return timezone.make_aware(value, datetime.timezone.utc)
+
+    def technician_free(self, technician_id, start, duration_minutes):
+        start = self.naive(start)
+        index = self.technicians.get(technician_id)
+        return index is None or index.is_free(start, start + datetime.timedelta(minutes=duration_minutes))
+
+    def equipment_free(self, equipment_id, start, duration_minutes):
+        start = self.naive(start)
+        index = self.equipment.get(equipment_id)
+        return index is None or index.is_free(start, start + datetime.timedelta(minutes=duration_minutes))
+
+    def first_free_slot(self, technician_id, equipment_id, start, duration_minutes):
+        """Earliest aware time >= start at which the technician and equipment (if any) are both free"""
+        start = self.naive(start)
+        duration = datetime.timedelta(minutes=duration_minutes)
+        indexes = [
+            index for index in (self.technicians.get(technician_id), self.equipment.get(equipment_id))
+            if index is not None
+        ]
+        while True:
+            candidate = start
+            for index in indexes:
+                candidate = index.first_free(candidate, duration)
+            if candidate == start:
+                return self.aware(start)
+            start = candidate
+
+    def book(self, technician_id, equipment_id, start, duration_minutes):
+        self._book(technician_id, equipment_id, self.naive(start), datetime.timedelta(minutes=duration_minutes))
+
+    def _book(self, technician_id, equipment_id, start, duration):
+        self.technicians.setdefault(technician_id, IntervalIndex()).add(start, start + duration)
+        if equipment_id is not None:
+            self.equipment.setdefault(equipment_id, IntervalIndex()).add(start, start + duration)
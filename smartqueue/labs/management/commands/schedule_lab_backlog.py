@@ -0,0 +1,35 @@
+import datetime
+from django.core.management.base import BaseCommand
+from labs.models import LabDepartment
+from labs.services import LabManagementService
+
+class Command(BaseCommand):
+    help = 'Pack ordered lab tests into technician/equipment slots, earliest deadline first'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--department',
+            action='append',
+            help='Lab department name to schedule (repeatable, default: all active departments)'
+        )
+        parser.add_argument(
+            '--horizon-hours',
+            type=int,
+            default=24,
+            help='How far ahead to place tests'
+        )
+    
+    def handle(self, *args, **options):
+        service = LabManagementService()
+        departments = LabDepartment.objects.filter(is_active=True)
+        if options['department']:
+            departments = departments.filter(name__in=options['department'])
+        horizon = datetime.timedelta(hours=options['horizon_hours'])
+        
+        for lab_department in departments:
+            scheduled, unscheduled = service.schedule_backlog(lab_department, horizon=horizon)
+            self.stdout.write(
+                f'{lab_department.name}: scheduled {len(scheduled)}, left unscheduled {len(unscheduled)}'
+            )
+        
+        self.stdout.write(self.style.SUCCESS('Lab backlog scheduling completed'))
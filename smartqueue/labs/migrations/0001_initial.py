@@ -0,0 +1,166 @@
+# Generated by Django 5.1.11 on 2026-10-18 00:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('hospital', '0002_initial'),
+        ('queues', '0002_initial'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabDepartment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('phone_number', models.CharField(blank=True, max_length=15)),
+                ('operating_hours_start', models.TimeField(default='08:00')),
+                ('operating_hours_end', models.TimeField(default='18:00')),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabEquipment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('serial_number', models.CharField(max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('available', 'Available'), ('in_use', 'In Use'), ('maintenance', 'Under Maintenance'), ('out_of_order', 'Out of Order')], default='available', max_length=15)),
+                ('last_maintenance', models.DateTimeField(blank=True, null=True)),
+                ('next_maintenance', models.DateTimeField(blank=True, null=True)),
+                ('lab_department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labdepartment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabTechnician',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(choices=[('hematology', 'Hematology'), ('chemistry', 'Clinical Chemistry'), ('microbiology', 'Microbiology'), ('pathology', 'Pathology'), ('radiology', 'Radiology'), ('cardiology', 'Cardiology'), ('general', 'General Lab')], max_length=20)),
+                ('license_number', models.CharField(max_length=50, unique=True)),
+                ('certification_expiry', models.DateField()),
+                ('is_available', models.BooleanField(default=True)),
+                ('lab_department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labdepartment')),
+                ('staff', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='hospital.staff')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabTest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_type', models.CharField(choices=[('blood_count', 'Complete Blood Count'), ('blood_chemistry', 'Blood Chemistry Panel'), ('urine_analysis', 'Urine Analysis'), ('lipid_panel', 'Lipid Panel'), ('liver_function', 'Liver Function Test'), ('kidney_function', 'Kidney Function Test'), ('thyroid_function', 'Thyroid Function Test'), ('glucose_test', 'Glucose Test'), ('hba1c', 'HbA1c Test'), ('xray_chest', 'Chest X-Ray'), ('xray_bone', 'Bone X-Ray'), ('ct_scan', 'CT Scan'), ('mri_scan', 'MRI Scan'), ('ultrasound', 'Ultrasound'), ('ecg', 'ECG'), ('echo', 'Echocardiogram'), ('culture', 'Culture Test'), ('biopsy', 'Biopsy')], max_length=20)),
+                ('priority', models.CharField(choices=[('routine', 'Routine'), ('urgent', 'Urgent'), ('stat', 'STAT')], default='routine', max_length=10)),
+                ('ordered_at', models.DateTimeField(auto_now_add=True)),
+                ('clinical_notes', models.TextField(blank=True)),
+                ('scheduled_at', models.DateTimeField(blank=True, null=True)),
+                ('estimated_duration', models.IntegerField(default=30)),
+                ('status', models.CharField(choices=[('ordered', 'Ordered'), ('scheduled', 'Scheduled'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('reviewed', 'Reviewed'), ('reported', 'Reported'), ('cancelled', 'Cancelled')], default='ordered', max_length=15)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('reported_at', models.DateTimeField(blank=True, null=True)),
+                ('results', models.TextField(blank=True)),
+                ('normal_ranges', models.JSONField(blank=True, default=dict)),
+                ('abnormal_flags', models.JSONField(blank=True, default=list)),
+                ('queue_reentry', models.BooleanField(default=True)),
+                ('queue_reentry_priority', models.CharField(default='appointment', max_length=15)),
+                ('result_file', models.FileField(blank=True, null=True, upload_to='lab_results/')),
+                ('assigned_technician', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='labs.labtechnician')),
+                ('equipment_used', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='labs.labequipment')),
+                ('lab_department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labdepartment')),
+                ('ordered_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ordered_tests', to='hospital.staff')),
+                ('original_queue_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='queues.queueentry')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.patient')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_tests', to='hospital.staff')),
+            ],
+            options={
+                'ordering': ['-ordered_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LabSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_date', models.DateField()),
+                ('scheduled_time', models.TimeField()),
+                ('duration_minutes', models.IntegerField(default=30)),
+                ('notes', models.TextField(blank=True)),
+                ('equipment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='labs.labequipment')),
+                ('technician', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labtechnician')),
+                ('lab_test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='labs.labtest')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabTestTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('test_type', models.CharField(choices=[('blood_count', 'Complete Blood Count'), ('blood_chemistry', 'Blood Chemistry Panel'), ('urine_analysis', 'Urine Analysis'), ('lipid_panel', 'Lipid Panel'), ('liver_function', 'Liver Function Test'), ('kidney_function', 'Kidney Function Test'), ('thyroid_function', 'Thyroid Function Test'), ('glucose_test', 'Glucose Test'), ('hba1c', 'HbA1c Test'), ('xray_chest', 'Chest X-Ray'), ('xray_bone', 'Bone X-Ray'), ('ct_scan', 'CT Scan'), ('mri_scan', 'MRI Scan'), ('ultrasound', 'Ultrasound'), ('ecg', 'ECG'), ('echo', 'Echocardiogram'), ('culture', 'Culture Test'), ('biopsy', 'Biopsy')], max_length=20)),
+                ('estimated_duration', models.IntegerField(default=30)),
+                ('normal_ranges', models.JSONField(default=dict)),
+                ('instructions', models.TextField(blank=True)),
+                ('preparation_notes', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('lab_department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labdepartment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('total_tests_ordered', models.IntegerField(default=0)),
+                ('tests_completed', models.IntegerField(default=0)),
+                ('tests_pending', models.IntegerField(default=0)),
+                ('tests_overdue', models.IntegerField(default=0)),
+                ('avg_turnaround_time', models.FloatField(default=0.0)),
+                ('avg_processing_time', models.FloatField(default=0.0)),
+                ('stat_tests', models.IntegerField(default=0)),
+                ('urgent_tests', models.IntegerField(default=0)),
+                ('routine_tests', models.IntegerField(default=0)),
+                ('lab_department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='labs.labdepartment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lab_department', 'date'], name='labs_labana_lab_dep_c7826d_idx')],
+                'unique_together': {('lab_department', 'date')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['status'], name='labs_labtes_status_af89f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['priority'], name='labs_labtes_priorit_be20ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['lab_department'], name='labs_labtes_lab_dep_5aebcc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labschedule',
+            index=models.Index(fields=['scheduled_date'], name='labs_labsch_schedul_f34568_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labschedule',
+            index=models.Index(fields=['technician'], name='labs_labsch_technic_9cc4de_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='labschedule',
+            unique_together={('technician', 'scheduled_date', 'scheduled_time')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='labtesttemplate',
+            unique_together={('name', 'test_type', 'lab_department')},
+        ),
+    ]
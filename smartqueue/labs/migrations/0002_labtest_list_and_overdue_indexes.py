@@ -0,0 +1,21 @@
+# Generated by Django 5.1.11 on 2026-10-18 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['patient', '-ordered_at'], name='labs_labtes_patient_225ca3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['status', 'priority', 'ordered_at'], name='labs_labtes_status_a25cd6_idx'),
+        ),
+    ]
@@ -4,6 +4,41 @@ from users.models import Patient
 from hospital.models import Staff, Department
 from queues.models import QueueEntry
 
+# Time from ordering by which a lab test should be completed, per priority
+LAB_TEST_DEADLINES = {
+    'stat': timezone.timedelta(hours=1),
+    'urgent': timezone.timedelta(hours=4),
+    'routine': timezone.timedelta(hours=24),
+}
+
+# Statuses in which a lab test is still awaiting completion and can become overdue
+LAB_TEST_OPEN_STATUSES = ['ordered', 'scheduled', 'in_progress']
+
+class LabTestQuerySet(models.QuerySet):
+    def with_deadline(self):
+        """Annotate each test's deadline (ordered_at plus its priority's allowance) in SQL"""
+        return self.annotate(deadline_at=models.Case(
+            *[
+                models.When(priority=priority, then=models.F('ordered_at') + models.Value(allowance))
+                for priority, allowance in LAB_TEST_DEADLINES.items()
+            ],
+            default=models.F('ordered_at') + models.Value(LAB_TEST_DEADLINES['routine']),
+            output_field=models.DateTimeField()
+        ))
+    
+    def overdue(self, now=None):
+        """
+        Open tests past their deadline. Written as one ordered_at bound per
+        priority rather than a filter on the annotated deadline, so each
+        branch is a range scan on the (status, priority, ordered_at) index.
+        """
+        now = now or timezone.now()
+        timed = [priority for priority in LAB_TEST_DEADLINES if priority != 'routine']
+        condition = models.Q(ordered_at__lt=now - LAB_TEST_DEADLINES['routine']) & ~models.Q(priority__in=timed)
+        for priority in timed:
+            condition |= models.Q(priority=priority, ordered_at__lt=now - LAB_TEST_DEADLINES[priority])
+        return self.filter(condition, status__in=LAB_TEST_OPEN_STATUSES)
+
 class LabDepartment(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -137,12 +172,16 @@ class LabTest(models.Model):
     # File Attachments
     result_file = models.FileField(upload_to='lab_results/', null=True, blank=True)
     
+    objects = LabTestQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-ordered_at']
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['priority']),
             models.Index(fields=['lab_department']),
+            models.Index(fields=['patient', '-ordered_at']),
+            models.Index(fields=['status', 'priority', 'ordered_at']),
         ]
 
     def __str__(self):
@@ -276,23 +315,18 @@ class LabTest(models.Model):
             return self.scheduled_at + timezone.timedelta(minutes=self.estimated_duration)
         return None
     
+    @property
+    def deadline(self):
+        """When the test should be completed: STAT 1h, urgent 4h, routine 24h after ordering"""
+        return self.ordered_at + LAB_TEST_DEADLINES.get(self.priority, LAB_TEST_DEADLINES['routine'])
+    
     @property
     def is_overdue(self):
         """Check if test is overdue"""
-        if self.status in ['completed', 'reviewed', 'reported', 'cancelled']:
+        if self.status not in LAB_TEST_OPEN_STATUSES:
             return False
         
-        if self.priority == 'stat':
-            # STAT tests should be completed within 1 hour
-            deadline = self.ordered_at + timezone.timedelta(hours=1)
-        elif self.priority == 'urgent':
-            # Urgent tests should be completed within 4 hours
-            deadline = self.ordered_at + timezone.timedelta(hours=4)
-        else:
-            # Routine tests should be completed within 24 hours
-            deadline = self.ordered_at + timezone.timedelta(hours=24)
-        
-        return timezone.now() > deadline
+        return timezone.now() > self.deadline
 
 class LabTestTemplate(models.Model):
     """Template for common lab test configurations"""
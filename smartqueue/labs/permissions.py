@@ -36,8 +36,19 @@ class CanViewLabResults(permissions.BasePermission):
     """
     Allows patients to view their own lab results, and staff/admin to view any.
     """
+    STAFF_ROLES = ['doctor', 'nurse', 'staff', 'admin', 'superadmin']
+
     def has_object_permission(self, request, view, obj):
         # obj is LabTest
         if getattr(request.user, 'role', None) == 'patient':
             return obj.patient.user == request.user
-        return getattr(request.user, 'role', None) in ['doctor', 'nurse', 'staff', 'admin', 'superadmin']
\ No newline at end of file
+        return getattr(request.user, 'role', None) in self.STAFF_ROLES
+
+    def filter_queryset(self, request, queryset):
+        """The same rules as has_object_permission, applied as LabTest queryset filters"""
+        role = getattr(request.user, 'role', None)
+        if role == 'patient':
+            return queryset.filter(patient__user=request.user)
+        if role in self.STAFF_ROLES:
+            return queryset
+        return queryset.none()
\ No newline at end of file
@@ -3,6 +3,30 @@ from .models import LabTest, LabDepartment, LabTechnician, LabSchedule, LabEquip
 from users.serializers import PatientSerializer
 from hospital.serializers import StaffSerializer
 
+class DynamicFieldsMixin:
+    """
+    Accepts fields=[...] to render only some fields, and maps each relation
+    it renders to the select_related paths that relation needs
+    (eager_loading), so list views can load a page in one query.
+    """
+    eager_loading = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def related_paths(cls, fields=None, prefix=''):
+        """select_related paths for the given fields (all when None)"""
+        return [
+            prefix + path
+            for name, paths in cls.eager_loading.items()
+            if fields is None or name in fields
+            for path in paths
+        ]
+
 class LabDepartmentSerializer(serializers.ModelSerializer):
     is_open = serializers.ReadOnlyField()
     
@@ -22,7 +46,15 @@ class LabEquipmentSerializer(serializers.ModelSerializer):
         model = LabEquipment
         fields = '__all__'
 
-class LabTestSerializer(serializers.ModelSerializer):
+class LabTestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    eager_loading = {
+        'patient': ['patient__user'],
+        'ordered_by': ['ordered_by__user', 'ordered_by__department'],
+        'assigned_technician': ['assigned_technician__staff__user', 'assigned_technician__staff__department'],
+        'lab_department': ['lab_department'],
+        'equipment_used': ['equipment_used'],
+        'reviewed_by': ['reviewed_by__user', 'reviewed_by__department'],
+    }
     patient = PatientSerializer(read_only=True)
     ordered_by = StaffSerializer(read_only=True)
     assigned_technician = LabTechnicianSerializer(read_only=True)
@@ -38,6 +70,21 @@ class LabTestSerializer(serializers.ModelSerializer):
         model = LabTest
         fields = '__all__'
 
+class LabTestCompactSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Ids and display fields only, for ?view=compact lists"""
+    is_overdue = serializers.ReadOnlyField()
+    test_type_display = serializers.CharField(source='get_test_type_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    priority_display = serializers.CharField(source='get_priority_display', read_only=True)
+
+    class Meta:
+        model = LabTest
+        fields = [
+            'id', 'patient', 'test_type', 'test_type_display', 'priority', 'priority_display',
+            'status', 'status_display', 'lab_department', 'assigned_technician',
+            'ordered_at', 'scheduled_at', 'is_overdue'
+        ]
+
 class LabTestCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = LabTest
@@ -53,7 +100,12 @@ class LabTestCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Selected lab department is not active.")
         return data
 
-class LabScheduleSerializer(serializers.ModelSerializer):
+class LabScheduleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    eager_loading = {
+        'lab_test': ['lab_test'] + LabTestSerializer.related_paths(prefix='lab_test__'),
+        'technician': ['technician__staff__user', 'technician__staff__department'],
+        'equipment': ['equipment'],
+    }
     lab_test = LabTestSerializer(read_only=True)
     technician = LabTechnicianSerializer(read_only=True)
     equipment = LabEquipmentSerializer(read_only=True)
@@ -75,3 +127,9 @@ class LabScheduleSerializer(serializers.ModelSerializer):
             if exists:
                 raise serializers.ValidationError("Technician is already scheduled for this time.")
         return data
+
+class LabScheduleCompactSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Ids and scheduling fields only, for ?view=compact lists"""
+    class Meta:
+        model = LabSchedule
+        fields = ['id', 'lab_test', 'technician', 'equipment', 'scheduled_date', 'scheduled_time', 'duration_minutes']
@@ -1,10 +1,40 @@
+from django.db import transaction
+from functools import partial
 from django.utils import timezone
 from django.db.models import Count, Avg, Q
+from .availability import LabAvailability
 from .models import LabTest, LabDepartment, LabTechnician, LabEquipment, LabSchedule, LabAnalytics
 from queues.models import QueueEntry
+from notifications.models import NotificationTemplate
 from notifications.services import NotificationService
 import datetime
 
+# Technician specialization each test type calls for ('general' technicians can run any)
+SPECIALIZATION_BY_TEST_TYPE = {
+    'blood_count': 'hematology',
+    'blood_chemistry': 'chemistry',
+    'urine_analysis': 'chemistry',
+    'culture': 'microbiology',
+    'biopsy': 'pathology',
+    'xray_chest': 'radiology',
+    'ct_scan': 'radiology',
+    'mri_scan': 'radiology',
+    'ecg': 'cardiology',
+}
+
+# Equipment (matched against LabEquipment.name) each test type needs
+EQUIPMENT_BY_TEST_TYPE = {
+    'blood_count': 'hematology_analyzer',
+    'blood_chemistry': 'chemistry_analyzer',
+    'xray_chest': 'xray_machine',
+    'ct_scan': 'ct_scanner',
+    'mri_scan': 'mri_machine',
+    'ecg': 'ecg_machine',
+}
+
+# Calling order when packing the backlog: earlier deadline first, then priority
+PRIORITY_RANK = {'stat': 0, 'urgent': 1, 'routine': 2}
+
 class LabManagementService:
     def __init__(self):
         self.notification_service = NotificationService()
@@ -64,10 +94,16 @@ class LabManagementService:
     
     def schedule_test(self, lab_test, preferred_time):
         """Schedule a lab test for a specific time"""
+        duration = lab_test.estimated_duration
+        availability = LabAvailability.load(
+            preferred_time, preferred_time + timezone.timedelta(minutes=duration), lab_test.lab_department
+        )
         technician = self.find_available_technician(
             lab_test.lab_department, 
             lab_test.test_type, 
-            preferred_time
+            preferred_time,
+            duration_minutes=duration,
+            availability=availability
         )
         if not technician:
             # Optionally notify staff/admin about lack of technician
@@ -83,7 +119,9 @@ class LabManagementService:
         equipment = self.find_available_equipment(
             lab_test.lab_department,
             lab_test.test_type,
-            preferred_time
+            preferred_time,
+            duration_minutes=duration,
+            availability=availability
         )
         if not equipment:
             self.notification_service.create_and_send_notification(
@@ -122,22 +160,13 @@ class LabManagementService:
         
         return True
     
-    def find_available_technician(self, lab_department, test_type, target_time=None):
-        """Find available technician for a specific test type"""
-        # Map test types to specializations
-        specialization_mapping = {
-            'blood_count': 'hematology',
-            'blood_chemistry': 'chemistry',
-            'urine_analysis': 'chemistry',
-            'culture': 'microbiology',
-            'biopsy': 'pathology',
-            'xray_chest': 'radiology',
-            'ct_scan': 'radiology',
-            'mri_scan': 'radiology',
-            'ecg': 'cardiology',
-        }
-        
-        preferred_specialization = specialization_mapping.get(test_type, 'general')
+    def find_available_technician(self, lab_department, test_type, target_time=None, duration_minutes=30, availability=None):
+        """
+        Find available technician for a specific test type. Busy time comes
+        from one LabAvailability load (or the one passed in) rather than a
+        query per candidate.
+        """
+        preferred_specialization = SPECIALIZATION_BY_TEST_TYPE.get(test_type, 'general')
         
         # Find technicians with matching specialization
         technicians = LabTechnician.objects.filter(
@@ -148,8 +177,12 @@ class LabManagementService:
         
         if target_time:
             # Check availability at specific time
+            if availability is None:
+                availability = LabAvailability.load(
+                    target_time, target_time + timezone.timedelta(minutes=duration_minutes), lab_department
+                )
             for tech in technicians:
-                if self.is_technician_available(tech, target_time):
+                if availability.technician_free(tech.id, target_time, duration_minutes):
                     return tech
         else:
             # Return first available technician
@@ -157,19 +190,9 @@ class LabManagementService:
         
         return None
     
-    def find_available_equipment(self, lab_department, test_type, target_time=None):
-        """Find available equipment for a specific test type"""
-        # Map test types to equipment requirements
-        equipment_mapping = {
-            'blood_count': 'hematology_analyzer',
-            'blood_chemistry': 'chemistry_analyzer',
-            'xray_chest': 'xray_machine',
-            'ct_scan': 'ct_scanner',
-            'mri_scan': 'mri_machine',
-            'ecg': 'ecg_machine',
-        }
-        
-        equipment_type = equipment_mapping.get(test_type)
+    def find_available_equipment(self, lab_department, test_type, target_time=None, duration_minutes=30, availability=None):
+        """Find available equipment for a specific test type, checked like find_available_technician"""
+        equipment_type = EQUIPMENT_BY_TEST_TYPE.get(test_type)
         if not equipment_type:
             return None
         
@@ -181,67 +204,142 @@ class LabManagementService:
         
         if target_time:
             # Check equipment availability at specific time
+            if availability is None:
+                availability = LabAvailability.load(
+                    target_time, target_time + timezone.timedelta(minutes=duration_minutes), lab_department
+                )
             for eq in equipment:
-                if self.is_equipment_available(eq, target_time):
+                if availability.equipment_free(eq.id, target_time, duration_minutes):
                     return eq
         else:
             return equipment.first()
         
         return None
     
-    def is_technician_available(self, technician, target_time):
-        """Check if technician is available at specific time"""
-        # Check for existing schedules
-        existing_schedules = LabSchedule.objects.filter(
-            technician=technician,
-            scheduled_date=target_time.date(),
-            scheduled_time__range=[
-                (target_time - timezone.timedelta(hours=1)).time(),
-                (target_time + timezone.timedelta(hours=1)).time()
-            ]
-        )
-        
-        return not existing_schedules.exists()
+    def is_technician_available(self, technician, target_time, duration_minutes=30):
+        """Check if technician is free for duration_minutes from target_time"""
+        end_time = target_time + timezone.timedelta(minutes=duration_minutes)
+        return LabAvailability.load(target_time, end_time).technician_free(technician.id, target_time, duration_minutes)
     
-    def is_equipment_available(self, equipment, target_time):
-        """Check if equipment is available at specific time"""
-        # Check for existing schedules
-        existing_schedules = LabSchedule.objects.filter(
-            equipment=equipment,
-            scheduled_date=target_time.date(),
-            scheduled_time__range=[
-                (target_time - timezone.timedelta(hours=1)).time(),
-                (target_time + timezone.timedelta(hours=1)).time()
+    def is_equipment_available(self, equipment, target_time, duration_minutes=30):
+        """Check if equipment is free for duration_minutes from target_time"""
+        end_time = target_time + timezone.timedelta(minutes=duration_minutes)
+        return LabAvailability.load(target_time, end_time).equipment_free(equipment.id, target_time, duration_minutes)
+    
+    def schedule_backlog(self, lab_department, start=None, horizon=datetime.timedelta(days=1)):
+        """
+        Pack every unscheduled 'ordered' test of a lab department into
+        technician/equipment slots in one pass. Tests are taken earliest
+        deadline first and each gets the earliest-finishing free slot of any
+        matching technician (and equipment, when its type needs some) within
+        start..start + horizon, against one LabAvailability snapshot. The
+        schedules are written with bulk_create and patients notified in one
+        broadcast. Returns (scheduled, unscheduled) lists of tests.
+        """
+        start = start or timezone.now()
+        end = start + horizon
+        backlog = sorted(
+            LabTest.objects.filter(
+                lab_department=lab_department,
+                status='ordered',
+                labschedule__isnull=True
+            ).select_related('patient__user'),
+            key=lambda test: (test.deadline, PRIORITY_RANK.get(test.priority, len(PRIORITY_RANK)), test.id)
+        )
+        if not backlog:
+            return [], []
+        technicians = list(LabTechnician.objects.filter(lab_department=lab_department, is_available=True))
+        equipment = list(LabEquipment.objects.filter(lab_department=lab_department, status='available'))
+        availability = LabAvailability.load(start, end, lab_department)
+
+        scheduled, unscheduled, schedules = [], [], []
+        for test in backlog:
+            specialization = SPECIALIZATION_BY_TEST_TYPE.get(test.test_type, 'general')
+            equipment_type = EQUIPMENT_BY_TEST_TYPE.get(test.test_type)
+            candidates = [
+                (technician, eq)
+                for technician in technicians
+                if technician.specialization in (specialization, 'general')
+                for eq in ([eq for eq in equipment if equipment_type in eq.name.lower()] if equipment_type else [None])
             ]
+            best = None
+            for technician, eq in candidates:
+                slot = availability.first_free_slot(technician.id, eq.id if eq else None, start, test.estimated_duration)
+                if best is None or slot < best[0]:
+                    best = (slot, technician, eq)
+            if best is None or best[0] + timezone.timedelta(minutes=test.estimated_duration) > end:
+                unscheduled.append(test)
+                continue
+            slot, technician, eq = best
+            availability.book(technician.id, eq.id if eq else None, slot, test.estimated_duration)
+            schedules.append(LabSchedule(
+                lab_test=test,
+                technician=technician,
+                equipment=eq,
+                scheduled_date=slot.date(),
+                scheduled_time=slot.time(),
+                duration_minutes=test.estimated_duration
+            ))
+            test.scheduled_at = slot
+            test.assigned_technician = technician
+            test.equipment_used = eq
+            test.status = 'scheduled'
+            scheduled.append(test)
+
+        with transaction.atomic():
+            LabSchedule.objects.bulk_create(schedules, batch_size=500)
+            LabTest.objects.bulk_update(
+                scheduled, ['scheduled_at', 'assigned_technician', 'equipment_used', 'status'], batch_size=500
+            )
+            # Only tell patients about schedules that were actually committed
+            transaction.on_commit(partial(self.notify_scheduled_tests, lab_department, scheduled))
+        return scheduled, unscheduled
+    
+    def notify_scheduled_tests(self, lab_department, lab_tests):
+        """Send each patient one SMS per scheduled test in a single broadcast"""
+        self.notification_service.broadcast(
+            [test.patient.user for test in lab_tests],
+            NotificationTemplate(
+                name='lab_test_scheduled',
+                type='appointment_reminder',
+                title_template='Lab Test Scheduled',
+                message_template='Your {test_type} is scheduled for {scheduled_at} at {lab_department}.'
+            ),
+            context={'lab_department': lab_department.name},
+            contexts=[
+                {
+                    'test_type': test.get_test_type_display(),
+                    'scheduled_at': test.scheduled_at.strftime("%Y-%m-%d %H:%M")
+                }
+                for test in lab_tests
+            ],
+            channel='sms'
         )
-        
-        return not existing_schedules.exists()
     
     def process_overdue_tests(self):
         """Process overdue lab tests and send alerts"""
-        overdue_tests = LabTest.objects.filter(
-            status__in=['ordered', 'scheduled', 'in_progress']
+        overdue_tests = LabTest.objects.overdue().select_related(
+            'patient__user', 'ordered_by__user', 'assigned_technician__staff__user'
         )
         
         for test in overdue_tests:
-            if test.is_overdue:
-                # Send alert to lab department
-                self.notification_service.create_and_send_notification(
-                    user=test.assigned_technician.staff.user if test.assigned_technician else test.ordered_by.user,
-                    notification_type='delay_alert',
-                    title='Overdue Lab Test',
-                    message=f'Lab test {test.get_test_type_display()} for {test.patient.user.get_full_name()} is overdue.',
-                    channel='email'
-                )
-                
-                # Send update to patient
-                self.notification_service.create_and_send_notification(
-                    user=test.patient.user,
-                    notification_type='delay_alert',
-                    title='Lab Test Delay',
-                    message=f'Your {test.get_test_type_display()} is taking longer than expected. We will update you soon.',
-                    channel='sms'
-                )
+            # Send alert to lab department
+            self.notification_service.create_and_send_notification(
+                user=test.assigned_technician.staff.user if test.assigned_technician else test.ordered_by.user,
+                notification_type='delay_alert',
+                title='Overdue Lab Test',
+                message=f'Lab test {test.get_test_type_display()} for {test.patient.user.get_full_name()} is overdue.',
+                channel='email'
+            )
+            
+            # Send update to patient
+            self.notification_service.create_and_send_notification(
+                user=test.patient.user,
+                notification_type='delay_alert',
+                title='Lab Test Delay',
+                message=f'Your {test.get_test_type_display()} is taking longer than expected. We will update you soon.',
+                channel='sms'
+            )
     
     def complete_test_workflow(self, lab_test, results, normal_ranges=None, abnormal_flags=None):
         """Complete the full test workflow including review and reporting"""
@@ -279,7 +377,7 @@ class LabManagementService:
             total_ordered = today_tests.count()
             completed = today_tests.filter(status__in=['completed', 'reviewed', 'reported']).count()
             pending = today_tests.filter(status__in=['ordered', 'scheduled', 'in_progress']).count()
-            overdue = sum(1 for test in today_tests if test.is_overdue)
+            overdue = today_tests.overdue().count()
             
             # Calculate turnaround times
             completed_tests = today_tests.filter(completed_at__isnull=False)
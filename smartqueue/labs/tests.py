@@ -1,8 +1,16 @@
 from django.test import TestCase
 from django.urls import reverse
-from .models import LabDepartment, LabTest
+from rest_framework.test import APIClient
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import datetime
+from django.utils import timezone
+from .availability import IntervalIndex, LabAvailability
+from .models import LabDepartment, LabEquipment, LabSchedule, LabTechnician, LabTest
+from .services import LabManagementService
+from notifications.models import Notification
 from users.models import Patient
-from hospital.models import Staff
+from hospital.models import Department, Staff
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -44,3 +52,185 @@ class LabDepartmentAPITest(TestCase):
 		response = self.client.get(url)
 		self.assertEqual(response.status_code, 200)
 		self.assertIn("Microbiology", str(response.content))
+
+class LabTestListPermissionTest(TestCase):
+	def setUp(self):
+		department = Department.objects.create(name="General", department_type="OPD", is_active=True)
+		self.doctor = User.objects.create_user(username="labdoctor", email="labdoctor@example.com", password="pass", role="doctor")
+		self.staff = Staff.objects.create(user=self.doctor, role="doctor", department=department, license_number="LAB1", shift_start="08:00", shift_end="16:00")
+		self.lab_department = LabDepartment.objects.create(name="Chemistry", is_active=True)
+		self.patients = [self.order_tests(i) for i in range(2)]
+		self.client = APIClient()
+
+	def order_tests(self, i):
+		user = User.objects.create_user(username=f"labpatient{i}", email=f"labpatient{i}@example.com", password="pass", role="patient")
+		patient = Patient.objects.create(user=user, medical_id=f"LABMED{i}")
+		for _ in range(3):
+			LabTest.objects.create(patient=patient, test_type="glucose_test", ordered_by=self.staff, lab_department=self.lab_department)
+		return patient
+
+	def list_tests(self, user):
+		self.client.force_authenticate(user=user)
+		return self.client.get(reverse("labtest-list-create")).data
+
+	def test_rules_are_applied_in_the_database(self):
+		data = self.list_tests(self.patients[0].user)
+		self.assertEqual(data["count"], 3)
+		self.assertEqual({test["patient"]["id"] for test in data["results"]}, {self.patients[0].id})
+		self.assertEqual(self.list_tests(self.doctor)["count"], 6)
+		guest = User.objects.create_user(username="labguest", email="labguest@example.com", password="pass", role="lab_guest")
+		self.assertEqual(self.list_tests(guest)["count"], 0)
+
+	def test_list_queries_do_not_grow_with_rows(self):
+		technician = LabTechnician.objects.create(
+			staff=self.staff, lab_department=self.lab_department, specialization="chemistry",
+			license_number="TECH1", certification_expiry="2030-01-01"
+		)
+		LabTest.objects.update(assigned_technician=technician, reviewed_by=self.staff)
+		with CaptureQueriesContext(connection) as small:
+			self.list_tests(self.doctor)
+		self.order_tests(2)
+		LabTest.objects.update(assigned_technician=technician, reviewed_by=self.staff)
+		with CaptureQueriesContext(connection) as large:
+			data = self.list_tests(self.doctor)
+		self.assertEqual(len(data["results"]), 9)
+		self.assertEqual(len(large), len(small))
+		self.assertEqual(data["results"][0]["assigned_technician"]["staff"]["department_name"], "General")
+
+	def test_compact_view_and_field_selection(self):
+		self.client.force_authenticate(user=self.doctor)
+		compact = self.client.get(reverse("labtest-list-create"), {"view": "compact"}).data["results"][0]
+		self.assertEqual(compact["patient"], self.patients[1].id)
+		self.assertEqual(compact["test_type_display"], "Glucose Test")
+		with CaptureQueriesContext(connection) as queries:
+			selected = self.client.get(reverse("labtest-list-create"), {"fields": "id,status,patient"}).data["results"][0]
+		self.assertEqual(set(selected), {"id", "status", "patient"})
+		self.assertIn("labpatient1", selected["patient"]["user"]["username"])
+		self.assertNotIn("hospital_staff", queries[-1]["sql"])
+
+class LabAvailabilityTest(TestCase):
+	def setUp(self):
+		department = Department.objects.create(name="General", department_type="OPD", is_active=True)
+		self.lab_department = LabDepartment.objects.create(name="Chemistry", is_active=True)
+		self.technicians = []
+		for i in range(2):
+			user = User.objects.create_user(username=f"tech{i}", email=f"tech{i}@example.com", password="pass", role="staff")
+			staff = Staff.objects.create(user=user, role="staff", department=department, license_number=f"TS{i}", shift_start="00:00", shift_end="23:59")
+			self.technicians.append(LabTechnician.objects.create(
+				staff=staff, lab_department=self.lab_department, specialization="chemistry",
+				license_number=f"TECH{i}", certification_expiry="2030-01-01"
+			))
+		self.analyzer = LabEquipment.objects.create(name="chemistry_analyzer 1", serial_number="CA1", lab_department=self.lab_department)
+		patient = Patient.objects.create(user=User.objects.create_user(username="labpt", email="labpt@example.com", password="pass", role="patient"), medical_id="LABPT")
+		self.test = LabTest.objects.create(patient=patient, test_type="blood_chemistry", ordered_by=staff, lab_department=self.lab_department)
+		# 23:30 for 90 minutes: runs past midnight
+		LabSchedule.objects.create(
+			lab_test=self.test, technician=self.technicians[0], equipment=self.analyzer,
+			scheduled_date=datetime.date(2030, 1, 1), scheduled_time=datetime.time(23, 30), duration_minutes=90
+		)
+
+	def at(self, day, hour, minute=0):
+		return timezone.make_aware(datetime.datetime(2030, 1, day, hour, minute), datetime.timezone.utc)
+
+	def test_interval_index_merges_and_finds_gaps(self):
+		index = IntervalIndex()
+		for start, end in [(10, 20), (30, 40), (20, 25), (50, 60)]:
+			index.add(start, end)
+		self.assertEqual((index.starts, index.ends), ([10, 30, 50], [25, 40, 60]))
+		self.assertTrue(index.is_free(25, 30))
+		self.assertFalse(index.is_free(24, 26))
+		self.assertEqual(index.first_free(12, 5), 25)
+		self.assertEqual(index.first_free(12, 6), 40)
+
+	def test_overnight_schedules_block_the_next_morning(self):
+		service = LabManagementService()
+		with self.assertNumQueries(2):
+			technician = service.find_available_technician(self.lab_department, "blood_chemistry", self.at(2, 0, 30), duration_minutes=30)
+		self.assertEqual(technician, self.technicians[1])
+		self.assertTrue(service.is_technician_available(self.technicians[0], self.at(2, 1), duration_minutes=30))
+		self.assertFalse(service.is_equipment_available(self.analyzer, self.at(1, 22, 45), duration_minutes=60))
+		availability = LabAvailability.load(self.at(1, 23), self.at(2, 3))
+		self.assertEqual(availability.first_free_slot(self.technicians[0].id, self.analyzer.id, self.at(1, 23, 15), 30), self.at(2, 1))
+		availability.book(self.technicians[1].id, None, self.at(2, 1), 30)
+		self.assertEqual(availability.first_free_slot(self.technicians[1].id, self.analyzer.id, self.at(2, 0), 30), self.at(2, 1, 30))
+
+class LabBacklogSchedulingTest(TestCase):
+	def setUp(self):
+		department = Department.objects.create(name="General", department_type="OPD", is_active=True)
+		self.lab_department = LabDepartment.objects.create(name="Chemistry", is_active=True)
+		user = User.objects.create_user(username="backlogtech", email="backlogtech@example.com", password="pass", role="staff")
+		self.staff = Staff.objects.create(user=user, role="staff", department=department, license_number="BT1", shift_start="00:00", shift_end="23:59")
+		self.technician = LabTechnician.objects.create(
+			staff=self.staff, lab_department=self.lab_department, specialization="chemistry",
+			license_number="BTECH1", certification_expiry="2030-01-01"
+		)
+		self.analyzer = LabEquipment.objects.create(name="chemistry_analyzer 1", serial_number="BCA1", lab_department=self.lab_department)
+		self.patient = Patient.objects.create(user=User.objects.create_user(username="backlogpt", email="backlogpt@example.com", password="pass", role="patient"), medical_id="BACKPT")
+		self.start = timezone.make_aware(datetime.datetime(2030, 1, 1, 8), datetime.timezone.utc)
+
+	def order(self, priority, test_type="blood_chemistry", hours_ago=0):
+		test = LabTest.objects.create(patient=self.patient, test_type=test_type, priority=priority, ordered_by=self.staff, lab_department=self.lab_department)
+		LabTest.objects.filter(pk=test.pk).update(ordered_at=self.start - datetime.timedelta(hours=hours_ago))
+		return test
+
+	def test_backlog_is_packed_earliest_deadline_first(self):
+		routine = self.order("routine", hours_ago=20)
+		stat = self.order("stat")
+		urgent = self.order("urgent")
+		ecg = self.order("routine", test_type="ecg")
+		urine = self.order("routine", test_type="urine_analysis", hours_ago=1)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			scheduled, unscheduled = LabManagementService().schedule_backlog(
+				self.lab_department, start=self.start, horizon=datetime.timedelta(hours=2)
+			)
+		# ECG needs a cardiology technician and an ECG machine, neither of which exists
+		self.assertEqual([test.id for test in scheduled], [stat.id, urgent.id, routine.id, urine.id])
+		self.assertEqual({test.id for test in unscheduled}, {ecg.id})
+		schedules = {schedule.lab_test_id: schedule for schedule in LabSchedule.objects.all()}
+		self.assertEqual(schedules[stat.id].scheduled_time, datetime.time(8, 0))
+		self.assertEqual(schedules[urgent.id].scheduled_time, datetime.time(8, 30))
+		self.assertEqual(schedules[routine.id].equipment, self.analyzer)
+		self.assertIsNone(schedules[urine.id].equipment)
+		stat.refresh_from_db()
+		self.assertEqual((stat.status, stat.assigned_technician, stat.scheduled_at), ("scheduled", self.technician, self.start))
+		# One SMS per test, each naming its own test and time
+		self.assertEqual(
+			set(Notification.objects.filter(user=self.patient.user, title="Lab Test Scheduled").values_list("message", flat=True)),
+			{
+				f"Your {test.get_test_type_display()} is scheduled for 2030-01-01 {schedules[test.id].scheduled_time:%H:%M} at Chemistry."
+				for test in scheduled
+			}
+		)
+
+class LabTestOverdueQueryTest(TestCase):
+	def setUp(self):
+		department = Department.objects.create(name="General", department_type="OPD", is_active=True)
+		self.lab_department = LabDepartment.objects.create(name="Chemistry", is_active=True)
+		user = User.objects.create_user(username="overduedoc", email="overduedoc@example.com", password="pass", role="staff")
+		self.staff = Staff.objects.create(user=user, role="staff", department=department, license_number="OD1", shift_start="00:00", shift_end="23:59")
+		self.patient = Patient.objects.create(user=User.objects.create_user(username="overduept", email="overduept@example.com", password="pass", role="patient"), medical_id="ODPT")
+		self.now = timezone.now()
+
+	def order(self, priority, hours_ago, status="ordered"):
+		test = LabTest.objects.create(patient=self.patient, test_type="blood_chemistry", priority=priority, ordered_by=self.staff, lab_department=self.lab_department)
+		LabTest.objects.filter(pk=test.pk).update(ordered_at=self.now - datetime.timedelta(hours=hours_ago), status=status)
+		return test
+
+	def test_overdue_matches_is_overdue(self):
+		tests = [
+			self.order("stat", 2), self.order("stat", 0.5),
+			self.order("urgent", 5, status="in_progress"), self.order("urgent", 3),
+			self.order("routine", 25, status="scheduled"), self.order("routine", 23),
+			self.order("stat", 2, status="completed"), self.order("routine", 30, status="cancelled"),
+		]
+		expected = {test.id for test in LabTest.objects.filter(pk__in=[t.id for t in tests]) if test.is_overdue}
+		self.assertEqual(expected, {tests[0].id, tests[2].id, tests[4].id})
+		with self.assertNumQueries(1):
+			self.assertEqual(set(LabTest.objects.overdue(now=self.now).values_list("id", flat=True)), expected)
+		deadlines = dict(LabTest.objects.with_deadline().values_list("id", "deadline_at"))
+		for test in LabTest.objects.all():
+			self.assertEqual(deadlines[test.id], test.deadline)
+		# Each overdue test alerts the orderer and the patient
+		LabManagementService().process_overdue_tests()
+		self.assertEqual(Notification.objects.filter(type="delay_alert").count(), 6)
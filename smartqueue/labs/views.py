@@ -6,8 +6,8 @@ from django.utils import timezone
 from django.db.models import Q
 from .models import LabTest, LabDepartment, LabTechnician, LabSchedule, LabAnalytics
 from .serializers import (
-    LabTestSerializer, LabDepartmentSerializer, LabTechnicianSerializer,
-    LabScheduleSerializer, LabTestCreateSerializer
+    LabTestSerializer, LabTestCompactSerializer, LabDepartmentSerializer, LabTechnicianSerializer,
+    LabScheduleSerializer, LabScheduleCompactSerializer, LabTestCreateSerializer
 )
 from .services import LabManagementService
 from .permissions import (
@@ -17,7 +17,35 @@ from users.models import Patient
 from hospital.models import Staff
 from queues.models import QueueEntry
 
-class LabTestListCreateView(generics.ListCreateAPIView):
+class EagerLoadingMixin:
+    """
+    List views render serializer_class, or compact_serializer_class for
+    ?view=compact, limited to ?fields=a,b when given, and select_related()
+    exactly the relations that representation renders, so a page costs a
+    constant number of queries.
+    """
+    compact_serializer_class = None
+
+    def requested_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        return [name.strip() for name in fields.split(',') if name.strip()]
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('view') == 'compact' and self.compact_serializer_class:
+            return self.compact_serializer_class
+        return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def eager_load(self, queryset):
+        return queryset.select_related(*self.get_serializer_class().related_paths(self.requested_fields()))
+
+class LabTestListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     """
     List lab tests or create a new lab test.
     Permissions:
@@ -25,6 +53,7 @@ class LabTestListCreateView(generics.ListCreateAPIView):
       - Create: CanOrderLabTest
     """
     serializer_class = LabTestSerializer
+    compact_serializer_class = LabTestCompactSerializer
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -46,14 +75,14 @@ class LabTestListCreateView(generics.ListCreateAPIView):
         lab_dept = self.request.query_params.get('lab_department')
         if lab_dept:
             queryset = queryset.filter(lab_department_id=lab_dept)
-        # Object-level permission filtering
-        user = self.request.user
-        return [obj for obj in queryset.order_by('-ordered_at') if CanViewLabResults().has_object_permission(self.request, self, obj)]
+        # Object-level permission rules, applied in the database so the list stays paginated
+        queryset = CanViewLabResults().filter_queryset(self.request, queryset).order_by('-ordered_at')
+        return self.eager_load(queryset)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return LabTestCreateSerializer
-        return LabTestSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         staff = Staff.objects.get(user=self.request.user)
@@ -170,12 +199,13 @@ class LabDepartmentListView(generics.ListAPIView):
     serializer_class = LabDepartmentSerializer
     permission_classes = [IsAuthenticated]
 
-class LabScheduleListView(generics.ListAPIView):
+class LabScheduleListView(EagerLoadingMixin, generics.ListAPIView):
     """
     List lab schedules, filterable by date and technician.
     Permissions: CanManageLab.
     """
     serializer_class = LabScheduleSerializer
+    compact_serializer_class = LabScheduleCompactSerializer
     permission_classes = [IsAuthenticated, CanManageLab]
 
     def get_queryset(self):
@@ -190,7 +220,7 @@ class LabScheduleListView(generics.ListAPIView):
         user = self.request.user
         if hasattr(user, 'staff_profile') and getattr(user.staff_profile, 'lab_department', None):
             queryset = queryset.filter(lab_test__lab_department=user.staff_profile.lab_department)
-        return queryset.order_by('scheduled_date', 'scheduled_time')
+        return self.eager_load(queryset.order_by('scheduled_date', 'scheduled_time'))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsLabDepartmentMember])
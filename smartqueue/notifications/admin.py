@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import Notification, NotificationPreference, NotificationTemplate, NotificationLog
+from .models import Notification, NotificationArchive, NotificationPreference, NotificationTemplate, NotificationLog
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -8,6 +8,12 @@ class NotificationAdmin(admin.ModelAdmin):
 	search_fields = ('user__username', 'type', 'channel', 'title', 'message')
 	list_filter = ('type', 'channel', 'status', 'created_at')
 
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+	list_display = ('id', 'user', 'type', 'channel', 'status', 'sent_at', 'created_at', 'archived_at')
+	search_fields = ('user__username', 'external_id')
+	list_filter = ('type', 'channel', 'status')
+
 @admin.register(NotificationPreference)
 class NotificationPreferenceAdmin(admin.ModelAdmin):
 	list_display = ('user', 'queue_updates', 'appointment_reminders', 'delay_alerts', 'test_results', 'reminder_minutes_before', 'quiet_hours_start', 'quiet_hours_end')
@@ -21,6 +27,8 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(NotificationLog)
 class NotificationLogAdmin(admin.ModelAdmin):
-	list_display = ('notification', 'action', 'details', 'timestamp')
-	search_fields = ('notification__id', 'action', 'details')
+	# Logs outlive archived notifications, so show the id rather than the relation
+	list_display = ('notification_id', 'action', 'details', 'timestamp')
+	search_fields = ('=notification__id', 'action', 'details')
 	list_filter = ('action', 'timestamp')
+	raw_id_fields = ('notification',)
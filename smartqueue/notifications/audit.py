@@ -0,0 +1,52 @@
+import threading
+from contextlib import contextmanager
+from functools import partial
+from django.db import transaction
+from .models import Notification, NotificationLog
+
+class AuditLogger:
+    """
+    Append-only writer for NotificationLog. Inside batch() records are
+    buffered per thread and written with one bulk_create when the outermost
+    batch ends, deferred to commit when a transaction is open. Outside a
+    batch each record is inserted directly.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def log(self, notification, action, details=''):
+        record = NotificationLog(notification=notification, action=action, details=details)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            record.save()
+        else:
+            buffer.append(record)
+
+    @contextmanager
+    def batch(self):
+        if getattr(self._local, 'buffer', None) is not None:
+            yield
+            return
+        self._local.buffer = []
+        try:
+            yield
+        finally:
+            records, self._local.buffer = self._local.buffer, None
+            if records:
+                transaction.on_commit(partial(self._write, records))
+
+    def _write(self, records):
+        # Notifications created inside a rolled-back savepoint no longer exist
+        existing = set(Notification.objects.filter(
+            id__in={record.notification_id for record in records}
+        ).values_list('id', flat=True))
+        NotificationLog.objects.bulk_create([record for record in records if record.notification_id in existing])
+
+audit_log = AuditLogger()
+
+def audit_log_middleware(get_response):
+    """Buffer each request's notification log records into one bulk insert"""
+    def middleware(request):
+        with audit_log.batch():
+            return get_response(request)
+    return middleware
@@ -81,13 +81,21 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'notification': notification
         }))
     
+    # Receive unread counter changes from the user group
+    async def unread_count_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count',
+            'count': event['count']
+        }))
+    
     @database_sync_to_async
     def get_user_from_token(self, token):
         try:
             from rest_framework_simplejwt.tokens import AccessToken
+            from users.authentication import auth_user_cache
             access_token = AccessToken(token)
             user_id = access_token['user_id']
-            return User.objects.get(id=user_id)
+            return auth_user_cache.get(user_id)
         except:
             return None
     
@@ -110,10 +118,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_unread_count(self):
         try:
-            from .models import Notification
-            return Notification.objects.filter(
-                user=self.user,
-                read_at__isnull=True
-            ).count()
+            from .unread import unread_counter
+            return unread_counter.get(self.user.id)
         except:
             return 0
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notifications.models import NotificationArchive
+
+class Command(BaseCommand):
+    help = 'Move sent and failed notifications older than N days into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive notifications created more than this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Notifications moved per transaction')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timezone.timedelta(days=options['days'])
+        self.stdout.write(f'Archiving sent/failed notifications created before {before:%Y-%m-%d %H:%M}...')
+
+        total = 0
+        for moved in NotificationArchive.archive(before, options['chunk_size']):
+            total += moved
+            self.stdout.write(f'Archived {total} notification(s)')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{total} notification(s) archived')
+        )
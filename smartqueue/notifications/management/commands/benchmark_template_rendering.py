@@ -0,0 +1,42 @@
+import timeit
+from django.core.management.base import BaseCommand
+from notifications.models import NotificationTemplate
+
+def replace_render(template, context):
+    """The previous str.replace-per-key rendering, kept for comparison"""
+    title = template.title_template
+    message = template.message_template
+    for key, value in context.items():
+        placeholder = f"{{{key}}}"
+        title = title.replace(placeholder, str(value))
+        message = message.replace(placeholder, str(value))
+    return title, message
+
+class Command(BaseCommand):
+    help = 'Measure per-render cost of notification templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000, help='Renders per measurement')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements per variant; the fastest is reported')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        template = NotificationTemplate(
+            name='queue_position_update',
+            type='queue_update',
+            channel='sms',
+            title_template='Queue Update - {queue_name}',
+            message_template='Hi {patient_name}, you are now #{position} in line for {queue_name}. Estimated wait time: {estimated_wait} minutes.'
+        )
+        context = {'patient_name': 'Jane Doe', 'queue_name': 'General OPD', 'position': 3, 'estimated_wait': 25}
+        contexts = [context] * iterations
+
+        repeat = options['repeat']
+
+        results = [
+            ('str.replace per key', min(timeit.repeat(lambda: replace_render(template, context), number=iterations, repeat=repeat))),
+            ('compiled render', min(timeit.repeat(lambda: template.render(context), number=iterations, repeat=repeat))),
+            ('compiled render_many', min(timeit.repeat(lambda: template.render_many(contexts), number=1, repeat=repeat))),
+        ]
+        for label, seconds in results:
+            self.stdout.write(f"{label:<22} {seconds / iterations * 1e6:8.3f} us/render")
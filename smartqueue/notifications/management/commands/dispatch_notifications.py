@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notifications.services import NotificationDispatcher
+
+class Command(BaseCommand):
+    help = 'Continuously send pending and retry notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Notifications claimed per batch')
+        parser.add_argument(
+            '--concurrency',
+            action='append',
+            default=[],
+            metavar='CHANNEL=N',
+            help='Concurrent sends for a channel (repeatable); defaults to NOTIFICATION_DISPATCH_CONCURRENCY'
+        )
+        parser.add_argument('--interval', type=float, default=1.0, help='Idle poll interval in seconds')
+        parser.add_argument('--max-interval', type=float, default=30.0, help='Upper bound for the idle/failure backoff')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is drained')
+
+    def handle(self, *args, **options):
+        concurrency = dict(getattr(settings, 'NOTIFICATION_DISPATCH_CONCURRENCY', {}))
+        for value in options['concurrency']:
+            channel, _, workers = value.partition('=')
+            if not workers.isdigit():
+                raise CommandError(f"Invalid --concurrency value '{value}', expected CHANNEL=N")
+            concurrency[channel] = int(workers)
+
+        dispatcher = NotificationDispatcher(
+            batch_size=options['batch_size'],
+            concurrency=concurrency
+        )
+
+        self.stdout.write('Dispatching notifications...')
+        try:
+            dispatcher.run(
+                interval=options['interval'],
+                max_interval=options['max_interval'],
+                once=options['once']
+            )
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS('Notification dispatcher stopped')
+        )
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from notifications.unread import unread_counter
+
+class Command(BaseCommand):
+    help = 'Repair cached per-user unread notification counters from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only reconcile this user (repeatable)')
+        parser.add_argument('--check', action='store_true', help='Report drift without repairing it')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users compared per round trip')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling unread notification counters...')
+
+        user_ids = options['user_ids'] or list(get_user_model().objects.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        drifted = {}
+        for i in range(0, len(user_ids), chunk_size):
+            drifted.update(unread_counter.reconcile(user_ids[i:i + chunk_size], apply=not options['check']))
+        for user_id, (cached, actual) in drifted.items():
+            self.stdout.write(f'User {user_id}: {cached} -> {actual}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(user_ids)} user(s) checked, {len(drifted)} out of sync')
+        )
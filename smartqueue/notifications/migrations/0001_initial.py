@@ -0,0 +1,86 @@
+# Generated by Django 5.1.11 on 2026-10-18 00:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('type', models.CharField(choices=[('queue_update', 'Queue Update'), ('appointment_reminder', 'Appointment Reminder'), ('test_ready', 'Test Ready'), ('delay_alert', 'Delay Alert'), ('emergency_alert', 'Emergency Alert'), ('consultation_ready', 'Consultation Ready'), ('lab_results', 'Lab Results')], max_length=20)),
+                ('channel', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('websocket', 'WebSocket')], max_length=10)),
+                ('title_template', models.CharField(max_length=200)),
+                ('message_template', models.TextField()),
+                ('variables', models.JSONField(default=dict, help_text='Available template variables')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('queue_update', 'Queue Update'), ('appointment_reminder', 'Appointment Reminder'), ('test_ready', 'Test Ready'), ('delay_alert', 'Delay Alert'), ('emergency_alert', 'Emergency Alert'), ('consultation_ready', 'Consultation Ready'), ('lab_results', 'Lab Results')], max_length=20)),
+                ('channel', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('websocket', 'WebSocket')], max_length=10)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('retry', 'Retry')], default='pending', max_length=10)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('retry_count', models.IntegerField(default=0)),
+                ('max_retries', models.IntegerField(default=3)),
+                ('next_retry_at', models.DateTimeField(blank=True, null=True)),
+                ('external_id', models.CharField(blank=True, max_length=100)),
+                ('error_message', models.TextField(blank=True)),
+                ('scheduled_for', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('details', models.TextField(blank=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='notifications.notification')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue_updates', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('all', 'All Channels')], default='sms', max_length=10)),
+                ('appointment_reminders', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('all', 'All Channels')], default='sms', max_length=10)),
+                ('delay_alerts', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('all', 'All Channels')], default='sms', max_length=10)),
+                ('test_results', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('all', 'All Channels')], default='email', max_length=10)),
+                ('reminder_minutes_before', models.IntegerField(default=15)),
+                ('quiet_hours_start', models.TimeField(default='22:00')),
+                ('quiet_hours_end', models.TimeField(default='08:00')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
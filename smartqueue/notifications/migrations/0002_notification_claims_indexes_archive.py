@@ -0,0 +1,99 @@
+# Generated by Django 5.1.11 on 2026-10-18 00:01
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('queue_update', 'Queue Update'), ('appointment_reminder', 'Appointment Reminder'), ('test_ready', 'Test Ready'), ('delay_alert', 'Delay Alert'), ('emergency_alert', 'Emergency Alert'), ('consultation_ready', 'Consultation Ready'), ('lab_results', 'Lab Results')], max_length=20)),
+                ('channel', models.CharField(choices=[('sms', 'SMS'), ('email', 'Email'), ('push', 'Push Notification'), ('websocket', 'WebSocket')], max_length=10)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('retry', 'Retry')], max_length=10)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('retry_count', models.IntegerField(default=0)),
+                ('external_id', models.CharField(blank=True, max_length=100)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='external_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('retry', 'Retry')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='notificationlog',
+            name='action',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notificationlog',
+            name='notification',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, to='notifications.notification'),
+        ),
+        migrations.AlterField(
+            model_name='notificationpreference',
+            name='quiet_hours_end',
+            field=models.TimeField(default=datetime.time(8, 0)),
+        ),
+        migrations.AlterField(
+            model_name='notificationpreference',
+            name='quiet_hours_start',
+            field=models.TimeField(default=datetime.time(22, 0)),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'scheduled_for'], name='notification_status_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'next_retry_at'], name='notification_status_retry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', True)), fields=['user'], name='notification_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['notification', 'timestamp'], name='notificatio_notific_303515_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['user', 'created_at'], name='notificatio_user_id_a70371_idx'),
+        ),
+    ]
@@ -1,6 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from functools import partial
+import datetime
 from users.models import User
+from .template_registry import CompiledTemplate
+from .unread import unread_counter
 
 class NotificationPreference(models.Model):
     CHANNEL_CHOICES = [
@@ -18,8 +24,8 @@ class NotificationPreference(models.Model):
     
     # Timing preferences
     reminder_minutes_before = models.IntegerField(default=15)  # Minutes before appointment
-    quiet_hours_start = models.TimeField(default='22:00')
-    quiet_hours_end = models.TimeField(default='08:00')
+    quiet_hours_start = models.TimeField(default=datetime.time(22, 0))
+    quiet_hours_end = models.TimeField(default=datetime.time(8, 0))
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -27,6 +33,12 @@ class NotificationPreference(models.Model):
     def __str__(self):
         return f"{self.user.username} - Notification Preferences"
 
+@receiver([post_save, post_delete], sender=NotificationPreference)
+def invalidate_cached_preference(sender, instance, **kwargs):
+    """Saves from anywhere (API, admin, shell, services) must reach every dispatcher"""
+    from .preferences import get_preference_cache
+    transaction.on_commit(partial(get_preference_cache().invalidate, instance.user_id))
+
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('queue_update', 'Queue Update'),
@@ -47,6 +59,7 @@ class Notification(models.Model):
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
         ('failed', 'Failed'),
         ('retry', 'Retry'),
@@ -70,21 +83,43 @@ class Notification(models.Model):
     next_retry_at = models.DateTimeField(null=True, blank=True)
     
     # External service tracking
-    external_id = models.CharField(max_length=100, blank=True)  # Twilio SID, etc.
+    external_id = models.CharField(max_length=100, blank=True, db_index=True)  # Twilio SID, etc.
     error_message = models.TextField(blank=True)
     
     # Scheduling
     scheduled_for = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Set while a dispatcher is sending
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dispatcher scans for due pending and retry notifications
+            models.Index(fields=['status', 'scheduled_for'], name='notification_status_sched_idx'),
+            models.Index(fields=['status', 'next_retry_at'], name='notification_status_retry_idx'),
+            # (user, read_at IS NULL) lookups for unread counts and lists touch unread rows only
+            models.Index(fields=['user'], condition=models.Q(read_at__isnull=True), name='notification_user_unread_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.type} ({self.status})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'read_at' in field_names:
+            instance._loaded_unread = instance.read_at is None
+        return instance
+    
+    def save(self, *args, **kwargs):
+        was_unread = self._state.adding is False and getattr(self, '_loaded_unread', None)
+        super().save(*args, **kwargs)
+        is_unread = self.read_at is None
+        self._loaded_unread = is_unread
+        unread_counter.adjust(self.user_id, int(is_unread) - int(bool(was_unread)))
+    
     def mark_as_sent(self, external_id=None):
         self.status = 'sent'
         self.sent_at = timezone.now()
@@ -107,6 +142,61 @@ class Notification(models.Model):
             return True
         return False
 
+class NotificationArchive(models.Model):
+    """
+    Sent and failed notifications moved out of the hot Notification table.
+    Rows keep their original id, so NotificationLog entries still resolve.
+    """
+    ARCHIVABLE_STATUSES = ['sent', 'failed']
+    ARCHIVED_FIELDS = [
+        'id', 'user_id', 'type', 'channel', 'title', 'message', 'status', 'sent_at',
+        'delivered_at', 'read_at', 'retry_count', 'external_id', 'error_message', 'created_at',
+    ]
+    
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
+    channel = models.CharField(max_length=10, choices=Notification.CHANNEL_CHOICES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=Notification.STATUS_CHOICES)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    retry_count = models.IntegerField(default=0)
+    external_id = models.CharField(max_length=100, blank=True)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.type} ({self.status}, archived)"
+    
+    @classmethod
+    def archive(cls, before, chunk_size=1000):
+        """
+        Move sent/failed notifications created before a cutoff into the archive,
+        one chunk per transaction so locks stay short. Yields the size of each chunk.
+        """
+        while True:
+            with transaction.atomic():
+                rows = list(Notification.objects.filter(
+                    status__in=cls.ARCHIVABLE_STATUSES,
+                    created_at__lt=before
+                ).order_by('id').values(*cls.ARCHIVED_FIELDS)[:chunk_size])
+                if not rows:
+                    return
+                cls.objects.bulk_create([cls(**row) for row in rows], ignore_conflicts=True)
+                Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            unread_counter.invalidate({row['user_id'] for row in rows if row['read_at'] is None})
+            yield len(rows)
+
 class NotificationTemplate(models.Model):
     name = models.CharField(max_length=100, unique=True)
     type = models.CharField(max_length=20, choices=Notification.TYPE_CHOICES)
@@ -124,26 +214,45 @@ class NotificationTemplate(models.Model):
     def __str__(self):
         return f"{self.name} - {self.type} ({self.channel})"
     
+    def compiled(self):
+        """Compiled (title, message) formatters, rebuilt if the sources changed"""
+        compiled = self.__dict__.get('_compiled')
+        if compiled is None or compiled[0].source is not self.title_template or compiled[1].source is not self.message_template:
+            compiled = self._compiled = (CompiledTemplate(self.title_template), CompiledTemplate(self.message_template))
+        return compiled
+    
     def render(self, context):
         """Render template with context variables"""
-        title = self.title_template
-        message = self.message_template
-        
-        for key, value in context.items():
-            placeholder = f"{{{key}}}"
-            title = title.replace(placeholder, str(value))
-            message = message.replace(placeholder, str(value))
-        
-        return title, message
+        title, message = self.compiled()
+        return title.render(context), message.render(context)
+    
+    def render_many(self, contexts):
+        """Render the template once per context as a list of (title, message)"""
+        title, message = self.compiled()
+        return [(title.render(context), message.render(context)) for context in contexts]
+
+@receiver([post_save, post_delete], sender=NotificationTemplate)
+def invalidate_template_registry(sender, **kwargs):
+    """Edits from anywhere (admin, shell, fixtures, commands) must reach every process's registry"""
+    from .template_registry import get_template_registry
+    transaction.on_commit(get_template_registry().invalidate)
 
 class NotificationLog(models.Model):
-    notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
-    action = models.CharField(max_length=50)  # 'sent', 'failed', 'retry', 'delivered', 'read'
+    # Append-only; the (notification, timestamp) index also serves plain lookups by notification
+    # No FK constraint: entries outlive their notification once it is archived
+    notification = models.ForeignKey(
+        Notification, on_delete=models.DO_NOTHING, db_index=False, db_constraint=False
+    )
+    action = models.CharField(max_length=20)  # 'created', 'sent', 'failed', 'retry_scheduled', 'delivered', 'read'
     details = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['notification', 'timestamp']),
+        ]
     
     def __str__(self):
-        return f"{self.notification.id} - {self.action} at {self.timestamp}"
+        # notification_id: the notification itself may have been archived
+        return f"{self.notification_id} - {self.action} at {self.timestamp}"
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from smartqueue.shared_cache import get_shared_cache
+from .models import NotificationPreference
+
+class PreferenceCache:
+    """
+    Per-process LRU of NotificationPreference rows with a TTL, optionally
+    backed by the shared cache so processes share loads and invalidations:
+    each user then has a version stamp there, bumped by invalidate(), which
+    local and shared entries must match to be served. The shared cache holds
+    only the preference's own field values, never the related user. Users
+    without a stored row get unsaved defaults instead of an INSERT.
+    """
+    CACHE_KEY = 'notification_preference:{user_id}'
+    VERSION_KEY = 'notification_preference_version:{user_id}'
+
+    def __init__(self, max_size=1024, timeout=300, shared=False):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user):
+        return self.get_many([user])[user.id]
+
+    def get_many(self, users):
+        """Preferences for several users as {user_id: preference}, loading misses in one query"""
+        users = {user.id: user for user in users}
+        shared = self.shared_cache()
+        versions = self._versions(shared, users)
+        found = self._get_local(users, versions)
+        missing = [user_id for user_id in users if user_id not in found]
+        if missing and shared is not None:
+            stored = shared.get_many([self.CACHE_KEY.format(user_id=user_id) for user_id in missing])
+            current = {
+                values['user_id']: self._from_shared(values)
+                for version, values in stored.values()
+                if version == versions[values['user_id']]
+            }
+            found.update(current)
+            self._set_local(current, versions)
+            missing = [user_id for user_id in missing if user_id not in found]
+        if missing:
+            loaded = {
+                preference.user_id: preference
+                for preference in NotificationPreference.objects.filter(user_id__in=missing)
+            }
+            for user_id in missing:
+                loaded.setdefault(user_id, NotificationPreference(user_id=user_id))
+            found.update(loaded)
+            self._set_local(loaded, versions)
+            if shared is not None:
+                shared.set_many(
+                    {
+                        self.CACHE_KEY.format(user_id=user_id): (versions[user_id], self._to_shared(preference))
+                        for user_id, preference in loaded.items()
+                    },
+                    self.timeout
+                )
+        return found
+
+    @staticmethod
+    def _to_shared(preference):
+        return {field.attname: getattr(preference, field.attname) for field in NotificationPreference._meta.concrete_fields}
+
+    @staticmethod
+    def _from_shared(values):
+        """Rebuild a preference from its cached field values; unsaved defaults stay unsaved"""
+        if values['id'] is None:
+            return NotificationPreference(**values)
+        return NotificationPreference.from_db(NotificationPreference.objects.db, list(values), list(values.values()))
+
+    def shared_cache(self):
+        return get_shared_cache() if self.shared else None
+
+    def _versions(self, shared, user_ids):
+        """Current version stamp per user; None for every user without a shared cache"""
+        if shared is None:
+            return dict.fromkeys(user_ids)
+        keys = {user_id: self.VERSION_KEY.format(user_id=user_id) for user_id in user_ids}
+        stored = shared.get_many(keys.values())
+        return {user_id: stored.get(key, 0) for user_id, key in keys.items()}
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        shared = self.shared_cache()
+        if shared is not None:
+            # Stamped entries in every process's LRU and in the shared cache go stale
+            version_key = self.VERSION_KEY.format(user_id=user_id)
+            shared.add(version_key, 0, None)
+            shared.incr(version_key)
+            shared.delete(self.CACHE_KEY.format(user_id=user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, users, versions):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for user_id in users:
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    continue
+                preference, version, expires_at = entry
+                if expires_at <= now or version != versions[user_id]:
+                    del self._entries[user_id]
+                    continue
+                self._entries.move_to_end(user_id)
+                found[user_id] = preference
+        return found
+
+    def _set_local(self, preferences, versions):
+        expires_at = time.monotonic() + self.timeout
+        with self._lock:
+            for user_id, preference in preferences.items():
+                self._entries[user_id] = (preference, versions[user_id], expires_at)
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+_preference_cache = None
+
+def get_preference_cache():
+    """Get the process-wide preference cache, built from settings on first use"""
+    global _preference_cache
+    if _preference_cache is None:
+        _preference_cache = PreferenceCache(
+            max_size=getattr(settings, 'NOTIFICATION_PREFERENCE_CACHE_SIZE', 1024),
+            timeout=getattr(settings, 'NOTIFICATION_PREFERENCE_CACHE_TIMEOUT', 300),
+            shared=getattr(settings, 'NOTIFICATION_PREFERENCE_CACHE_SHARED', True)
+        )
+    return _preference_cache
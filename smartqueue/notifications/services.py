@@ -1,31 +1,44 @@
 from django.conf import settings
+from django.db import connection
+from django.db.models import Q
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioException
-from .models import Notification, NotificationPreference, NotificationTemplate, NotificationLog
+from django.core.mail import EmailMultiAlternatives, get_connection as get_email_connection
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from .models import Notification, NotificationTemplate
+from .audit import audit_log
+from .preferences import get_preference_cache
+from .sms import SMSError, get_sms_transport
+from .template_registry import get_template_registry
+from .unread import unread_counter
+from smartqueue.db import write_locked_atomic
 import json
 import logging
+import smtplib
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 logger = logging.getLogger(__name__)
 
+# HTML email templates by name, including misses (None), so each name is looked up once per process
+_email_templates = {}
+
 class NotificationService:
     def __init__(self):
-        if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-            self.twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        else:
-            self.twilio_client = None
-            logger.warning("Twilio credentials not configured")
-        
         self.channel_layer = get_channel_layer()
+        # 'outbox' only records notifications; the dispatch_notifications command sends them
+        self.delivery_mode = getattr(settings, 'NOTIFICATION_DELIVERY_MODE', 'immediate')
     
     def get_user_preferences(self, user):
-        """Get or create user notification preferences"""
-        preferences, created = NotificationPreference.objects.get_or_create(user=user)
-        return preferences
+        """Get user notification preferences (cached; defaults if none are stored)"""
+        return get_preference_cache().get(user)
+    
+    def get_many_preferences(self, users):
+        """Get preferences for several users as {user_id: preferences}"""
+        return get_preference_cache().get_many(users)
     
     def is_quiet_hours(self, user):
         """Check if current time is within user's quiet hours"""
@@ -40,10 +53,11 @@ class NotificationService:
             return preferences.quiet_hours_start <= current_time <= preferences.quiet_hours_end
     
     def send_sms(self, notification):
-        """Send SMS notification via Twilio with retry logic"""
-        if not self.twilio_client:
-            logger.error(f"Twilio not configured for notification {notification.id}")
-            notification.mark_as_failed("Twilio not configured")
+        """Send SMS notification through the shared SMS transport with retry logic"""
+        transport = get_sms_transport()
+        if not transport:
+            logger.error(f"SMS transport not configured for notification {notification.id}")
+            notification.mark_as_failed("SMS transport not configured")
             return False
         
         try:
@@ -52,25 +66,24 @@ class NotificationService:
             if not phone_number.startswith('+'):
                 phone_number = f"+1{phone_number}"  # Assume US number if no country code
             
-            message = self.twilio_client.messages.create(
-                body=notification.message,
-                from_=settings.TWILIO_PHONE_NUMBER,
-                to=phone_number,
+            message_id = transport.send(
+                phone_number,
+                notification.message,
                 status_callback=f"{settings.BASE_URL}/api/notifications/twilio-webhook/"
             )
             
-            notification.mark_as_sent(message.sid)
-            self.log_notification_action(notification, 'sent', f"Twilio SID: {message.sid}")
+            notification.mark_as_sent(message_id)
+            self.log_notification_action(notification, 'sent', f"Message ID: {message_id}")
             
-            logger.info(f"SMS sent successfully to {phone_number} - SID: {message.sid}")
+            logger.info(f"SMS sent successfully to {phone_number} - ID: {message_id}")
             return True
             
-        except TwilioException as e:
-            error_msg = f"Twilio error: {str(e)}"
+        except SMSError as e:
+            error_msg = str(e)
             logger.error(f"SMS sending failed for notification {notification.id}: {error_msg}")
             
-            # Schedule retry for certain error types
-            if e.code in [20003, 20429, 21610]:  # Rate limit, queue full, etc.
+            # Schedule retry for transient provider errors (rate limit, queue full, etc.)
+            if e.retryable:
                 if notification.schedule_retry():
                     self.log_notification_action(notification, 'retry_scheduled', error_msg)
                     return False
@@ -88,48 +101,86 @@ class NotificationService:
     
     def send_email(self, notification):
         """Send email notification with HTML template"""
+        return self.send_email_batch([notification])[0]
+    
+    def send_email_batch(self, notifications):
+        """
+        Send email notifications over one SMTP connection, logging the batch
+        throughput. Returns a success flag per notification.
+        """
+        started = time.monotonic()
+        email_connection = get_email_connection()
         try:
-            # Use template if available
-            template_name = f"notifications/{notification.type}.html"
-            
-            context = {
-                'user': notification.user,
-                'title': notification.title,
-                'message': notification.message,
-                'notification': notification,
-            }
-            
-            try:
-                html_message = render_to_string(template_name, context)
-            except:
-                html_message = f"<h2>{notification.title}</h2><p>{notification.message}</p>"
-            
-            send_mail(
-                subject=notification.title,
-                message=notification.message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[notification.user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            
-            notification.mark_as_sent()
-            self.log_notification_action(notification, 'sent', f"Email sent to {notification.user.email}")
-            
-            logger.info(f"Email sent successfully to {notification.user.email}")
-            return True
-            
+            email_connection.open()
         except Exception as e:
-            error_msg = f"Email error: {str(e)}"
-            logger.error(f"Email sending failed for notification {notification.id}: {error_msg}")
-            
-            if notification.schedule_retry():
-                self.log_notification_action(notification, 'retry_scheduled', error_msg)
-                return False
-            
-            notification.mark_as_failed(error_msg)
-            self.log_notification_action(notification, 'failed', error_msg)
-            return False
+            for notification in notifications:
+                self._email_failed(notification, e)
+            return [False] * len(notifications)
+        
+        results = []
+        try:
+            for notification in notifications:
+                try:
+                    email_connection.send_messages([self._email_message(notification, email_connection)])
+                except Exception as e:
+                    if isinstance(e, smtplib.SMTPServerDisconnected):
+                        # The next send_messages() reconnects
+                        email_connection.close()
+                    self._email_failed(notification, e)
+                    results.append(False)
+                    continue
+                notification.mark_as_sent()
+                self.log_notification_action(notification, 'sent', f"Email sent to {notification.user.email}")
+                results.append(True)
+        finally:
+            email_connection.close()
+        
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Email batch: {sum(results)}/{len(notifications)} sent in {elapsed:.3f}s "
+            f"({len(notifications) / elapsed if elapsed else 0:.1f} emails/s)"
+        )
+        return results
+    
+    def _email_message(self, notification, email_connection):
+        context = {
+            'user': notification.user,
+            'title': notification.title,
+            'message': notification.message,
+            'notification': notification,
+        }
+        template_name = f"notifications/{notification.type}.html"
+        if template_name not in _email_templates:
+            try:
+                _email_templates[template_name] = get_template(template_name)
+            except TemplateDoesNotExist:
+                _email_templates[template_name] = None
+        template = _email_templates[template_name]
+        if template:
+            html_message = template.render(context)
+        else:
+            html_message = f"<h2>{notification.title}</h2><p>{notification.message}</p>"
+        
+        message = EmailMultiAlternatives(
+            subject=notification.title,
+            body=notification.message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.user.email],
+            connection=email_connection
+        )
+        message.attach_alternative(html_message, 'text/html')
+        return message
+    
+    def _email_failed(self, notification, error):
+        error_msg = f"Email error: {str(error)}"
+        logger.error(f"Email sending failed for notification {notification.id}: {error_msg}")
+        
+        if notification.schedule_retry():
+            self.log_notification_action(notification, 'retry_scheduled', error_msg)
+            return
+        
+        notification.mark_as_failed(error_msg)
+        self.log_notification_action(notification, 'failed', error_msg)
     
     def send_websocket(self, notification):
         """Send real-time notification via WebSocket"""
@@ -170,15 +221,20 @@ class NotificationService:
             self.log_notification_action(notification, 'failed', error_msg)
             return False
     
+    def defer_for_quiet_hours(self, notification):
+        """Reschedule a non-emergency notification past the user's quiet hours; returns True if deferred"""
+        if notification.type == 'emergency_alert' or not self.is_quiet_hours(notification.user):
+            return False
+        preferences = self.get_user_preferences(notification.user)
+        tomorrow = timezone.now().date() + timezone.timedelta(days=1)
+        notification.scheduled_for = timezone.datetime.combine(tomorrow, preferences.quiet_hours_end)
+        notification.save()
+        return True
+    
     def send_notification(self, notification):
         """Send notification via appropriate channel"""
         # Check quiet hours for non-emergency notifications
-        if notification.type != 'emergency_alert' and self.is_quiet_hours(notification.user):
-            # Schedule for after quiet hours
-            preferences = self.get_user_preferences(notification.user)
-            tomorrow = timezone.now().date() + timezone.timedelta(days=1)
-            notification.scheduled_for = timezone.datetime.combine(tomorrow, preferences.quiet_hours_end)
-            notification.save()
+        if self.defer_for_quiet_hours(notification):
             return True
         
         success = False
@@ -199,37 +255,31 @@ class NotificationService:
     def create_notification_from_template(self, user, template_name, context, channel=None, scheduled_for=None):
         """Create notification using template"""
         try:
-            template = NotificationTemplate.objects.get(name=template_name, is_active=True)
+            template = get_template_registry().get(template_name)
             
             # Determine channel based on user preferences if not specified
             if not channel:
-                preferences = self.get_user_preferences(user)
-                channel_mapping = {
-                    'queue_update': preferences.queue_updates,
-                    'appointment_reminder': preferences.appointment_reminders,
-                    'delay_alert': preferences.delay_alerts,
-                    'test_ready': preferences.test_results,
-                }
-                channel = channel_mapping.get(template.type, 'sms')
+                channel = self.preferred_channel(self.get_user_preferences(user), template.type)
             
             # Render template
             title, message = template.render(context)
             
-            # Create notification
-            notification = Notification.objects.create(
-                user=user,
-                type=template.type,
-                channel=channel,
-                title=title,
-                message=message,
-                scheduled_for=scheduled_for
-            )
-            
-            self.log_notification_action(notification, 'created', f"From template: {template_name}")
-            
-            # Send immediately if not scheduled
-            if not scheduled_for:
-                self.send_notification(notification)
+            with audit_log.batch():
+                # Create notification
+                notification = Notification.objects.create(
+                    user=user,
+                    type=template.type,
+                    channel=channel,
+                    title=title,
+                    message=message,
+                    scheduled_for=scheduled_for
+                )
+                
+                self.log_notification_action(notification, 'created', f"From template: {template_name}")
+                
+                # Send immediately if not scheduled
+                if not scheduled_for and self.delivery_mode != 'outbox':
+                    self.send_notification(notification)
             
             return notification
             
@@ -240,22 +290,88 @@ class NotificationService:
             logger.error(f"Error creating notification from template {template_name}: {str(e)}")
             return None
     
-    def create_and_send_notification(self, user, notification_type, title, message, channel='sms', scheduled_for=None):
-        """Create notification record and send it"""
-        notification = Notification.objects.create(
-            user=user,
-            type=notification_type,
-            channel=channel,
-            title=title,
-            message=message,
-            scheduled_for=scheduled_for
-        )
+    def preferred_channel(self, preferences, notification_type):
+        """Channel a user prefers for a notification type"""
+        channel_mapping = {
+            'queue_update': preferences.queue_updates,
+            'appointment_reminder': preferences.appointment_reminders,
+            'delay_alert': preferences.delay_alerts,
+            'test_ready': preferences.test_results,
+        }
+        return channel_mapping.get(notification_type, 'sms')
+    
+    def broadcast(self, users, template, context=None, contexts=None, channel=None, scheduled_for=None):
+        """
+        Notify many users from one template with a handful of queries.
+        template is a template name or a (possibly unsaved) NotificationTemplate;
+        context is shared by every user; contexts maps user ids to extra
+        variables, or is a list with one context per entry of users, which
+        may then name a user more than once (one notification per entry).
+        Preferences are read in one query, notifications and their
+        logs are bulk-created, and the batch is sent through the dispatcher
+        (left to the dispatch_notifications worker in outbox mode).
+        """
+        if isinstance(template, str):
+            try:
+                template = get_template_registry().get(template)
+            except NotificationTemplate.DoesNotExist:
+                logger.error(f"Template {template} not found")
+                return []
+        users = list(users)
+        if not users:
+            return []
+        if contexts is None or isinstance(contexts, dict):
+            contexts = [(contexts or {}).get(user.id, {}) for user in users]
+        elif len(contexts) != len(users):
+            raise ValueError('contexts must hold one context per user')
         
-        self.log_notification_action(notification, 'created')
+        if not channel:
+            preferences = self.get_many_preferences(users)
         
-        # Send immediately if not scheduled
-        if not scheduled_for:
-            self.send_notification(notification)
+        rendered = template.render_many(
+            {**(context or {}), **extra} for extra in contexts
+        )
+        notifications = [
+            Notification(
+                user=user,
+                type=template.type,
+                channel=channel or self.preferred_channel(preferences[user.id], template.type),
+                title=title,
+                message=message,
+                scheduled_for=scheduled_for
+            )
+            for user, (title, message) in zip(users, rendered)
+        ]
+        with audit_log.batch():
+            notifications = Notification.objects.bulk_create(notifications)
+            for notification in notifications:
+                self.log_notification_action(notification, 'created', f"Broadcast: {template.name}")
+            # bulk_create bypasses Notification.save()
+            unread_counter.adjust_many(Counter(notification.user_id for notification in notifications))
+            
+            if not scheduled_for and self.delivery_mode != 'outbox':
+                NotificationDispatcher(batch_size=len(notifications), concurrency={}, service=self).drain(
+                    Notification.objects.filter(id__in=[notification.id for notification in notifications])
+                )
+        return notifications
+    
+    def create_and_send_notification(self, user, notification_type, title, message, channel='sms', scheduled_for=None):
+        """Create notification record and send it"""
+        with audit_log.batch():
+            notification = Notification.objects.create(
+                user=user,
+                type=notification_type,
+                channel=channel,
+                title=title,
+                message=message,
+                scheduled_for=scheduled_for
+            )
+            
+            self.log_notification_action(notification, 'created')
+            
+            # Send immediately if not scheduled
+            if not scheduled_for and self.delivery_mode != 'outbox':
+                self.send_notification(notification)
         
         return notification
     
@@ -265,9 +381,7 @@ class NotificationService:
             status='pending',
             scheduled_for__lte=timezone.now()
         )
-        
-        for notification in due_notifications:
-            self.send_notification(notification)
+        NotificationDispatcher(concurrency={}, service=self).drain(due_notifications)
     
     def process_retry_notifications(self):
         """Process notifications scheduled for retry"""
@@ -275,24 +389,18 @@ class NotificationService:
             status='retry',
             next_retry_at__lte=timezone.now()
         )
-        
-        for notification in retry_notifications:
-            self.send_notification(notification)
+        NotificationDispatcher(concurrency={}, service=self).drain(retry_notifications)
     
     def log_notification_action(self, notification, action, details=''):
-        """Log notification action for audit trail"""
-        NotificationLog.objects.create(
-            notification=notification,
-            action=action,
-            details=details
-        )
+        """Log notification action for audit trail (buffered inside audit_log.batch())"""
+        audit_log.log(notification, action, details)
     
     def send_queue_position_update(self, queue_entry):
         """Send notification about queue position update"""
         context = {
             'patient_name': queue_entry.patient.user.get_full_name(),
             'queue_name': queue_entry.queue.name,
-            'position': queue_entry.position,
+            'position': queue_entry.queue_position,
             'estimated_wait': queue_entry.queue.estimated_wait_time,
         }
         
@@ -345,3 +453,168 @@ class NotificationService:
             context=context,
             channel='email'  # Lab results typically sent via email
         )
+
+class NotificationDispatcher:
+    """
+    Drains the notification outbox. Due notifications are claimed in bounded
+    batches (SELECT ... FOR UPDATE SKIP LOCKED, then flipped to 'sending'), so
+    several dispatcher processes can run side by side without double-sending,
+    and each channel is sent on its own worker pool. A new batch is only
+    claimed once the previous one finished, which caps in-flight sends.
+    """
+    # Claims older than this are assumed to belong to a crashed dispatcher
+    CLAIM_TIMEOUT = timezone.timedelta(minutes=5)
+
+    def __init__(self, batch_size=100, concurrency=None, service=None):
+        self.batch_size = batch_size
+        # {channel: workers}; channels left out are sent inline
+        if concurrency is None:
+            concurrency = getattr(settings, 'NOTIFICATION_DISPATCH_CONCURRENCY', {})
+        self.concurrency = concurrency
+        self.service = service or NotificationService()
+        self._pools = {}
+
+    def due_notifications(self):
+        now = timezone.now()
+        return Notification.objects.filter(
+            Q(status='pending', scheduled_for__isnull=True) |
+            Q(status='pending', scheduled_for__lte=now) |
+            Q(status='retry', next_retry_at__lte=now) |
+            Q(status='sending', claimed_at__lte=now - self.CLAIM_TIMEOUT)
+        ).order_by('created_at')
+
+    def claim(self, queryset=None):
+        """
+        Claim up to batch_size due notifications, optionally narrowed by a
+        queryset. Rows locked by another dispatcher are skipped rather than
+        waited on; the conditional update keeps claims exclusive on backends
+        without row locks.
+        """
+        queryset = self.due_notifications() if queryset is None else self.due_notifications() & queryset
+        with write_locked_atomic():
+            ids = list(queryset.select_for_update(skip_locked=True).values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                return []
+            claimed_at = timezone.now()
+            queryset.filter(id__in=ids).update(status='sending', claimed_at=claimed_at)
+        return list(Notification.objects.filter(
+            id__in=ids,
+            status='sending',
+            claimed_at=claimed_at
+        ).select_related('user'))
+
+    def dispatch_batch(self, queryset=None):
+        """Claim and send one batch; returns (dispatched, succeeded)"""
+        batch = self.claim(queryset)
+        if not batch:
+            return 0, 0
+        results = []
+        futures = []
+        for send, notifications in self._tasks(batch):
+            pool = self._pool(notifications[0].channel)
+            if pool is None:
+                results.extend(self._run(send, notifications))
+            else:
+                futures.append(pool.submit(self._run_in_thread, send, notifications))
+        for future in futures:
+            results.extend(future.result())
+        return len(batch), sum(1 for result in results if result)
+
+    def drain(self, queryset=None):
+        """Dispatch batches until nothing is due; returns the number dispatched"""
+        total = 0
+        try:
+            while True:
+                dispatched, _ = self.dispatch_batch(queryset)
+                if not dispatched:
+                    return total
+                total += dispatched
+        finally:
+            self.close()
+
+    def run(self, interval=1.0, max_interval=30.0, once=False):
+        """
+        Dispatch until stopped (or, with once, until the outbox is drained).
+        Polling backs off exponentially while the outbox is idle or every
+        send in a batch fails, so a provider outage is not hammered.
+        """
+        delay = interval
+        try:
+            while True:
+                dispatched, succeeded = self.dispatch_batch()
+                if dispatched and succeeded:
+                    delay = interval
+                    continue
+                if once and not dispatched:
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, max_interval)
+        finally:
+            self.close()
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools = {}
+
+    def _pool(self, channel):
+        """Worker pool for a channel, or None to send inline"""
+        workers = self.concurrency.get(channel, 1)
+        if workers <= 1:
+            return None
+        if channel not in self._pools:
+            self._pools[channel] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"notify-{channel}")
+        return self._pools[channel]
+
+    def _tasks(self, batch):
+        """
+        Split a batch into (send, notifications) units. Emails are spread over
+        the email workers, each sending its share over one SMTP connection;
+        other channels are sent one notification at a time.
+        """
+        emails = [notification for notification in batch if notification.channel == 'email']
+        workers = max(1, self.concurrency.get('email', 1))
+        for i in range(min(workers, len(emails))):
+            yield self._send_emails, emails[i::workers]
+        for notification in batch:
+            if notification.channel != 'email':
+                yield self._send_one, [notification]
+
+    def _send_one(self, notifications):
+        return [self.service.send_notification(notifications[0])]
+
+    def _send_emails(self, notifications):
+        due = [notification for notification in notifications if not self.service.defer_for_quiet_hours(notification)]
+        sent = dict(zip((notification.id for notification in due), self.service.send_email_batch(due))) if due else {}
+        return [sent.get(notification.id, True) for notification in notifications]
+
+    def _run(self, send, notifications):
+        with audit_log.batch():
+            return self._run_batched(send, notifications)
+
+    def _run_batched(self, send, notifications):
+        try:
+            results = send(notifications)
+        except Exception as e:
+            logger.error(f"Dispatch failed for notifications {[n.id for n in notifications]}: {str(e)}")
+            results = [False] * len(notifications)
+        # Quiet-hours deferrals and channels that could not deliver without
+        # recording a status (e.g. no channel layer) still hold the claim
+        for notification in notifications:
+            if notification.status == 'sending':
+                if self._is_deferred(notification):
+                    notification.status = 'pending'
+                    notification.save()
+                elif not notification.schedule_retry():
+                    notification.mark_as_failed("Delivery channel unavailable")
+        return results
+
+    def _run_in_thread(self, send, notifications):
+        try:
+            return self._run(send, notifications)
+        finally:
+            # Worker threads hold their own database connections
+            connection.close()
+
+    def _is_deferred(self, notification):
+        return notification.scheduled_for is not None and notification.scheduled_for > timezone.now()
@@ -0,0 +1,136 @@
+import itertools
+import threading
+import time
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioException, TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+class SMSError(Exception):
+    """Raised by SMS transports; retryable errors are worth sending again later"""
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class RateLimiter:
+    """Token bucket allowing rate sends per second, with bursts up to burst"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a send is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class BaseSMSTransport:
+    """
+    Sends SMS through one provider. A transport is shared by every thread in
+    the process, so implementations must be thread-safe.
+    """
+    def __init__(self, rate_limit=None, burst=None):
+        self.rate_limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+
+    def send(self, to, body, status_callback=None):
+        """Send a message and return the provider's message id; raises SMSError"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        return self._send(to, body, status_callback)
+
+    def _send(self, to, body, status_callback):
+        raise NotImplementedError
+
+class TwilioTransport(BaseSMSTransport):
+    """
+    Twilio over one pooled keep-alive HTTP session, so sends reuse connections
+    instead of re-establishing TLS for every message.
+    """
+    # Rate limited, queue full and similar transient errors
+    RETRYABLE_CODES = {20003, 20429, 21610}
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None,
+                 pool_size=10, max_retries=None, timeout=10, http_client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.from_number = from_number or settings.TWILIO_PHONE_NUMBER
+        if http_client is None:
+            http_client = TwilioHttpClient(pool_connections=True, timeout=timeout)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=max_retries or 0)
+            http_client.session.mount('https://', adapter)
+            http_client.session.mount('http://', adapter)
+        self.client = Client(
+            account_sid or settings.TWILIO_ACCOUNT_SID,
+            auth_token or settings.TWILIO_AUTH_TOKEN,
+            http_client=http_client
+        )
+
+    def _send(self, to, body, status_callback):
+        try:
+            message = self.client.messages.create(
+                body=body,
+                from_=self.from_number,
+                to=to,
+                status_callback=status_callback
+            )
+        except TwilioRestException as e:
+            raise SMSError(f"Twilio error: {str(e)}", retryable=e.code in self.RETRYABLE_CODES) from e
+        except TwilioException as e:
+            raise SMSError(f"Twilio error: {str(e)}") from e
+        return message.sid
+
+class FakeSMSTransport(BaseSMSTransport):
+    """
+    In-process provider for tests and load benchmarks: records every message
+    and optionally simulates provider latency or failures.
+    """
+    def __init__(self, latency=0, fail_numbers=(), **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.fail_numbers = set(fail_numbers)
+        self.messages = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _send(self, to, body, status_callback):
+        if self.latency:
+            time.sleep(self.latency)
+        if to in self.fail_numbers:
+            raise SMSError(f"Fake provider rejected {to}")
+        with self._lock:
+            message_id = f"FAKE{next(self._ids)}"
+            self.messages.append({'id': message_id, 'to': to, 'body': body})
+        return message_id
+
+_sms_transport = None
+
+def configure_sms_transport(transport):
+    """Install a transport (or None to rebuild from settings) for the process"""
+    global _sms_transport
+    _sms_transport = transport
+
+def get_sms_transport():
+    """
+    Get the process-wide SMS transport built from SMS_TRANSPORT, or None when
+    the default Twilio transport has no credentials.
+    """
+    global _sms_transport
+    if _sms_transport is None:
+        config = getattr(settings, 'SMS_TRANSPORT', {})
+        backend = config.get('BACKEND', 'notifications.sms.TwilioTransport')
+        transport_class = import_string(backend)
+        if issubclass(transport_class, TwilioTransport) and not (settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN):
+            return None
+        _sms_transport = transport_class(**config.get('OPTIONS', {}))
+    return _sms_transport
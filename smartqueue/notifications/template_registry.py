@@ -0,0 +1,88 @@
+import re
+import threading
+import time
+from django.conf import settings
+from smartqueue.shared_cache import get_shared_cache
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+class CompiledTemplate:
+    """
+    A template string split once into literal text and {name} fields.
+    Placeholders missing from the context are left as-is, and substituted
+    values are never scanned for further placeholders.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.parts = []
+        last = 0
+        for match in PLACEHOLDER.finditer(source):
+            self.parts.append((source[last:match.start()], match.group(1)))
+            last = match.end()
+        self.tail = source[last:]
+
+    def render(self, context):
+        pieces = []
+        for literal, name in self.parts:
+            pieces.append(literal)
+            pieces.append(str(context[name]) if name in context else f"{{{name}}}")
+        pieces.append(self.tail)
+        return ''.join(pieces)
+
+class TemplateRegistry:
+    """
+    In-process registry of active NotificationTemplates, loaded with one query
+    and reloaded after invalidate() or once the timeout passes. With the
+    shared cache configured, invalidate() also bumps a version stamp there
+    that every process checks on read, so template saves reach all of them
+    at once; without it other processes pick edits up at the timeout.
+    """
+    VERSION_KEY = 'notification_templates_version'
+
+    def __init__(self, timeout=300):
+        self.timeout = timeout
+        self._templates = None
+        self._version = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Active template by name; raises NotificationTemplate.DoesNotExist"""
+        from .models import NotificationTemplate
+        template = self.templates().get(name)
+        if template is None:
+            raise NotificationTemplate.DoesNotExist(f"No active notification template '{name}'")
+        return template
+
+    def templates(self):
+        shared = get_shared_cache()
+        version = shared.get(self.VERSION_KEY, 0) if shared is not None else None
+        with self._lock:
+            if self._templates is None or self._expires_at <= time.monotonic() or self._version != version:
+                from .models import NotificationTemplate
+                self._templates = {
+                    template.name: template
+                    for template in NotificationTemplate.objects.filter(is_active=True)
+                }
+                self._version = version
+                self._expires_at = time.monotonic() + self.timeout
+            return self._templates
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.add(self.VERSION_KEY, 0, None)
+            shared.incr(self.VERSION_KEY)
+
+_template_registry = None
+
+def get_template_registry():
+    """Get the process-wide template registry"""
+    global _template_registry
+    if _template_registry is None:
+        _template_registry = TemplateRegistry(
+            timeout=getattr(settings, 'NOTIFICATION_TEMPLATE_CACHE_TIMEOUT', 300)
+        )
+    return _template_registry
@@ -1,7 +1,48 @@
-from django.test import TestCase
+import json
+from io import StringIO
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import TemplateDoesNotExist
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 from django.urls import reverse
-from .models import Notification, NotificationPreference
+from django.utils import timezone
+from .models import Notification, NotificationArchive, NotificationLog, NotificationPreference, NotificationTemplate
+from .preferences import PreferenceCache, get_preference_cache
+from . import services
+from .audit import audit_log
+from .unread import unread_counter
+from .services import NotificationDispatcher, NotificationService
+from .sms import FakeSMSTransport, RateLimiter, TwilioTransport, configure_sms_transport, get_sms_transport
+from .template_registry import CompiledTemplate, TemplateRegistry, get_template_registry
 from users.models import User
+from twilio.http.http_client import TwilioHttpClient
+from unittest import skipIf
+from smartqueue.shared_cache import get_shared_cache
+try:
+	import fakeredis
+except ImportError:
+	fakeredis = None
+
+# Redis cache backend on an in-process fake server, standing in for the shared cache
+SHARED_CACHES = {
+	"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+	"shared": {
+		"BACKEND": "django.core.cache.backends.redis.RedisCache",
+		"LOCATION": "redis://shared-cache-test/0",
+		"OPTIONS": {"connection_class": fakeredis.FakeConnection if fakeredis else None},
+	},
+}
 
 class NotificationModelTest(TestCase):
 	def setUp(self):
@@ -51,3 +92,529 @@ class NotificationAPITest(TestCase):
 		response = self.client.get(url)
 		self.assertEqual(response.status_code, 200)
 		self.assertIn("Queue Update", str(response.content))
+
+@override_settings(NOTIFICATION_DELIVERY_MODE='outbox')
+class NotificationOutboxTest(TestCase):
+	def setUp(self):
+		get_preference_cache().clear()
+		self.user = User.objects.create_user(username="outbox", email="outbox@example.com", password="pass", role="patient")
+		self.service = NotificationService()
+
+	def test_outbox_mode_only_records_notification(self):
+		notification = self.service.create_and_send_notification(
+			self.user, "queue_update", "Queue Update", "You are next.", channel="email"
+		)
+		notification.refresh_from_db()
+		self.assertEqual(notification.status, "pending")
+		self.assertEqual(len(mail.outbox), 0)
+
+	def test_dispatcher_drains_outbox(self):
+		self.service.create_and_send_notification(self.user, "queue_update", "One", "First.", channel="email")
+		self.service.create_and_send_notification(self.user, "queue_update", "Two", "Second.", channel="email")
+		NotificationDispatcher(batch_size=1, concurrency={}).run(interval=0, once=True)
+		self.assertEqual(Notification.objects.filter(status="sent").count(), 2)
+		self.assertEqual(len(mail.outbox), 2)
+
+	def test_email_template_misses_are_cached(self):
+		services._email_templates.clear()
+		with patch.object(services, "get_template", side_effect=TemplateDoesNotExist("queue_update")) as lookup:
+			for title in ("One", "Two"):
+				self.service.send_email(Notification.objects.create(user=self.user, type="queue_update", channel="email", title=title, message="Hi."))
+		self.assertEqual(lookup.call_count, 1)
+		self.assertIn("<h2>Two</h2>", mail.outbox[1].alternatives[0][0])
+
+	def test_dispatcher_skips_notifications_not_yet_due(self):
+		later = timezone.now() + timezone.timedelta(hours=1)
+		self.service.create_and_send_notification(self.user, "queue_update", "Later", "Later.", channel="email", scheduled_for=later)
+		self.assertEqual(NotificationDispatcher(concurrency={}).dispatch_batch(), (0, 0))
+
+	def test_undeliverable_channel_is_retried(self):
+		notification = self.service.create_and_send_notification(
+			self.user, "queue_update", "Queue Update", "You are next.", channel="websocket"
+		)
+		with patch.object(NotificationService, "send_websocket", return_value=False):
+			NotificationDispatcher(concurrency={}).dispatch_batch()
+		notification.refresh_from_db()
+		self.assertEqual(notification.status, "retry")
+		self.assertEqual(NotificationDispatcher(concurrency={}).dispatch_batch(), (0, 0))
+
+@override_settings(NOTIFICATION_DELIVERY_MODE='outbox')
+class NotificationBroadcastTest(TestCase):
+	def setUp(self):
+		get_preference_cache().clear()
+		get_template_registry().invalidate()
+		self.users = [
+			User.objects.create_user(username=f"broadcast{i}", email=f"broadcast{i}@example.com", password="pass", role="patient")
+			for i in range(20)
+		]
+		NotificationPreference.objects.create(user=self.users[0], delay_alerts="email")
+		NotificationTemplate.objects.create(
+			name="delay_alert",
+			type="delay_alert",
+			channel="sms",
+			title_template="Delay - {queue_name}",
+			message_template="Hi {name}, {queue_name} is running late."
+		)
+		self.service = NotificationService()
+
+	def test_broadcast_uses_constant_queries(self):
+		contexts = {user.id: {"name": user.username} for user in self.users}
+		with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+			notifications = self.service.broadcast(self.users, "delay_alert", {"queue_name": "Main Queue"}, contexts)
+		self.assertLessEqual(len(queries), 6)
+		self.assertEqual(len(notifications), 20)
+		self.assertEqual(NotificationLog.objects.filter(action="created").count(), 20)
+		first = Notification.objects.get(user=self.users[0])
+		self.assertEqual(first.channel, "email")
+		self.assertEqual(first.message, "Hi broadcast0, Main Queue is running late.")
+		self.assertEqual(Notification.objects.get(user=self.users[1]).channel, "sms")
+		self.assertEqual(Notification.objects.filter(status="pending").count(), 20)
+
+	@override_settings(NOTIFICATION_DELIVERY_MODE='immediate')
+	def test_broadcast_sends_batch_in_immediate_mode(self):
+		service = NotificationService()
+		service.broadcast(self.users[:3], "delay_alert", {"queue_name": "Main Queue", "name": "you"}, channel="email")
+		self.assertEqual(len(mail.outbox), 3)
+		self.assertEqual(Notification.objects.filter(status="sent").count(), 3)
+
+	def test_unknown_template_creates_nothing(self):
+		self.assertEqual(self.service.broadcast(self.users, "missing"), [])
+		self.assertFalse(Notification.objects.exists())
+
+class PreferenceCacheTest(TestCase):
+	def setUp(self):
+		get_preference_cache().clear()
+		self.users = [
+			User.objects.create_user(username=f"pref{i}", email=f"pref{i}@example.com", password="pass", role="patient")
+			for i in range(3)
+		]
+		NotificationPreference.objects.create(user=self.users[0], queue_updates="email")
+
+	def test_batch_load_then_served_from_memory(self):
+		preference_cache = PreferenceCache()
+		with self.assertNumQueries(1):
+			preferences = preference_cache.get_many(self.users)
+		self.assertEqual(preferences[self.users[0].id].queue_updates, "email")
+		self.assertEqual(preferences[self.users[1].id].queue_updates, "sms")
+		self.assertFalse(NotificationPreference.objects.filter(user=self.users[1]).exists())
+		with self.assertNumQueries(0):
+			preference_cache.get(self.users[0])
+
+	def test_ttl_and_lru_bounds(self):
+		expired = PreferenceCache(timeout=0)
+		expired.get(self.users[0])
+		with self.assertNumQueries(1):
+			expired.get(self.users[0])
+		bounded = PreferenceCache(max_size=2)
+		bounded.get_many(self.users)
+		with self.assertNumQueries(1):
+			bounded.get(self.users[0])
+
+	@skipIf(fakeredis is None, "fakeredis not installed")
+	@override_settings(CACHES=SHARED_CACHES)
+	def test_shared_backing_is_used_across_processes(self):
+		get_shared_cache().clear()
+		PreferenceCache(shared=True).get(self.users[0])
+		with self.assertNumQueries(0):
+			self.assertEqual(PreferenceCache(shared=True).get(self.users[0]).queue_updates, "email")
+
+	@skipIf(fakeredis is None, "fakeredis not installed")
+	@override_settings(CACHES=SHARED_CACHES)
+	def test_shared_entries_hold_only_preference_fields(self):
+		get_shared_cache().clear()
+		PreferenceCache(shared=True).get_many(self.users[:2])
+		for user in self.users[:2]:
+			version, values = get_shared_cache().get(PreferenceCache.CACHE_KEY.format(user_id=user.id))
+			self.assertEqual(values["user_id"], user.id)
+			self.assertNotIn("user", values)
+			self.assertNotIn(user.password, str(values))
+		preferences = PreferenceCache(shared=True).get_many(self.users[:2])
+		self.assertFalse(preferences[self.users[0].id]._state.adding)
+		self.assertEqual(preferences[self.users[0].id].queue_updates, "email")
+		self.assertIsNone(preferences[self.users[1].id].pk)
+
+	@skipIf(fakeredis is None, "fakeredis not installed")
+	@override_settings(CACHES=SHARED_CACHES)
+	def test_saves_anywhere_invalidate_every_process(self):
+		get_shared_cache().clear()
+		dispatcher = PreferenceCache(shared=True)
+		self.assertEqual(dispatcher.get(self.users[0]).queue_updates, "email")
+		# Saved outside the API, e.g. from a shell or another service
+		with self.captureOnCommitCallbacks(execute=True):
+			NotificationPreference.objects.filter(user=self.users[0]).get().delete()
+		self.assertEqual(dispatcher.get(self.users[0]).queue_updates, "sms")
+		with self.captureOnCommitCallbacks(execute=True):
+			NotificationPreference.objects.create(user=self.users[0], queue_updates="push")
+		self.assertEqual(dispatcher.get(self.users[0]).queue_updates, "push")
+
+	def test_preference_view_update_invalidates(self):
+		service = NotificationService()
+		self.assertEqual(service.get_user_preferences(self.users[0]).queue_updates, "email")
+		client = APIClient()
+		client.force_authenticate(user=self.users[0])
+		with self.captureOnCommitCallbacks(execute=True):
+			response = client.patch(reverse("notification-preferences"), {"queue_updates": "sms"}, format="json")
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(service.get_user_preferences(self.users[0]).queue_updates, "sms")
+
+class AuditLogTest(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="audited", email="audited@example.com", password="pass", role="patient")
+		self.notifications = [
+			Notification.objects.create(user=self.user, type="queue_update", channel="email", title=f"Audit {i}", message="Hi.")
+			for i in range(5)
+		]
+
+	def log_inserts(self, queries):
+		return [query for query in queries if query["sql"].startswith('INSERT INTO "notifications_notificationlog"')]
+
+	def test_batch_is_written_once_at_commit(self):
+		with CaptureQueriesContext(connection) as queries:
+			with self.captureOnCommitCallbacks(execute=True) as callbacks:
+				with audit_log.batch():
+					for notification in self.notifications:
+						audit_log.log(notification, "sent")
+						audit_log.log(notification, "delivered")
+				self.assertFalse(NotificationLog.objects.exists())
+		self.assertEqual(len(callbacks), 1)
+		self.assertEqual(len(self.log_inserts(queries.captured_queries)), 1)
+		self.assertEqual(NotificationLog.objects.count(), 10)
+
+	def test_records_for_rolled_back_notifications_are_dropped(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			with audit_log.batch():
+				audit_log.log(self.notifications[0], "sent")
+				try:
+					with transaction.atomic():
+						rolled_back = Notification.objects.create(user=self.user, type="queue_update", channel="sms", title="Gone", message="Hi.")
+						audit_log.log(rolled_back, "created")
+						raise RuntimeError
+				except RuntimeError:
+					pass
+		self.assertEqual(list(NotificationLog.objects.values_list("notification_id", flat=True)), [self.notifications[0].id])
+
+	def test_dispatcher_writes_one_log_insert_per_unit(self):
+		with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+			NotificationDispatcher(concurrency={}).dispatch_batch()
+		self.assertEqual(len(self.log_inserts(queries.captured_queries)), 1)
+		self.assertEqual(NotificationLog.objects.filter(action="sent").count(), 5)
+
+class NotificationArchiveTest(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username="archived", email="archived@example.com", password="pass", role="patient")
+		self.old = timezone.now() - timezone.timedelta(days=120)
+
+	def notify(self, status, created_at=None):
+		notification = Notification.objects.create(user=self.user, type="queue_update", channel="sms", title=status, message="Hi.", status=status)
+		if created_at:
+			Notification.objects.filter(id=notification.id).update(created_at=created_at)
+		return notification
+
+	def test_old_sent_and_failed_rows_move_in_chunks(self):
+		sent = self.notify("sent", self.old)
+		self.notify("failed", self.old)
+		pending = self.notify("pending", self.old)
+		recent = self.notify("sent")
+		NotificationLog.objects.create(notification=sent, action="sent")
+		out = StringIO()
+		call_command("archive_notifications", days=90, chunk_size=1, stdout=out)
+		self.assertIn("2 notification(s) archived", out.getvalue())
+		self.assertEqual(set(Notification.objects.values_list("id", flat=True)), {pending.id, recent.id})
+		archived = NotificationArchive.objects.get(id=sent.id)
+		self.assertEqual((archived.status, archived.user, archived.created_at), ("sent", self.user, self.old))
+		log = NotificationLog.objects.get()
+		self.assertEqual(log.notification_id, sent.id)
+		self.assertTrue(str(log).startswith(f"{sent.id} - sent at "))
+		admin = User.objects.create_superuser(username="logadmin", email="logadmin@example.com", password="pass")
+		self.client.force_login(admin)
+		response = self.client.get(reverse("admin:notifications_notificationlog_changelist"), {"q": sent.id})
+		self.assertEqual(list(response.context["cl"].result_list), [log])
+		self.assertEqual(self.client.get(reverse("admin:notifications_notificationlog_change", args=[log.id])).status_code, 200)
+
+	def test_hot_path_indexes_exist(self):
+		with connection.cursor() as cursor:
+			constraints = connection.introspection.get_constraints(cursor, Notification._meta.db_table)
+		indexed = {tuple(constraint["columns"]) for constraint in constraints.values() if constraint["index"]}
+		for columns in [("status", "scheduled_for"), ("status", "next_retry_at"), ("external_id",)]:
+			self.assertIn(columns, indexed)
+		self.assertIn("notification_user_unread_idx", constraints)
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+@override_settings(CACHES=SHARED_CACHES)
+class UnreadCounterTest(TestCase):
+	def setUp(self):
+		get_shared_cache().clear()
+		self.user = User.objects.create_user(username="reader", email="reader@example.com", password="pass", role="patient")
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.notifications = [self.notify() for _ in range(3)]
+
+	def notify(self):
+		return Notification.objects.create(user=self.user, type="queue_update", channel="websocket", title="Update", message="Hi.")
+
+	def test_counter_is_served_from_cache_and_kept_incrementally(self):
+		self.assertEqual(unread_counter.get(self.user.id), 3)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.notify()
+			self.client.post(reverse("notification-mark-read", args=[self.notifications[0].id]))
+			self.notifications[1].mark_as_sent()
+		with self.assertNumQueries(0):
+			self.assertEqual(unread_counter.get(self.user.id), 3)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(reverse("notification-mark-all-read"))
+		self.assertEqual(self.client.get(reverse("notification-unread-count")).data, {"unread_count": 0})
+
+	@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+	def test_changes_are_pushed_to_user_group(self):
+		channel_layer = get_channel_layer()
+		channel_name = async_to_sync(channel_layer.new_channel)()
+		async_to_sync(channel_layer.group_add)(f"user_{self.user.id}", channel_name)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.notify()
+		message = async_to_sync(channel_layer.receive)(channel_name)
+		self.assertEqual(message, {"type": "unread_count_message", "count": 4})
+
+	def test_reconcile_command_repairs_drift(self):
+		get_shared_cache().set(unread_counter.key(self.user.id), 7)
+		out = StringIO()
+		call_command("reconcile_unread_counts", "--check", user_ids=[self.user.id], stdout=out)
+		self.assertIn(f"User {self.user.id}: 7 -> 3", out.getvalue())
+		self.assertEqual(unread_counter.get(self.user.id), 7)
+		call_command("reconcile_unread_counts", stdout=StringIO())
+		self.assertEqual(unread_counter.get(self.user.id), 3)
+
+	def test_process_local_cache_is_not_used_for_counters(self):
+		with override_settings(CACHES={"default": SHARED_CACHES["default"], "shared": SHARED_CACHES["default"]}):
+			self.assertIsNone(get_shared_cache())
+			# Another process marking a notification read is seen on the next read
+			Notification.objects.filter(id=self.notifications[0].id).update(read_at=timezone.now())
+			with self.assertNumQueries(1):
+				self.assertEqual(self.client.get(reverse("notification-unread-count")).data, {"unread_count": 2})
+
+class TemplateRegistryTest(TestCase):
+	def setUp(self):
+		get_template_registry().invalidate()
+		self.template = NotificationTemplate.objects.create(
+			name="consultation_ready",
+			type="consultation_ready",
+			channel="sms",
+			title_template="Ready - {department}",
+			message_template="Hi {patient_name}, please go to {department}."
+		)
+
+	def test_compiled_rendering(self):
+		compiled = CompiledTemplate("{a} and {b} {{c}} {a}")
+		self.assertEqual(compiled.render({"a": "{b}", "c": 3}), "{b} and {b} {3} {b}")
+		self.assertEqual(
+			self.template.render_many([{"department": "OPD", "patient_name": "Ann"}, {"department": "Lab"}]),
+			[("Ready - OPD", "Hi Ann, please go to OPD."), ("Ready - Lab", "Hi {patient_name}, please go to Lab.")]
+		)
+
+	def test_registry_loads_once_and_reloads_after_any_save(self):
+		registry = get_template_registry()
+		with self.assertNumQueries(1):
+			registry.get("consultation_ready")
+			registry.get("consultation_ready")
+			with self.assertRaises(NotificationTemplate.DoesNotExist):
+				registry.get("missing")
+		self.template.title_template = "Now ready - {department}"
+		with self.captureOnCommitCallbacks(execute=True):
+			self.template.save()
+		self.assertEqual(registry.get("consultation_ready").render({"department": "OPD"})[0], "Now ready - OPD")
+
+	@skipIf(fakeredis is None, "fakeredis not installed")
+	@override_settings(CACHES=SHARED_CACHES)
+	def test_saves_reach_every_process(self):
+		get_shared_cache().clear()
+		other_process = TemplateRegistry()
+		other_process.get("consultation_ready")
+		with self.captureOnCommitCallbacks(execute=True):
+			NotificationTemplate.objects.filter(id=self.template.id).get().delete()
+		with self.assertRaises(NotificationTemplate.DoesNotExist):
+			other_process.get("consultation_ready")
+		with self.assertNumQueries(0):
+			with self.assertRaises(NotificationTemplate.DoesNotExist):
+				other_process.get("consultation_ready")
+
+class SMSTransportTest(TestCase):
+	def setUp(self):
+		get_preference_cache().clear()
+		self.transport = FakeSMSTransport(fail_numbers={"+15550009999"})
+		configure_sms_transport(self.transport)
+		self.addCleanup(configure_sms_transport, None)
+		self.user = User.objects.create_user(username="texted", email="texted@example.com", phone_number="5551230000", password="pass", role="patient")
+
+	def notify(self):
+		return Notification.objects.create(user=self.user, type="queue_update", channel="sms", title="Queue Update", message="You are next.")
+
+	def test_services_share_the_process_transport(self):
+		notification = self.notify()
+		self.assertTrue(NotificationService().send_sms(notification))
+		self.assertTrue(NotificationService().send_sms(self.notify()))
+		self.assertEqual([message["to"] for message in self.transport.messages], ["+15551230000"] * 2)
+		notification.refresh_from_db()
+		self.assertEqual((notification.status, notification.external_id), ("sent", "FAKE1"))
+
+	def test_provider_rejection_marks_failed(self):
+		self.user.phone_number = "+15550009999"
+		self.user.save()
+		notification = self.notify()
+		self.assertFalse(NotificationService().send_sms(notification))
+		self.assertEqual(notification.status, "failed")
+
+	@override_settings(SMS_TRANSPORT={"BACKEND": "notifications.sms.FakeSMSTransport"})
+	def test_transport_built_once_from_settings(self):
+		configure_sms_transport(None)
+		self.assertIsInstance(get_sms_transport(), FakeSMSTransport)
+		self.assertIs(get_sms_transport(), get_sms_transport())
+
+	def test_rate_limiter_spaces_sends(self):
+		limiter = RateLimiter(rate=50, burst=1)
+		started = time.monotonic()
+		for _ in range(6):
+			limiter.acquire()
+		self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+	"""Minimal SMTP dialogue that records each message body on the server"""
+	def setup(self):
+		super().setup()
+		with self.server.lock:
+			self.server.connections += 1
+
+	def handle(self):
+		self.wfile.write(b"220 stub ready\r\n")
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			command = line[:4].upper()
+			if command == b"DATA":
+				self.wfile.write(b"354 end with .\r\n")
+				body = []
+				line = self.rfile.readline()
+				while line and line != b".\r\n":
+					body.append(line)
+					line = self.rfile.readline()
+				with self.server.lock:
+					self.server.messages.append(b"".join(body))
+				self.wfile.write(b"250 queued\r\n")
+			elif command == b"QUIT":
+				self.wfile.write(b"221 bye\r\n")
+				return
+			else:
+				self.wfile.write(b"250 ok\r\n")
+
+class StubSMSHandler(BaseHTTPRequestHandler):
+	"""Accepts Twilio message create calls and records the form data"""
+	protocol_version = "HTTP/1.1"
+
+	def setup(self):
+		super().setup()
+		with self.server.lock:
+			self.server.connections += 1
+
+	def do_POST(self):
+		form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+		with self.server.lock:
+			self.server.messages.append(form)
+			sid = f"SM{len(self.server.messages)}"
+		body = json.dumps({"sid": sid, "status": "queued"}).encode()
+		self.send_response(201)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+class StubTwilioHttpClient(TwilioHttpClient):
+	"""Routes Twilio API calls to a local stub server"""
+	def __init__(self, base_url):
+		super().__init__()
+		self.base_url = base_url
+
+	def request(self, method, url, *args, **kwargs):
+		return super().request(method, url.replace("https://api.twilio.com", self.base_url), *args, **kwargs)
+
+@override_settings(
+	EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+	EMAIL_HOST="127.0.0.1",
+	EMAIL_HOST_USER="",
+	EMAIL_USE_TLS=False,
+)
+class NotificationDispatchWorkerTest(TransactionTestCase):
+	def setUp(self):
+		self.smtp_server = self.start_server(socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSMTPHandler))
+		self.sms_server = self.start_server(ThreadingHTTPServer(("127.0.0.1", 0), StubSMSHandler))
+		settings_override = override_settings(EMAIL_PORT=self.smtp_server.server_address[1])
+		settings_override.enable()
+		self.addCleanup(settings_override.disable)
+
+		sms_user = User.objects.create_user(username="sms", email="sms@example.com", phone_number="+15551230000", password="pass", role="patient")
+		email_user = User.objects.create_user(username="mail", email="mail@example.com", password="pass", role="patient")
+		for i in range(15):
+			Notification.objects.create(user=sms_user, type="queue_update", channel="sms", title=f"SMS {i}", message="You are next.")
+			Notification.objects.create(user=email_user, type="queue_update", channel="email", title=f"Email {i}", message="You are next.")
+		base_url = f"http://127.0.0.1:{self.sms_server.server_address[1]}"
+		self.transport = TwilioTransport("ACstub", "token", "+15550000000", http_client=StubTwilioHttpClient(base_url))
+		configure_sms_transport(self.transport)
+		self.addCleanup(configure_sms_transport, None)
+
+	def start_server(self, server):
+		server.daemon_threads = True
+		server.lock = threading.Lock()
+		server.messages = []
+		server.connections = 0
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		self.addCleanup(server.server_close)
+		self.addCleanup(server.shutdown)
+		return server
+
+	def test_concurrent_dispatchers_send_each_notification_once(self):
+		def drain(dispatcher):
+			try:
+				dispatcher.drain()
+			finally:
+				connection.close()
+
+		workers = [
+			threading.Thread(target=drain, args=(NotificationDispatcher(batch_size=4, concurrency={"sms": 3, "email": 3}),))
+			for _ in range(3)
+		]
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+
+		self.assertEqual(len(self.sms_server.messages), 15)
+		self.assertEqual(len(self.smtp_server.messages), 15)
+		self.assertEqual(Notification.objects.filter(status="sent").count(), 30)
+		sids = Notification.objects.filter(channel="sms").values_list("external_id", flat=True)
+		self.assertEqual(len(set(sids)), 15)
+
+	def test_email_batch_shares_one_smtp_connection_per_worker(self):
+		with self.assertLogs("notifications.services", "INFO") as logs:
+			NotificationDispatcher(batch_size=30, concurrency={}).dispatch_batch()
+		self.assertEqual(len(self.smtp_server.messages), 15)
+		self.assertEqual(self.smtp_server.connections, 1)
+		self.assertTrue(any("Email batch: 15/15 sent" in line for line in logs.output))
+		Notification.objects.filter(channel="email").update(status="pending")
+		NotificationDispatcher(batch_size=30, concurrency={"email": 3}).drain(Notification.objects.filter(channel="email"))
+		self.assertEqual(len(self.smtp_server.messages), 30)
+		self.assertEqual(self.smtp_server.connections, 4)
+
+	def test_twilio_transport_reuses_one_connection(self):
+		for i in range(5):
+			self.transport.send("+15551230000", f"Message {i}")
+		self.assertEqual(len(self.sms_server.messages), 5)
+		self.assertEqual(self.sms_server.connections, 1)
+
+	def test_claimed_notifications_are_skipped_until_stale(self):
+		first, second = NotificationDispatcher(batch_size=30), NotificationDispatcher(batch_size=30)
+		self.assertEqual(len(first.claim()), 30)
+		self.assertEqual(second.claim(), [])
+		Notification.objects.update(claimed_at=timezone.now() - NotificationDispatcher.CLAIM_TIMEOUT)
+		self.assertEqual(len(second.claim()), 30)
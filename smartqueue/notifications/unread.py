@@ -0,0 +1,124 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from smartqueue.shared_cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+class UnreadCounter:
+    """
+    Per-user unread notification counts kept in the shared cache and adjusted
+    incrementally after commit, so reads are O(1). A missing key is recounted
+    from the database; reconcile() repairs drift. Without a shared cache every
+    read is a COUNT on the (user, read_at) index, since per-process counters
+    would miss other processes' writes. Every change is pushed to the user's
+    WebSocket group.
+    """
+    CACHE_KEY = 'notification_unread:{user_id}'
+
+    def key(self, user_id):
+        return self.CACHE_KEY.format(user_id=user_id)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'NOTIFICATION_UNREAD_COUNT_TIMEOUT', 60 * 60 * 24)
+
+    def get(self, user_id):
+        cache = get_shared_cache()
+        if cache is None:
+            return self.count(user_id)
+        count = cache.get(self.key(user_id))
+        if count is None:
+            count = self.count(user_id)
+            cache.add(self.key(user_id), count, self.timeout)
+        return count
+
+    def count(self, user_id):
+        return self.count_many([user_id])[user_id]
+
+    def count_many(self, user_ids):
+        """Unread counts from the database as {user_id: count}, in one query"""
+        from .models import Notification
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(Notification.objects.filter(
+            user_id__in=list(counts),
+            read_at__isnull=True
+        ).order_by().values_list('user_id').annotate(count=Count('id')))
+        return counts
+
+    def adjust(self, user_id, delta):
+        """Apply a change once the surrounding transaction commits"""
+        self.adjust_many({user_id: delta})
+
+    def adjust_many(self, deltas):
+        """Apply {user_id: delta} changes in one callback once the transaction commits"""
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if deltas:
+            transaction.on_commit(lambda: self._apply(deltas))
+
+    def _apply(self, deltas):
+        cache = get_shared_cache()
+        if cache is None:
+            if get_channel_layer():
+                for user_id, count in self.count_many(deltas).items():
+                    self.push(user_id, count)
+            return
+        counts = {}
+        stale = []
+        for user_id, delta in deltas.items():
+            try:
+                counts[user_id] = cache.incr(self.key(user_id), delta)
+            except ValueError:
+                # Not cached: caching a recount here would double-count adjustments
+                # from the same commit whose callbacks have not run yet
+                stale.append(user_id)
+            else:
+                if counts[user_id] < 0:
+                    cache.delete(self.key(user_id))
+                    stale.append(user_id)
+        if stale:
+            counts.update(self.count_many(stale))
+        for user_id, count in counts.items():
+            self.push(user_id, count)
+
+    def invalidate(self, user_ids):
+        cache = get_shared_cache()
+        if cache is not None:
+            cache.delete_many([self.key(user_id) for user_id in user_ids])
+
+    def reconcile(self, user_ids, apply=True):
+        """
+        Compare cached counters with the database for these users. Returns
+        {user_id: (cached, actual)} for counters that differed (replaced when
+        apply is set); uncached users are skipped since they recount lazily.
+        """
+        cache = get_shared_cache()
+        if cache is None:
+            return {}
+        user_ids = list(user_ids)
+        cached = cache.get_many([self.key(user_id) for user_id in user_ids])
+        cached = {user_id: cached[self.key(user_id)] for user_id in user_ids if self.key(user_id) in cached}
+        actual = self.count_many(cached) if cached else {}
+        drifted = {user_id: (cached[user_id], actual[user_id]) for user_id in cached if cached[user_id] != actual[user_id]}
+        if apply and drifted:
+            cache.set_many({self.key(user_id): actual[user_id] for user_id in drifted}, self.timeout)
+            for user_id in drifted:
+                self.push(user_id, actual[user_id])
+        return drifted
+
+    def push(self, user_id, count):
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"user_{user_id}",
+                {'type': 'unread_count_message', 'count': count}
+            )
+        except Exception as e:
+            logger.warning(f"Unread count push failed for user {user_id}: {e}")
+
+unread_counter = UnreadCounter()
@@ -78,6 +78,7 @@ from django.views.decorators.http import require_POST
 from .models import Notification, NotificationPreference, NotificationTemplate
 from .serializers import NotificationSerializer, NotificationPreferenceSerializer
 from .services import NotificationService
+from .unread import unread_counter
 import json
 
 class NotificationListView(generics.ListAPIView):
@@ -114,10 +115,10 @@ class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def mark_notification_read(request, notification_id):
+def mark_notification_read(request, pk):
     try:
         notification = Notification.objects.get(
-            id=notification_id,
+            id=pk,
             user=request.user
         )
         notification.read_at = timezone.now()
@@ -134,18 +135,14 @@ def mark_all_read(request):
         user=request.user,
         read_at__isnull=True
     ).update(read_at=timezone.now())
+    unread_counter.adjust(request.user.id, -count)
     
     return Response({'message': f'{count} notifications marked as read'})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def unread_count(request):
-    count = Notification.objects.filter(
-        user=request.user,
-        read_at__isnull=True
-    ).count()
-    
-    return Response({'unread_count': count})
+    return Response({'unread_count': unread_counter.get(request.user.id)})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import Queue, QueueEntry, QueueAnalytics
+from .models import Queue, QueueEntry, QueueAnalytics, QueueWorkload
 
 @admin.register(Queue)
 class QueueAdmin(admin.ModelAdmin):
@@ -19,3 +19,9 @@ class QueueAnalyticsAdmin(admin.ModelAdmin):
 	list_display = ('queue', 'date', 'total_patients', 'avg_wait_time', 'avg_processing_time', 'no_show_count')
 	search_fields = ('queue__name',)
 	list_filter = ('queue', 'date')
+
+
+@admin.register(QueueWorkload)
+class QueueWorkloadAdmin(admin.ModelAdmin):
+	list_display = ('queue', 'emergency_count', 'appointment_count', 'walk_in_count', 'updated_at')
+	search_fields = ('queue__name',)
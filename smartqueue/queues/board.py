@@ -0,0 +1,212 @@
+import logging
+import threading
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+class QueueBoard:
+    """
+    Publishes compact diff events for live queue boards to each queue's
+    queue_<id> channel group. Every publish takes the queue's next version
+    from QueueWorkload.board_version inside the change's own transaction, so
+    versions are shared by all processes and commit or roll back with the
+    change. Committed events are sent on commit; when coalescing is enabled
+    (ASGI servers, see smartqueue/asgi.py) they are buffered per queue for
+    coalesce_seconds first. Each delta covers a run of consecutive versions,
+    from_version..version, with the events collapsed to the latest change per
+    entry. Clients apply a delta whose from_version follows the last version
+    they applied and resync from snapshot() on a gap, including the gap a
+    buffer lost with its process leaves behind. Events carry entry ids and
+    sparse position keys, never patient details:
+
+        {'event': 'joined', 'entry': {'id', 'position', 'priority', 'estimated_time'}}
+        {'event': 'called', 'entry': {'id'}}
+        {'event': 'left', 'entry': {'id', 'status'}}
+        {'event': 'moved', 'entry': {'id', 'position'}}
+        {'event': 'eta', 'entry': {'id', 'estimated_time'}}
+    """
+    GROUP = 'queue_{queue_id}'
+
+    def __init__(self):
+        # Daemon timers die with the process, so only long-lived servers
+        # buffer; everything else sends synchronously on commit
+        self.coalescing = False
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def coalesce_seconds(self):
+        return getattr(settings, 'QUEUE_BOARD_COALESCE_SECONDS', 0.25)
+
+    def group(self, queue_id):
+        return self.GROUP.format(queue_id=queue_id)
+
+    def version(self, queue_id):
+        from .models import QueueWorkload
+        return QueueWorkload.objects.filter(
+            queue_id=queue_id
+        ).values_list('board_version', flat=True).first() or 0
+
+    def stamp(self, queue_id):
+        """Take the queue's next version, or None if the queue no longer exists"""
+        from .models import Queue, QueueWorkload
+        if not QueueWorkload.objects.filter(queue_id=queue_id).update(board_version=F('board_version') + 1):
+            if not Queue.objects.filter(id=queue_id).exists():
+                return None
+            QueueWorkload.rebuild([queue_id])
+            QueueWorkload.objects.filter(queue_id=queue_id).update(board_version=F('board_version') + 1)
+        return self.version(queue_id)
+
+    def snapshot(self, queue_id):
+        """
+        Full board state. The version is read before the rows, so deltas
+        after it may repeat changes the rows already show; applying them
+        again is harmless since every event sets state.
+        """
+        from .models import QueueEntry
+        version = self.version(queue_id)
+        entries = QueueEntry.objects.filter(
+            queue_id=queue_id,
+            status__in=['waiting', 'in_progress']
+        ).select_related('patient').order_by('position')
+        waiting, called = [], []
+        for entry in entries:
+            if entry.status == 'waiting':
+                waiting.append(self.entry_payload(entry))
+            else:
+                called.append({'id': entry.id})
+        return {'queue_id': queue_id, 'version': version, 'waiting': waiting, 'called': called}
+
+    def entry_saved(self, entry, previous_state, previous_position, previous_eta):
+        """Publish the events for one entry's save, given its previously stored values"""
+        current_state = (entry.queue_id, entry.status)
+        if previous_state != current_state:
+            if previous_state and previous_state[1] == 'waiting':
+                if current_state == (previous_state[0], 'in_progress'):
+                    self.publish(previous_state[0], [self.event('called', id=entry.id)])
+                else:
+                    self.publish(previous_state[0], [self.event('left', id=entry.id, status=entry.status)])
+            if entry.status == 'waiting':
+                self.publish(entry.queue_id, [{'event': 'joined', 'entry': self.entry_payload(entry)}])
+        elif entry.status == 'waiting':
+            events = []
+            if entry.position != previous_position:
+                events.append(self.event('moved', id=entry.id, position=entry.position))
+            if entry.estimated_time != previous_eta:
+                events.append(self.event('eta', id=entry.id, estimated_time=self.timestamp(entry.estimated_time)))
+            self.publish(entry.queue_id, events)
+
+    def positions_changed(self, queue_id, positions):
+        """Publish 'moved' events for {entry_id: position} written in bulk"""
+        self.publish(queue_id, [
+            self.event('moved', id=entry_id, position=position)
+            for entry_id, position in positions.items()
+        ])
+
+    def publish(self, queue_id, events):
+        """Stamp the events with the queue's next version now and send them once committed"""
+        if not events or not get_channel_layer():
+            return
+        version = self.stamp(queue_id)
+        if version is not None:
+            transaction.on_commit(partial(self.enqueue, queue_id, version, events))
+
+    def enqueue(self, queue_id, version, events):
+        """Buffer committed events, flushing the queue after the coalescing window"""
+        window = self.coalesce_seconds if self.coalescing else 0
+        with self._lock:
+            self._pending.setdefault(queue_id, []).append((version, events))
+            if window > 0 and queue_id not in self._timers:
+                timer = threading.Timer(window, self.flush, [queue_id])
+                timer.daemon = True
+                self._timers[queue_id] = timer
+                timer.start()
+        if window <= 0:
+            self.flush(queue_id)
+
+    def flush(self, queue_id):
+        with self._lock:
+            batches = self._pending.pop(queue_id, [])
+            timer = self._timers.pop(queue_id, None)
+        if timer:
+            timer.cancel()
+        for from_version, version, events in self.runs(batches):
+            self.send(queue_id, from_version, version, events)
+
+    def send(self, queue_id, from_version, version, events):
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(self.group(queue_id), {
+                'type': 'queue_delta',
+                'queue_id': queue_id,
+                'from_version': from_version,
+                'version': version,
+                'events': events
+            })
+        except Exception as e:
+            logger.warning(f"Queue board push failed for queue {queue_id}: {e}")
+
+    @classmethod
+    def runs(cls, batches):
+        """
+        Split (version, events) batches into runs of consecutive versions,
+        each coalesced into one (from_version, version, events) delta. Commits
+        from other processes take versions in between, so a run never spans
+        a version this process did not publish.
+        """
+        runs = []
+        for version, events in sorted(batches, key=lambda batch: batch[0]):
+            if runs and version == runs[-1][1] + 1:
+                runs[-1][1] = version
+                runs[-1][2].extend(events)
+            else:
+                runs.append([version, version, list(events)])
+        return [(first, last, cls.coalesce(events)) for first, last, events in runs]
+
+    @staticmethod
+    def coalesce(events):
+        """
+        Collapse events to the latest change per entry. A join, call or leave
+        supersedes everything before it; moves and ETA changes fold into a
+        pending join or replace the previous change of their kind.
+        """
+        merged = {}
+        for event in events:
+            entry_id, name = event['entry']['id'], event['event']
+            event = {'event': name, 'entry': dict(event['entry'])}
+            if name in ('joined', 'called', 'left'):
+                for kind in ('joined', 'called', 'left', 'moved', 'eta'):
+                    merged.pop((entry_id, kind), None)
+            elif (entry_id, 'joined') in merged:
+                merged[(entry_id, 'joined')]['entry'].update(event['entry'])
+                continue
+            merged.pop((entry_id, name), None)
+            merged[(entry_id, name)] = event
+        return list(merged.values())
+
+    @staticmethod
+    def event(name, **entry):
+        return {'event': name, 'entry': entry}
+
+    @classmethod
+    def entry_payload(cls, entry):
+        return {
+            'id': entry.id,
+            'position': entry.position,
+            'priority': entry.patient.priority_level,
+            'estimated_time': cls.timestamp(entry.estimated_time)
+        }
+
+    @staticmethod
+    def timestamp(value):
+        return value.isoformat() if value else None
+
+queue_board = QueueBoard()
@@ -0,0 +1,55 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from urllib.parse import parse_qs
+from users.authentication import auth_user_cache
+from users.models import User
+from .board import queue_board
+from .models import Queue
+
+class QueueBoardConsumer(AsyncWebsocketConsumer):
+    """
+    Live board for one queue: joins the queue_<id> group and relays the
+    versioned deltas published by QueueBoard. Clients load
+    /api/queues/<id>/snapshot/ first and again whenever a version is
+    skipped. Requires a valid JWT access token.
+    """
+    async def connect(self):
+        self.queue_id = int(self.scope['url_route']['kwargs']['queue_id'])
+        query_params = parse_qs(self.scope['query_string'].decode())
+        token = query_params.get('token', [None])[0]
+        if not token or not await self.authorized(token):
+            await self.close()
+            return
+
+        self.group_name = queue_board.group(self.queue_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'queue_id': self.queue_id
+        }))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    # Receive coalesced, versioned deltas from the queue group
+    async def queue_delta(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'queue_delta',
+            'queue_id': event['queue_id'],
+            'from_version': event['from_version'],
+            'version': event['version'],
+            'events': event['events']
+        }))
+
+    @database_sync_to_async
+    def authorized(self, token):
+        try:
+            user = auth_user_cache.get(AccessToken(token)['user_id'])
+        except (TokenError, KeyError, User.DoesNotExist):
+            return False
+        return user.is_active and Queue.objects.filter(id=self.queue_id, is_active=True).exists()
@@ -0,0 +1,105 @@
+import logging
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class LiveQueueState:
+    """
+    Mirrors each queue's waiting list into a Redis sorted set scored by the
+    entry's sparse position key, so ordering, length and rank lookups are
+    O(log n) without touching the database. The database stays authoritative:
+    writes go through from the QueueEntry lifecycle and reconcile() repairs drift.
+    """
+    KEY = 'queue:{queue_id}:waiting'
+
+    def __init__(self, client):
+        self.client = client
+
+    def key(self, queue_id):
+        return self.KEY.format(queue_id=queue_id)
+
+    def sync_entry(self, entry_id, previous_state, current_state, position):
+        """Apply one entry's (queue_id, status) transition to the sorted sets"""
+        pipe = self.client.pipeline()
+        if previous_state and previous_state[1] == 'waiting' and previous_state != current_state:
+            pipe.zrem(self.key(previous_state[0]), entry_id)
+        if current_state[1] == 'waiting':
+            pipe.zadd(self.key(current_state[0]), {entry_id: position})
+        pipe.execute()
+
+    def remove_entry(self, queue_id, entry_id):
+        self.client.zrem(self.key(queue_id), entry_id)
+
+    def replace_queue(self, queue_id, positions):
+        """Atomically replace a queue's waiting set with {entry_id: position}"""
+        pipe = self.client.pipeline()
+        pipe.delete(self.key(queue_id))
+        if positions:
+            pipe.zadd(self.key(queue_id), positions)
+        pipe.execute()
+
+    def next_entry_id(self, queue_id):
+        ids = self.client.zrange(self.key(queue_id), 0, 0)
+        return int(ids[0]) if ids else None
+
+    def length(self, queue_id):
+        return self.client.zcard(self.key(queue_id))
+
+    def position(self, queue_id, entry_id):
+        """Dense 1..N place of an entry, or None if it is not waiting"""
+        rank = self.client.zrank(self.key(queue_id), entry_id)
+        return None if rank is None else rank + 1
+
+    def entries(self, queue_id):
+        return {int(entry_id): int(score) for entry_id, score in self.client.zrange(self.key(queue_id), 0, -1, withscores=True)}
+
+    def reconcile(self, queue_id, apply=True):
+        """
+        Compare a queue's sorted set with its waiting entries in the database.
+        Returns True if they differed (and were replaced when apply is set).
+        """
+        from .models import QueueEntry
+        expected = dict(QueueEntry.objects.filter(
+            queue_id=queue_id,
+            status='waiting'
+        ).values_list('id', 'position'))
+        if self.entries(queue_id) == expected:
+            return False
+        if apply:
+            self.replace_queue(queue_id, expected)
+        return True
+
+def write_through(method, *args):
+    """
+    Run a live-state write, logging instead of failing the request when Redis
+    is unavailable; reconcile_live_queues repairs the mirror afterwards.
+    """
+    try:
+        method(*args)
+    except redis.RedisError as e:
+        logger.warning(f"Live queue state write failed ({method.__name__}): {e}")
+
+def read_through(method, *args):
+    """Run a live-state read, returning None when Redis is unavailable"""
+    try:
+        return method(*args)
+    except redis.RedisError as e:
+        logger.warning(f"Live queue state read failed ({method.__name__}): {e}")
+        return None
+
+_live_state = None
+
+def configure_live_state(client):
+    """Install a Redis client (or None to disable) for the live queue state"""
+    global _live_state
+    _live_state = LiveQueueState(client) if client is not None else None
+
+def get_live_state():
+    """
+    Get the live queue state backend, or None when QUEUE_LIVE_STATE_REDIS_URL is unset.
+    """
+    global _live_state
+    if _live_state is None and getattr(settings, 'QUEUE_LIVE_STATE_REDIS_URL', None):
+        _live_state = LiveQueueState(redis.Redis.from_url(settings.QUEUE_LIVE_STATE_REDIS_URL))
+    return _live_state
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from queues.models import QueueWorkload
+
+class Command(BaseCommand):
+    help = 'Rebuild per-priority queue workload summaries from waiting queue entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', type=int, action='append', dest='queue_ids', help='Only rebuild this queue (repeatable)')
+        parser.add_argument('--check', action='store_true', help='Report drift without keeping the rebuilt summaries')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding queue workload summaries...')
+
+        with transaction.atomic():
+            results = QueueWorkload.rebuild(options['queue_ids'])
+            drifted = [(queue_id, before, workload) for queue_id, before, workload in results if before != workload.counts]
+            for queue_id, before, workload in drifted:
+                self.stdout.write(f'Queue {queue_id}: {before} -> {workload.counts}')
+            if options['check']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{len(results)} queue(s) checked, {len(drifted)} out of sync')
+        )
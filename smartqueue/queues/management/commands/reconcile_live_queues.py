@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from queues.models import Queue
+from queues.live_state import get_live_state
+
+class Command(BaseCommand):
+    help = 'Reconcile the Redis live queue state with waiting queue entries in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', type=int, action='append', dest='queue_ids', help='Only reconcile this queue (repeatable)')
+        parser.add_argument('--check', action='store_true', help='Report drift without rewriting the sorted sets')
+
+    def handle(self, *args, **options):
+        live_state = get_live_state()
+        if not live_state:
+            raise CommandError('Live queue state is not configured (set QUEUE_LIVE_STATE_REDIS_URL)')
+
+        queues = Queue.objects.all()
+        if options['queue_ids']:
+            queues = queues.filter(id__in=options['queue_ids'])
+
+        self.stdout.write('Reconciling live queue state...')
+        drifted = 0
+        for queue_id in queues.values_list('id', flat=True):
+            if live_state.reconcile(queue_id, apply=not options['check']):
+                drifted += 1
+                self.stdout.write(f'Queue {queue_id}: live state out of sync')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{queues.count()} queue(s) checked, {drifted} out of sync')
+        )
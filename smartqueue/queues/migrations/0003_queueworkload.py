@@ -0,0 +1,25 @@
+# Generated by Django 5.1.11 on 2026-10-17 22:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queues', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueWorkload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emergency_count', models.IntegerField(default=0)),
+                ('appointment_count', models.IntegerField(default=0)),
+                ('walk_in_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('queue', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='workload', to='queues.queue')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-17 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queues', '0003_queueworkload'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queueentry',
+            index=models.Index(fields=['queue', 'status', 'position'], name='queues_queu_queue_i_810015_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queues', '0004_queueentry_position_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queueworkload',
+            name='board_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
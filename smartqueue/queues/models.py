@@ -1,8 +1,21 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest, RowNumber
 from django.utils import timezone
-from django.db.models import Avg
+from functools import partial
 from hospital.models import Department
 from users.models import Patient
+from .board import queue_board
+from .live_state import get_live_state, read_through, write_through
+
+# Priority classes in calling order, with their relative consultation cost
+PRIORITY_ORDER = ['emergency', 'appointment', 'walk_in']
+PRIORITY_WEIGHTS = {'emergency': 0.7, 'appointment': 1.0, 'walk_in': 1.2}
+
+# QueueEntry.position is a sparse ordering key: entries are spaced POSITION_GAP
+# apart so front/back inserts touch a single row, and keys are renumbered once
+# they drift past POSITION_REBALANCE_LIMIT
+POSITION_GAP = 1024
+POSITION_REBALANCE_LIMIT = 2 ** 30
 
 class Queue(models.Model):
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='queues')
@@ -25,59 +38,81 @@ class Queue(models.Model):
     @property
     def current_length(self):
         # Count patients currently waiting in the queue
+        live_state = get_live_state()
+        if live_state:
+            length = read_through(live_state.length, self.id)
+            if length is not None:
+                return length
         return self.queueentry_set.filter(status='waiting').count()
 
     @property
     def estimated_wait_time(self):
         """
         Estimate wait time for the queue based on staff availability and patient priority.
+        Served from the per-queue shared cache maintained by WaitTimeService.
         """
-        waiting_entries = self.queueentry_set.filter(status='waiting').order_by('position')
-        if not waiting_entries.exists():
-            return 0
+        from .services import WaitTimeService
+        return WaitTimeService().estimate(self)
 
-        # Get available staff for this department
-        available_staff = self.department.staff_set.filter(
-            is_on_break=False,
-            shift_start__lte=timezone.now().time(),
-            shift_end__gte=timezone.now().time()
+    def reorder_queue(self):
+        """
+        Reorder queue entries by priority: Emergency > Appointment > Walk-in.
+        Positions are ranked in SQL (priority, then joined_at) and written back
+        in a single bulk update while the queue row is locked.
+        """
+        priority_rank = models.Case(
+            *[models.When(patient__priority_level=priority, then=rank) for rank, priority in enumerate(PRIORITY_ORDER)],
+            default=len(PRIORITY_ORDER),
+            output_field=models.IntegerField()
         )
-        if not available_staff.exists():
-            return 999  # No staff available
+        self._renumber_positions([priority_rank.asc(), models.F('joined_at').asc(), models.F('id').asc()])
 
-        staff_avg_time = available_staff.aggregate(
-            avg_time=Avg('avg_consultation_time')
-        )['avg_time'] or self.avg_processing_time
+    def rebalance_positions(self):
+        """
+        Respace waiting entries POSITION_GAP apart, keeping their current order.
+        """
+        self._renumber_positions([models.F('position').asc(), models.F('id').asc()])
 
-        priority_weights = {'emergency': 0.7, 'appointment': 1.0, 'walk_in': 1.2}
-        total_estimated_time = 0
-        staff_count = available_staff.count()
+    def _renumber_positions(self, order_by):
+        with transaction.atomic():
+            # Window functions cannot be combined with FOR UPDATE, so lock the queue instead
+            Queue.objects.select_for_update().get(pk=self.pk)
+            ranked = self.queueentry_set.filter(status='waiting').annotate(
+                rank=models.Window(RowNumber(), order_by=order_by)
+            ).values_list('id', 'position', 'rank')
+            ranked = list(ranked)
+            changed = [
+                QueueEntry(id=entry_id, position=rank * POSITION_GAP)
+                for entry_id, position, rank in ranked
+                if position != rank * POSITION_GAP
+            ]
+            QueueEntry.objects.bulk_update(changed, ['position'], batch_size=500)
+            queue_board.positions_changed(self.pk, {entry.id: entry.position for entry in changed})
+            live_state = get_live_state()
+            if live_state:
+                positions = {entry_id: rank * POSITION_GAP for entry_id, _, rank in ranked}
+                transaction.on_commit(partial(write_through, live_state.replace_queue, self.pk, positions))
 
-        for i, entry in enumerate(waiting_entries):
-            priority_weight = priority_weights.get(entry.patient.priority_level, 1.0)
-            processing_time = staff_avg_time * priority_weight
-            queue_position_factor = (i // staff_count) + 1
-            total_estimated_time += processing_time * queue_position_factor
+    def back_position(self):
+        """Sparse key placing a new entry behind every waiting entry"""
+        last_position = self.queueentry_set.filter(status='waiting').aggregate(models.Max('position'))['position__max']
+        return POSITION_GAP if last_position is None else last_position + POSITION_GAP
 
-        return int(total_estimated_time / staff_count)
-
-    def reorder_queue(self):
-        """
-        Reorder queue entries by priority: Emergency > Appointment > Walk-in.
-        """
-        entries = list(self.queueentry_set.filter(status='waiting').order_by('joined_at'))
-        emergency_entries = [e for e in entries if e.patient.priority_level == 'emergency']
-        appointment_entries = [e for e in entries if e.patient.priority_level == 'appointment']
-        walk_in_entries = [e for e in entries if e.patient.priority_level == 'walk_in']
-        reordered_entries = emergency_entries + appointment_entries + walk_in_entries
-        for i, entry in enumerate(reordered_entries, 1):
-            entry.position = i
-            entry.save(update_fields=['position'])
+    def front_position(self):
+        """Sparse key placing a new entry ahead of every waiting entry"""
+        first_position = self.queueentry_set.filter(status='waiting').aggregate(models.Min('position'))['position__min']
+        return POSITION_GAP if first_position is None else first_position - POSITION_GAP
 
     def get_next_patient(self):
         """
         Get the next patient to be called from the queue.
         """
+        live_state = get_live_state()
+        if live_state:
+            entry_id = read_through(live_state.next_entry_id, self.id)
+            entry = self.queueentry_set.filter(id=entry_id, status='waiting').first() if entry_id else None
+            if entry:
+                return entry
         return self.queueentry_set.filter(status='waiting').order_by('position').first()
 
 class QueueEntry(models.Model):
@@ -103,52 +138,108 @@ class QueueEntry(models.Model):
     consultation_start = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
 
+    # (queue_id, status) as last loaded from or written to the database
+    _loaded_state = None
+    # (position, estimated_time) as last loaded or written, for queue board diffs
+    _loaded_board = (None, None)
+    # Set when the entry is placed ahead of everyone else waiting
+    inserted_at_front = False
+
     class Meta:
         unique_together = ['patient', 'queue']
         ordering = ['position']
+        indexes = [
+            models.Index(fields=['queue', 'status', 'position']),
+        ]
 
     def __str__(self):
         return f"{self.patient.user.get_full_name()} in {self.queue.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_state = (loaded.get('queue_id'), loaded.get('status'))
+        instance._loaded_board = (loaded.get('position'), loaded.get('estimated_time'))
+        return instance
+
     def save(self, *args, **kwargs):
         # Assign position if not set
-        if not self.position:
+        if self.position is None:
             self.assign_position()
-        # Update estimated time if waiting
-        if self.status == 'waiting':
+        previous_state = self._loaded_state
+        current_state = (self.queue_id, self.status)
+        # Estimate call time only when the entry enters a queue's waiting list
+        if self.status == 'waiting' and previous_state != current_state:
             self.update_estimated_time()
         super().save(*args, **kwargs)
+        self._loaded_state = current_state
+        if previous_state != current_state:
+            QueueWorkload.apply_transition(previous_state, current_state, self.patient.priority_level)
+        queue_board.entry_saved(self, previous_state, *self._loaded_board)
+        self._loaded_board = (self.position, self.estimated_time)
+        live_state = get_live_state()
+        if live_state and (previous_state != current_state or self.status == 'waiting'):
+            transaction.on_commit(partial(
+                write_through, live_state.sync_entry, self.id, previous_state, current_state, self.position
+            ))
 
     def assign_position(self):
         """
         Assign position in queue based on patient priority.
         Emergency patients go to the front, others to the end.
         """
-        priority_order = {'emergency': 1, 'appointment': 2, 'walk_in': 3}
-        patient_priority = priority_order.get(self.patient.priority_level, 3)
         if self.patient.priority_level == 'emergency':
-            self.position = 1
-            # Shift other patients down
-            QueueEntry.objects.filter(
-                queue=self.queue,
-                status='waiting'
-            ).update(position=models.F('position') + 1)
+            self.position = self.queue.front_position()
+            self.inserted_at_front = True
         else:
-            last_position = QueueEntry.objects.filter(
-                queue=self.queue,
-                status='waiting'
-            ).aggregate(models.Max('position'))['position__max'] or 0
-            self.position = last_position + 1
+            self.position = self.queue.back_position()
+        if abs(self.position) > POSITION_REBALANCE_LIMIT:
+            self.queue.rebalance_positions()
+            self.assign_position()
+
+    @property
+    def queue_position(self):
+        """
+        Dense 1..N place among the queue's waiting entries, computed on read.
+        Uses the `waiting_rank` annotation when the queryset provides it.
+        """
+        if self.status != 'waiting':
+            return None
+        if 'waiting_rank' in self.__dict__:
+            return self.waiting_rank
+        live_state = get_live_state()
+        if live_state:
+            position = read_through(live_state.position, self.queue_id, self.id)
+            if position is not None:
+                return position
+        return QueueEntry.objects.filter(
+            queue_id=self.queue_id,
+            status='waiting',
+            position__lte=self.position
+        ).count()
+
+    @classmethod
+    def with_queue_position(cls, queryset):
+        """Annotate a queryset so queue_position needs no per-row query"""
+        return queryset.annotate(waiting_rank=models.Subquery(
+            cls.objects.filter(
+                queue_id=models.OuterRef('queue_id'),
+                status='waiting',
+                position__lte=models.OuterRef('position')
+            ).order_by().values('queue_id').annotate(count=models.Count('id')).values('count'),
+            output_field=models.IntegerField()
+        ))
 
     def update_estimated_time(self):
         """
-        Update estimated call time based on queue state and position.
+        Update estimated call time from the queue's workload summary; called
+        as the entry joins the waiting list, before it is counted there.
         """
         if self.status != 'waiting':
             return
-        queue_wait_time = self.queue.estimated_wait_time
-        position_factor = max(1, self.position - 1)
-        estimated_minutes = (queue_wait_time * position_factor) / max(1, self.queue.current_length)
+        from .services import WaitTimeService
+        estimated_minutes = WaitTimeService().entry_wait_time(self)
         self.estimated_time = timezone.now() + timezone.timedelta(minutes=estimated_minutes)
 
     def mark_no_show(self):
@@ -158,12 +249,6 @@ class QueueEntry(models.Model):
         self.status = 'no_show'
         self.completed_at = timezone.now()
         self.save()
-        # Shift remaining patients up
-        QueueEntry.objects.filter(
-            queue=self.queue,
-            status='waiting',
-            position__gt=self.position
-        ).update(position=models.F('position') - 1)
 
     def call_patient(self):
         """
@@ -198,13 +283,114 @@ class QueueEntry(models.Model):
         Return patient from lab and resume in queue (usually at front).
         """
         self.status = 'waiting'
-        self.position = 1
-        QueueEntry.objects.filter(
-            queue=self.queue,
-            status='waiting'
-        ).exclude(id=self.id).update(position=models.F('position') + 1)
+        self.position = self.queue.front_position()
+        self.inserted_at_front = True
         self.save()
 
+class QueueWorkload(models.Model):
+    """
+    Running per-priority count of waiting entries for a queue.
+    Adjusted on every waiting-list transition so summaries never rescan the
+    queue; joining entries read their ETA from it (WaitTimeService.entry_wait_time).
+    """
+    queue = models.OneToOneField(Queue, on_delete=models.CASCADE, related_name='workload')
+    emergency_count = models.IntegerField(default=0)
+    appointment_count = models.IntegerField(default=0)
+    walk_in_count = models.IntegerField(default=0)
+    # Last version stamped on the queue's live board deltas (see QueueBoard)
+    board_version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.queue.name} - {self.waiting_count} waiting"
+
+    @property
+    def counts(self):
+        return {priority: getattr(self, f'{priority}_count') for priority in PRIORITY_ORDER}
+
+    @property
+    def waiting_count(self):
+        return sum(self.counts.values())
+
+    @classmethod
+    def for_queue(cls, queue_id):
+        """Get the summary for a queue, building it from the entries if missing"""
+        workload = cls.objects.filter(queue_id=queue_id).first()
+        if workload is None:
+            workload = cls.rebuild([queue_id])[0][2]
+        return workload
+
+    @classmethod
+    def adjust(cls, queue_id, priority, delta):
+        """Atomically add delta to the waiting count of one priority"""
+        if priority not in PRIORITY_ORDER:
+            return
+        field = f'{priority}_count'
+        updated = cls.objects.filter(queue_id=queue_id).update(**{
+            field: Greatest(models.F(field) + delta, 0),
+            'updated_at': timezone.now(),
+        })
+        if not updated:
+            # First transition for this queue: the summary is built from the
+            # already-saved entries, so it includes this change
+            cls.rebuild([queue_id])
+
+    @classmethod
+    def reprioritize(cls, queue_id, previous_priority, priority):
+        """Move one waiting entry's weight between priority counts in a single update"""
+        changes = {}
+        if previous_priority in PRIORITY_ORDER:
+            field = f'{previous_priority}_count'
+            changes[field] = Greatest(models.F(field) - 1, 0)
+        if priority in PRIORITY_ORDER:
+            field = f'{priority}_count'
+            changes[field] = models.F(field) + 1
+        if not changes:
+            return
+        updated = cls.objects.filter(queue_id=queue_id).update(**changes, updated_at=timezone.now())
+        if not updated:
+            # Built from the entries, which already carry the new priority
+            cls.rebuild([queue_id])
+
+    @classmethod
+    def apply_transition(cls, previous_state, current_state, priority):
+        """Move an entry's weight between (queue_id, status) states"""
+        if previous_state and previous_state[1] == 'waiting':
+            cls.adjust(previous_state[0], priority, -1)
+        if current_state[1] == 'waiting':
+            cls.adjust(current_state[0], priority, 1)
+
+    @classmethod
+    def rebuild(cls, queue_ids=None):
+        """
+        Recount waiting entries per priority and overwrite the summaries.
+        Returns (queue_id, counts_before, workload) for every rebuilt queue.
+        """
+        queues = Queue.objects.all()
+        if queue_ids is not None:
+            queues = queues.filter(id__in=queue_ids)
+        queue_ids = list(queues.values_list('id', flat=True))
+        recounted = {queue_id: dict.fromkeys(PRIORITY_ORDER, 0) for queue_id in queue_ids}
+        rows = QueueEntry.objects.filter(
+            queue_id__in=queue_ids,
+            status='waiting'
+        ).order_by().values('queue_id', 'patient__priority_level').annotate(count=models.Count('id'))
+        for row in rows:
+            if row['patient__priority_level'] in PRIORITY_ORDER:
+                recounted[row['queue_id']][row['patient__priority_level']] = row['count']
+        existing = {workload.queue_id: workload for workload in cls.objects.filter(queue_id__in=queue_ids)}
+
+        results = []
+        for queue_id, counts in recounted.items():
+            workload = existing.get(queue_id)
+            before = workload.counts if workload else None
+            workload, _ = cls.objects.update_or_create(
+                queue_id=queue_id,
+                defaults={f'{priority}_count': count for priority, count in counts.items()}
+            )
+            results.append((queue_id, before, workload))
+        return results
+
 class QueueAnalytics(models.Model):
     queue = models.ForeignKey(Queue, on_delete=models.CASCADE)
     date = models.DateField(default=timezone.now)
@@ -0,0 +1,8 @@
+from django.urls import re_path
+from . import consumers
+
+# WebSocket routing for live queue boards
+websocket_urlpatterns = [
+    # Diff events for one queue's board
+    re_path(r'^ws/queues/(?P<queue_id>\d+)/$', consumers.QueueBoardConsumer.as_asgi()),
+]
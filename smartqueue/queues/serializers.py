@@ -47,7 +47,7 @@ class QueueEntrySerializer(serializers.ModelSerializer):
     patient = PatientSerializer(read_only=True)
     queue = QueueSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
-    position = serializers.IntegerField(read_only=True)
+    position = serializers.IntegerField(source='queue_position', read_only=True)
     joined_at = serializers.DateTimeField(read_only=True)
     called_at = serializers.DateTimeField(read_only=True)
     completed_at = serializers.DateTimeField(read_only=True)
@@ -80,7 +80,7 @@ class JoinQueueSerializer(serializers.Serializer):
 # Serializer for queue entry status and estimated wait
 class QueueStatusSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.user.username', read_only=True)
-    current_position = serializers.IntegerField(source='position', read_only=True)
+    current_position = serializers.IntegerField(source='queue_position', read_only=True)
     estimated_wait = serializers.SerializerMethodField()
 
     class Meta:
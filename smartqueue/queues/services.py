@@ -1,13 +1,201 @@
+import logging
+import threading
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
-from .models import Queue, QueueEntry, QueueAnalytics
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+from .models import Queue, QueueEntry, QueueAnalytics, QueueWorkload, PRIORITY_ORDER, PRIORITY_WEIGHTS
+from notifications.models import NotificationTemplate
 from notifications.services import NotificationService
-from hospital.models import Department
+from hospital.models import Department, Staff
+from smartqueue.db import write_locked_atomic
+from smartqueue.shared_cache import get_shared_cache
 import datetime
 
+logger = logging.getLogger(__name__)
+
+ACTIVE_ENTRY_STATUSES = ['waiting', 'in_progress', 'in_test']
+
+class QueueJoinError(Exception):
+    """Raised when a patient cannot be added to a queue"""
+
+class WaitTimeService:
+    """
+    Computes queue wait-time estimates from per-priority waiting counts and
+    on-shift staff stats, caching the result per queue in the shared cache.
+    Without a shared cache every estimate is computed from the database,
+    since other processes could not see invalidations.
+    """
+    CACHE_KEY = 'queue_wait_time:{queue_id}'
+    STAFF_STATS_CACHE_KEY = 'department_staff_stats:{department_id}'
+    NO_STAFF_WAIT_TIME = 999
+
+    def __init__(self):
+        self.timeout = getattr(settings, 'QUEUE_WAIT_TIME_CACHE_TIMEOUT', 60)
+        self.cache = get_shared_cache()
+
+    def cache_key(self, queue_id):
+        return self.CACHE_KEY.format(queue_id=queue_id)
+
+    def estimate(self, queue):
+        """Get the estimated wait time (minutes) for a single queue"""
+        return self.estimate_many([queue.id])[queue.id]
+
+    def estimate_many(self, queue_ids):
+        """
+        Get estimated wait times for several queues, keyed by queue id.
+        Cache misses are computed together in a single query.
+        """
+        queue_ids = list(queue_ids)
+        if self.cache is None:
+            return self.compute(queue_ids)
+        keys = {queue_id: self.cache_key(queue_id) for queue_id in queue_ids}
+        cached = self.cache.get_many(keys.values())
+        results = {}
+        missing = []
+        for queue_id in queue_ids:
+            value = cached.get(keys[queue_id])
+            if value is None:
+                missing.append(queue_id)
+            else:
+                results[queue_id] = value
+        if missing:
+            computed = self.compute(missing)
+            self.cache.set_many({keys[queue_id]: value for queue_id, value in computed.items()}, self.timeout)
+            results.update(computed)
+        return results
+
+    def compute(self, queue_ids):
+        """
+        Compute wait times for the given queues without touching the cache.
+        Waiting entries are counted per priority and joined to on-shift
+        staff count/average consultation time in one aggregated query.
+        """
+        on_shift_staff = self.on_shift_staff().filter(
+            department=OuterRef('department')
+        ).order_by().values('department')
+        priority_counts = {
+            f'{priority}_count': Count(
+                'queueentry',
+                filter=Q(queueentry__status='waiting', queueentry__patient__priority_level=priority)
+            )
+            for priority in PRIORITY_ORDER
+        }
+        rows = Queue.objects.filter(id__in=queue_ids).order_by().annotate(
+            staff_count=Subquery(on_shift_staff.annotate(count=Count('id')).values('count')),
+            staff_avg_time=Subquery(on_shift_staff.annotate(avg=Avg('avg_consultation_time')).values('avg')),
+            waiting_count=Count('queueentry', filter=Q(queueentry__status='waiting')),
+            **priority_counts
+        ).values('id', 'avg_processing_time', 'staff_count', 'staff_avg_time', 'waiting_count', *priority_counts)
+
+        return {row['id']: self.calculate_wait_time(row) for row in rows}
+
+    def calculate_wait_time(self, row):
+        """
+        Minutes until the waiting list is cleared, which is also the wait of
+        a patient joining at the back now.
+        """
+        if not row['waiting_count']:
+            return 0
+        counts = {priority: row[f'{priority}_count'] for priority in PRIORITY_ORDER}
+        other_count = row['waiting_count'] - sum(counts.values())
+        return self.wait_minutes(
+            self.weighted_load(counts) + other_count,
+            row['staff_count'],
+            row['staff_avg_time'] or row['avg_processing_time']
+        )
+
+    @staticmethod
+    def weighted_load(counts):
+        """Consultations owed for {priority: waiting count}, in average consultations"""
+        return sum(PRIORITY_WEIGHTS[priority] * count for priority, count in counts.items())
+
+    def wait_minutes(self, weighted_load, staff_count, staff_avg_time):
+        """
+        Each waiting entry costs its priority weight (1.0 for priorities
+        without one) times the average consultation time, and the on-shift
+        staff work through them in parallel.
+        """
+        if not staff_count:
+            return self.NO_STAFF_WAIT_TIME
+        return int(staff_avg_time * weighted_load / staff_count)
+
+    def on_shift_staff(self):
+        current_time = timezone.now().time()
+        return Staff.objects.filter(
+            is_on_break=False,
+            shift_start__lte=current_time,
+            shift_end__gte=current_time
+        )
+
+    def staff_stats(self, department_id):
+        """Get (staff_count, avg_consultation_time) of on-shift staff, cached per department"""
+        key = self.STAFF_STATS_CACHE_KEY.format(department_id=department_id)
+        stats = self.cache.get(key) if self.cache is not None else None
+        if stats is None:
+            aggregate = self.on_shift_staff().filter(department_id=department_id).aggregate(
+                count=Count('id'),
+                avg_time=Avg('avg_consultation_time')
+            )
+            stats = (aggregate['count'], aggregate['avg_time'])
+            if self.cache is not None:
+                self.cache.set(key, stats, self.timeout)
+        return stats
+
+    def entry_wait_time(self, entry):
+        """
+        Estimate minutes until an entry joining a queue's waiting list is
+        called. Everyone already waiting is ahead of it unless it was placed
+        at the front, so the load is read from the queue's QueueWorkload
+        counts in one lookup instead of scanning the entries ahead.
+        """
+        staff_count, staff_avg_time = self.staff_stats(entry.queue.department_id)
+        if not staff_count:
+            return self.NO_STAFF_WAIT_TIME
+        if entry.inserted_at_front:
+            return 0
+        workload = QueueWorkload.for_queue(entry.queue_id)
+        return self.wait_minutes(
+            self.weighted_load(workload.counts),
+            staff_count,
+            staff_avg_time or entry.queue.avg_processing_time
+        )
+
+    def invalidate(self, queue_ids):
+        """
+        Drop cached estimates for the given queues, now and again once the
+        transaction commits, in case another process cached pre-commit counts.
+        """
+        if self.cache is None:
+            return
+        keys = [self.cache_key(queue_id) for queue_id in queue_ids]
+        self.cache.delete_many(keys)
+        transaction.on_commit(partial(self.cache.delete_many, keys))
+
+    def invalidate_department(self, department_id):
+        """Drop cached estimates and staff stats for every queue in a department"""
+        if self.cache is None:
+            return
+        key = self.STAFF_STATS_CACHE_KEY.format(department_id=department_id)
+        self.cache.delete(key)
+        transaction.on_commit(partial(self.cache.delete, key))
+        self.invalidate(Queue.objects.filter(department_id=department_id).values_list('id', flat=True))
+
+
 class QueueManagementService:
+    NOTIFY_DEBOUNCE_KEY = 'queue_notify_debounce:{queue_id}'
+    NOTIFY_PENDING_KEY = 'queue_notify_pending:{queue_id}'
+    NOTIFIED_POSITION_KEY = 'queue_notified_position:{entry_id}'
+    NOTIFIED_POSITION_TIMEOUT = 60 * 60 * 12
+
     def __init__(self):
         self.notification_service = NotificationService()
+        # Debounce and dedup state must be seen by every process; the local
+        # cache only serves single-process setups
+        self.notify_cache = get_shared_cache() or cache
 
     def process_no_shows(self):
         """
@@ -19,32 +207,60 @@ class QueueManagementService:
             status='in_progress',
             called_at__lt=no_show_threshold,
             consultation_start__isnull=True
-        )
+        ).select_related('patient__user', 'queue')
+        users, contexts = [], []
         for entry in no_show_entries:
             entry.mark_no_show()
-            self.notification_service.create_and_send_notification(
-                user=entry.patient.user,
-                notification_type='queue_update',
-                title='Missed Appointment',
-                message=f'You missed your appointment at {entry.queue.name}. Please reschedule.',
-                channel='sms'
-            )
+            users.append(entry.patient.user)
+            contexts.append({'queue_name': entry.queue.name})
+        self.notification_service.broadcast(
+            users,
+            NotificationTemplate(
+                name='missed_appointment',
+                type='queue_update',
+                title_template='Missed Appointment',
+                message_template='You missed your appointment at {queue_name}. Please reschedule.'
+            ),
+            contexts=contexts,
+            channel='sms'
+        )
 
-    def send_queue_notifications(self):
+    def send_queue_notifications(self, queue=None):
         """
         Send notifications to patients about their queue status.
         Notifies patients who are next or second in line.
+        With a queue, only that queue is scanned, and at most one pass runs per
+        QUEUE_NOTIFICATION_DEBOUNCE_SECONDS: passes requested inside the window
+        are collapsed into one trailing pass when it closes, so the last state
+        of the queue is always notified. Patients are never re-notified about
+        a place in line they were already told about.
         """
-        upcoming_entries = QueueEntry.objects.filter(
-            status='waiting',
-            position__lte=2
-        ).select_related('patient__user', 'queue')
+        upcoming_entries = QueueEntry.objects.filter(status='waiting')
+        if queue is not None:
+            debounce = getattr(settings, 'QUEUE_NOTIFICATION_DEBOUNCE_SECONDS', 30)
+            if debounce > 0:
+                if not self.notify_cache.add(self.NOTIFY_DEBOUNCE_KEY.format(queue_id=queue.id), True, debounce):
+                    # Inside the window: leave it to the trailing pass
+                    self.notify_cache.set(self.NOTIFY_PENDING_KEY.format(queue_id=queue.id), True, debounce * 2)
+                    return
+                transaction.on_commit(partial(self.schedule_trailing_pass, queue.id, debounce))
+            upcoming_entries = upcoming_entries.filter(queue=queue)
+        upcoming_entries = list(upcoming_entries.annotate(
+            waiting_rank=Window(RowNumber(), partition_by=[F('queue_id')], order_by=F('position').asc())
+        ).filter(waiting_rank__lte=2).select_related('patient__user', 'queue'))
+
+        notified_keys = {entry.id: self.NOTIFIED_POSITION_KEY.format(entry_id=entry.id) for entry in upcoming_entries}
+        already_notified = self.notify_cache.get_many(notified_keys.values())
+        newly_notified = {}
         for entry in upcoming_entries:
-            if entry.position == 1:
+            key = notified_keys[entry.id]
+            if already_notified.get(key) == entry.waiting_rank:
+                continue
+            if entry.waiting_rank == 1:
                 message = f"You're next! Please be ready for {entry.queue.name}."
                 title = "You're Next!"
             else:
-                message = f"You're #{entry.position} in line for {entry.queue.name}. Estimated wait: {entry.queue.estimated_wait_time} minutes."
+                message = f"You're #{entry.waiting_rank} in line for {entry.queue.name}. Estimated wait: {entry.queue.estimated_wait_time} minutes."
                 title = "Queue Update"
             self.notification_service.create_and_send_notification(
                 user=entry.patient.user,
@@ -53,64 +269,129 @@ class QueueManagementService:
                 message=message,
                 channel='sms'
             )
+            newly_notified[key] = entry.waiting_rank
+        self.notify_cache.set_many(newly_notified, self.NOTIFIED_POSITION_TIMEOUT)
+
+    def schedule_trailing_pass(self, queue_id, delay):
+        """
+        Check for passes requested during a debounce window once it closes.
+        Only the process that opened the window schedules this.
+        """
+        timer = threading.Timer(delay, self._run_trailing_pass, [queue_id])
+        timer.daemon = True
+        timer.start()
+
+    def _run_trailing_pass(self, queue_id):
+        try:
+            self.trailing_notification_pass(queue_id)
+        except Exception:
+            logger.exception(f"Trailing notification pass failed for queue {queue_id}")
+        finally:
+            connections.close_all()
+
+    def trailing_notification_pass(self, queue_id):
+        """
+        Run one more pass for a queue whose debounce window has closed if any
+        pass was requested while it was open. The pass opens a new window.
+        Deleting the pending flag claims the pass, so when several processes
+        check at once only the one whose delete removed it runs.
+        """
+        if not self.notify_cache.delete(self.NOTIFY_PENDING_KEY.format(queue_id=queue_id)):
+            return
+        self.notify_cache.delete(self.NOTIFY_DEBOUNCE_KEY.format(queue_id=queue_id))
+        queue = Queue.objects.filter(id=queue_id, is_active=True).first()
+        if queue is not None:
+            self.send_queue_notifications(queue)
+
+    def join_queue(self, patient, queue_id, priority='walk_in', enforce_capacity=True):
+        """
+        Add a patient to a queue. The queue row is locked for the duration so
+        the duplicate check, capacity check and position assignment are
+        serialized against concurrent joins.
+        """
+        with write_locked_atomic():
+            queue = Queue.objects.select_for_update().get(id=queue_id, is_active=True)
+            if QueueEntry.objects.filter(patient=patient, queue=queue, status__in=ACTIVE_ENTRY_STATUSES).exists():
+                raise QueueJoinError('Already in this queue')
+            # Count in the database: the live mirror only catches up after commit
+            if enforce_capacity and queue.queueentry_set.filter(status='waiting').count() >= queue.max_capacity:
+                raise QueueJoinError('Queue is full')
+            if patient.priority_level != priority:
+                patient.priority_level = priority
+                patient.save()
+            try:
+                with transaction.atomic():
+                    entry = QueueEntry.objects.create(patient=patient, queue=queue)
+            except IntegrityError:
+                # Same patient joining twice at once, or a finished entry still on record
+                raise QueueJoinError('Already in this queue')
+        if priority == 'emergency':
+            self.notify_emergency(entry)
+        return entry
 
     def handle_emergency_patient(self, patient, queue):
         """
         Insert an emergency patient at the front of the queue and notify others.
+        Emergencies are admitted even when the queue is at capacity.
         """
-        entry = QueueEntry.objects.create(
-            patient=patient,
-            queue=queue,
-            position=1,
-            status='waiting'
-        )
-        # Shift other waiting patients down
-        QueueEntry.objects.filter(
-            queue=queue,
-            status='waiting'
-        ).exclude(id=entry.id).update(position=models.F('position') + 1)
+        return self.join_queue(patient, queue.id, priority='emergency', enforce_capacity=False)
+
+    def notify_emergency(self, entry):
+        """
+        Notify everyone else waiting in the queue about an emergency insert.
+        """
+        queue = entry.queue
         # Notify all waiting patients about the emergency
         waiting_entries = QueueEntry.objects.filter(
             queue=queue,
             status='waiting'
         ).exclude(id=entry.id).select_related('patient__user')
-        for waiting_entry in waiting_entries:
-            self.notification_service.create_and_send_notification(
-                user=waiting_entry.patient.user,
-                notification_type='delay_alert',
-                title='Emergency Patient Alert',
-                message=f'An emergency patient has been added to {queue.name}. Your wait time may be extended.',
-                channel='sms'
-            )
-        return entry
+        self.notification_service.broadcast(
+            [waiting_entry.patient.user for waiting_entry in waiting_entries],
+            NotificationTemplate(
+                name='emergency_patient_alert',
+                type='delay_alert',
+                title_template='Emergency Patient Alert',
+                message_template='An emergency patient has been added to {queue_name}. Your wait time may be extended.'
+            ),
+            context={'queue_name': queue.name},
+            channel='sms'
+        )
 
     def optimize_queue_distribution(self, department):
         """
         Distribute patients across multiple queues in a department for load balancing.
         Moves walk-in patients from overcrowded queues to the optimal queue.
         """
-        queues = Queue.objects.filter(department=department, is_active=True)
-        if not queues.exists():
+        queues = list(Queue.objects.filter(department=department, is_active=True))
+        if not queues:
             return
-        optimal_queue = min(queues, key=lambda q: q.estimated_wait_time)
+        wait_times = WaitTimeService().estimate_many(queue.id for queue in queues)
+        optimal_queue = min(queues, key=lambda q: wait_times[q.id])
+        moved_users = []
         for queue in queues:
             if queue.current_length > optimal_queue.current_length + 5:
                 patients_to_move = QueueEntry.objects.filter(
                     queue=queue,
                     status='waiting',
                     patient__priority_level='walk_in'
-                ).order_by('-position')[:2]
+                ).select_related('patient__user').order_by('-position')[:2]
                 for entry in patients_to_move:
                     entry.queue = optimal_queue
-                    entry.position = optimal_queue.current_length + 1
+                    entry.position = optimal_queue.back_position()
                     entry.save()
-                    self.notification_service.create_and_send_notification(
-                        user=entry.patient.user,
-                        notification_type='queue_update',
-                        title='Queue Changed',
-                        message=f'You have been moved to {optimal_queue.name} for faster service.',
-                        channel='sms'
-                    )
+                    moved_users.append(entry.patient.user)
+        self.notification_service.broadcast(
+            moved_users,
+            NotificationTemplate(
+                name='queue_changed',
+                type='queue_update',
+                title_template='Queue Changed',
+                message_template='You have been moved to {queue_name} for faster service.'
+            ),
+            context={'queue_name': optimal_queue.name},
+            channel='sms'
+        )
 
     def update_daily_analytics(self):
         """
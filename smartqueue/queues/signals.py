@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from functools import partial
+from .board import queue_board
+from .live_state import get_live_state, write_through
+from .models import Queue, QueueEntry, QueueWorkload
+from .services import WaitTimeService
+from hospital.models import Staff
+from users.models import Patient
+
+@receiver([post_save, post_delete], sender=Queue)
+def invalidate_queue_wait_time(sender, instance, **kwargs):
+    """Queue settings such as avg_processing_time feed into the estimate"""
+    WaitTimeService().invalidate([instance.id])
+
+@receiver([post_save, post_delete], sender=QueueEntry)
+def invalidate_entry_queue_wait_time(sender, instance, **kwargs):
+    """Joining, leaving or changing status alters the queue's workload"""
+    WaitTimeService().invalidate([instance.queue_id])
+
+@receiver(post_delete, sender=QueueEntry)
+def rebuild_entry_queue_workload(sender, instance, origin=None, **kwargs):
+    """Deletes bypass save(), so recount rather than adjust the summary"""
+    if instance.status == 'waiting':
+        QueueWorkload.rebuild([instance.queue_id])
+        live_state = get_live_state()
+        if live_state:
+            transaction.on_commit(partial(write_through, live_state.remove_entry, instance.queue_id, instance.id))
+        # A deleted queue's board goes with it; there is no version left to stamp
+        if not isinstance(origin, Queue):
+            queue_board.publish(instance.queue_id, [queue_board.event('left', id=instance.id, status='deleted')])
+
+@receiver([post_save, post_delete], sender=Staff)
+def invalidate_department_wait_times(sender, instance, **kwargs):
+    """Breaks, shifts and consultation times change every queue in the department"""
+    WaitTimeService().invalidate_department(instance.department_id)
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_priority(sender, instance, update_fields=None, **kwargs):
+    """Note the stored priority so post_save can tell whether it changed"""
+    instance._stored_priority_level = None
+    if instance.pk and (update_fields is None or 'priority_level' in update_fields):
+        instance._stored_priority_level = Patient.objects.filter(
+            pk=instance.pk
+        ).values_list('priority_level', flat=True).first()
+
+@receiver(post_save, sender=Patient)
+def reweight_patient_queues(sender, instance, **kwargs):
+    """
+    A priority change moves the patient's waiting entries between workload
+    counts and re-weights every queue they are waiting in. Queryset
+    updates bypass this; run rebuild_queue_workloads after those.
+    """
+    queue_ids = list(QueueEntry.objects.filter(
+        patient=instance,
+        status='waiting'
+    ).values_list('queue_id', flat=True))
+    previous_priority = getattr(instance, '_stored_priority_level', None)
+    if previous_priority and previous_priority != instance.priority_level:
+        for queue_id in queue_ids:
+            QueueWorkload.reprioritize(queue_id, previous_priority, instance.priority_level)
+    WaitTimeService().invalidate(queue_ids)
@@ -1,13 +1,57 @@
+import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import skipIf
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import TestCase
-from django.urls import reverse
-from .models import Queue, QueueEntry, QueueAnalytics
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from hospital.models import Department, Staff
+from notifications.models import Notification
+from smartqueue.routing import application
+from smartqueue.shared_cache import get_shared_cache
 from users.models import Patient
-from hospital.models import Department
-from django.contrib.auth import get_user_model
+from .board import queue_board
+from .live_state import configure_live_state, get_live_state
+from .models import Queue, QueueEntry, QueueAnalytics, QueueWorkload, POSITION_GAP
+from .services import WaitTimeService, QueueManagementService, QueueJoinError
 
 User = get_user_model()
 
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://shared-cache-test/0",
+        "OPTIONS": {"connection_class": fakeredis.FakeConnection if fakeredis else None},
+    },
+}
+
+def create_patient(i, priority="walk_in"):
+    user = User.objects.create_user(username=f"patient{i}", email=f"patient{i}@example.com", password="pass", role="patient")
+    return Patient.objects.create(user=user, medical_id=f"MED{i:05d}", priority_level=priority)
+
+def join(queue, i, priority="walk_in", **fields):
+    """Create patient number i and add them to the queue"""
+    return QueueEntry.objects.create(patient=create_patient(i, priority), queue=queue, **fields)
+
 class QueueModelTest(TestCase):
     def setUp(self):
         self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
@@ -36,8 +80,418 @@ class QueueAnalyticsModelTest(TestCase):
         self.assertEqual(analytics.queue.name, "Main Queue")
         self.assertEqual(analytics.total_patients, 10)
 
+@skipIf(fakeredis is None, "fakeredis not installed")
+@override_settings(CACHES=SHARED_CACHES)
+class WaitTimeServiceTest(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        for i in range(2):
+            doctor = User.objects.create_user(username=f"doctor{i}", email=f"doctor{i}@example.com", password="pass", role="doctor")
+            Staff.objects.create(
+                user=doctor, department=self.dept, role="doctor", license_number=f"LIC{i}",
+                shift_start="00:00", shift_end="23:59:59", avg_consultation_time=10
+            )
+        for i, priority in enumerate(["walk_in", "emergency", "walk_in"]):
+            join(self.queue, i, priority)
+        self.service = WaitTimeService()
+
+    def test_estimate_matches_priority_weighting(self):
+        # Weights [1.2, 0.7, 1.2] shared by 2 staff at 10 minutes
+        self.assertEqual(self.service.compute([self.queue.id])[self.queue.id], int(10 * (1.2 + 0.7 + 1.2) / 2))
+
+    def test_estimate_ignores_order_and_weighs_unknown_priorities_as_one(self):
+        emergency = QueueEntry.objects.get(queue=self.queue, patient__priority_level="emergency")
+        emergency.position = QueueEntry.objects.filter(queue=self.queue).order_by("-position")[0].position + POSITION_GAP
+        emergency.save()
+        self.assertEqual(self.service.compute([self.queue.id])[self.queue.id], int(10 * (1.2 + 1.2 + 0.7) / 2))
+        Patient.objects.filter(priority_level="emergency").update(priority_level="vip")
+        self.assertEqual(self.service.compute([self.queue.id])[self.queue.id], int(10 * (1.2 + 1.2 + 1.0) / 2))
+
+    def test_entry_wait_time_reads_the_workload_summary(self):
+        joining = QueueEntry(patient=create_patient(9), queue=self.queue)
+        self.service.staff_stats(self.dept.id)
+        # Behind all three waiting entries, over 2 staff at 10 minutes
+        with self.assertNumQueries(1):
+            self.assertEqual(self.service.entry_wait_time(joining), int(10 * (1.2 + 0.7 + 1.2) / 2))
+        joining.inserted_at_front = True
+        self.assertEqual(self.service.entry_wait_time(joining), 0)
+
+    def test_estimate_is_one_query_then_cached(self):
+        self.service.invalidate([self.queue.id])
+        with self.assertNumQueries(1):
+            first = self.queue.estimated_wait_time
+        with self.assertNumQueries(0):
+            self.assertEqual(self.queue.estimated_wait_time, first)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_without_shared_cache_estimates_are_computed_per_call(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.queue.estimated_wait_time, int(10 * (1.2 + 0.7 + 1.2) / 2))
+
+    def test_staff_change_invalidates_estimate(self):
+        self.queue.estimated_wait_time
+        for staff in Staff.objects.filter(department=self.dept):
+            staff.is_on_break = True
+            staff.save()
+        self.assertEqual(self.queue.estimated_wait_time, WaitTimeService.NO_STAFF_WAIT_TIME)
+
+class QueueWorkloadTest(TestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        self.entries = []
+        for i, priority in enumerate(["walk_in", "appointment", "walk_in"]):
+            self.entries.append(join(self.queue, i, priority))
+
+    def test_lifecycle_updates_summary(self):
+        workload = QueueWorkload.objects.get(queue=self.queue)
+        self.assertEqual(workload.counts, {"emergency": 0, "appointment": 1, "walk_in": 2})
+        entry = QueueEntry.objects.get(id=self.entries[0].id)
+        entry.call_patient()
+        entry.complete_consultation()
+        workload.refresh_from_db()
+        self.assertEqual(workload.counts, {"emergency": 0, "appointment": 1, "walk_in": 1})
+
+    def test_priority_change_moves_waiting_entry_between_counts(self):
+        patient = self.entries[0].patient
+        patient.priority_level = "emergency"
+        patient.save()
+        workload = QueueWorkload.objects.get(queue=self.queue)
+        self.assertEqual(workload.counts, {"emergency": 1, "appointment": 1, "walk_in": 1})
+        self.assertEqual(QueueWorkload.rebuild([self.queue.id])[0][1], workload.counts)
+
+    def test_rebuild_command_repairs_drift(self):
+        QueueWorkload.objects.filter(queue=self.queue).update(walk_in_count=7)
+        out = StringIO()
+        call_command("rebuild_queue_workloads", "--check", stdout=out)
+        self.assertIn("1 out of sync", out.getvalue())
+        self.assertEqual(QueueWorkload.objects.get(queue=self.queue).walk_in_count, 7)
+        call_command("rebuild_queue_workloads", stdout=StringIO())
+        self.assertEqual(QueueWorkload.objects.get(queue=self.queue).walk_in_count, 2)
+
+class QueueReorderTest(TestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        self.entries = []
+        for i, priority in enumerate(["walk_in", "appointment", "walk_in", "emergency", "appointment"] * 4):
+            self.entries.append(join(self.queue, i, priority, position=100 - i))
+
+    def test_reorder_ranks_by_priority_then_join_time(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.queue.reorder_queue()
+        self.assertLessEqual(len(queries), 6)
+        ordered = list(self.queue.queueentry_set.order_by('position').values_list('position', 'patient__priority_level', 'id'))
+        self.assertEqual([position for position, _, _ in ordered], [rank * POSITION_GAP for rank in range(1, 21)])
+        priorities = [priority for _, priority, _ in ordered]
+        self.assertEqual(priorities, ["emergency"] * 4 + ["appointment"] * 8 + ["walk_in"] * 8)
+        walk_in_ids = [entry_id for _, priority, entry_id in ordered if priority == "walk_in"]
+        self.assertEqual(walk_in_ids, sorted(walk_in_ids))
+
+class SparsePositionTest(TestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        self.entries = [join(self.queue, i) for i in range(3)]
+
+    def test_front_insert_leaves_other_rows_untouched(self):
+        before = dict(QueueEntry.objects.values_list('id', 'position'))
+        emergency = join(self.queue, 3, "emergency")
+        after = dict(QueueEntry.objects.exclude(id=emergency.id).values_list('id', 'position'))
+        self.assertEqual(before, after)
+        self.assertEqual(emergency.queue_position, 1)
+        self.assertEqual(self.queue.get_next_patient(), emergency)
+        self.assertEqual(QueueEntry.objects.get(id=self.entries[2].id).queue_position, 4)
+
+    def test_no_show_keeps_dense_positions(self):
+        self.entries[0].mark_no_show()
+        ranks = QueueEntry.with_queue_position(QueueEntry.objects.filter(queue=self.queue, status="waiting"))
+        self.assertEqual([entry.queue_position for entry in ranks], [1, 2])
+        self.assertIsNone(QueueEntry.objects.get(id=self.entries[0].id).queue_position)
+
+class ConcurrentJoinTest(TransactionTestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True, max_capacity=15)
+        self.patients = []
+        for i in range(20):
+            self.patients.append(create_patient(i, "emergency" if i % 5 == 0 else "walk_in"))
+
+    def try_join(self, patient):
+        try:
+            QueueManagementService().join_queue(patient, self.queue.id, patient.priority_level)
+            return "joined"
+        except QueueJoinError as e:
+            return str(e)
+        finally:
+            connection.close()
+
+    def test_concurrent_joins_respect_capacity_and_positions(self):
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(self.try_join, self.patients))
+        self.assertEqual(results.count("joined"), 15)
+        self.assertEqual(results.count("Queue is full"), 5)
+        positions = list(QueueEntry.objects.filter(queue=self.queue).values_list("position", flat=True))
+        self.assertEqual(len(positions), 15)
+        self.assertEqual(len(set(positions)), 15)
+
+    def test_emergency_admission_ignores_capacity(self):
+        for patient in self.patients[1:16]:
+            self.try_join(patient)
+        with self.assertRaisesMessage(QueueJoinError, "Queue is full"):
+            QueueManagementService().join_queue(self.patients[16], self.queue.id, "walk_in")
+        entry = QueueManagementService().handle_emergency_patient(self.patients[0], self.queue)
+        self.assertEqual(entry.queue_position, 1)
+        self.assertEqual(self.queue.current_length, 16)
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+class LiveQueueStateTest(TestCase):
+    def setUp(self):
+        configure_live_state(fakeredis.FakeRedis())
+        self.addCleanup(configure_live_state, None)
+        self.live_state = get_live_state()
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries = [join(self.queue, i, priority) for i, priority in enumerate(["walk_in", "walk_in", "emergency"])]
+
+    def test_lookups_are_served_from_sorted_set(self):
+        emergency = self.entries[2]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.queue.current_length, 3)
+            self.assertEqual(self.entries[1].queue_position, 3)
+        self.assertEqual(self.live_state.next_entry_id(self.queue.id), emergency.id)
+        self.assertEqual(self.queue.get_next_patient(), emergency)
+
+    def test_lifecycle_writes_through(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[2].call_patient()
+        self.assertEqual(self.live_state.next_entry_id(self.queue.id), self.entries[0].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue.reorder_queue()
+        self.assertEqual(self.live_state.length(self.queue.id), 2)
+        self.assertFalse(self.live_state.reconcile(self.queue.id, apply=False))
+
+    def test_reconcile_command_repairs_drift(self):
+        self.live_state.remove_entry(self.queue.id, self.entries[0].id)
+        out = StringIO()
+        call_command("reconcile_live_queues", "--check", stdout=out)
+        self.assertIn("1 out of sync", out.getvalue())
+        call_command("reconcile_live_queues", stdout=StringIO())
+        self.assertEqual(self.live_state.length(self.queue.id), 3)
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+@override_settings(CACHES=SHARED_CACHES)
+class QueueNotificationTest(TestCase):
+    def setUp(self):
+        get_shared_cache().clear()
+        self.service = QueueManagementService()
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        self.other_queue = Queue.objects.create(name="Other Queue", department=self.dept, is_active=True)
+        self.entries = [join(self.queue, i) for i in range(3)] + [join(self.other_queue, 3)]
+
+    def allow_next_pass(self):
+        get_shared_cache().delete(QueueManagementService.NOTIFY_DEBOUNCE_KEY.format(queue_id=self.queue.id))
+
+    def test_pass_is_scoped_debounced_and_deduplicated(self):
+        self.service.send_queue_notifications(self.queue)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(Notification.objects.filter(user=self.entries[3].patient.user).exists())
+        # Debounced burst, then an unchanged queue after the window
+        self.service.send_queue_notifications(self.queue)
+        self.allow_next_pass()
+        self.service.send_queue_notifications(self.queue)
+        self.assertEqual(Notification.objects.count(), 2)
+        # Only patients whose place changed are notified again
+        self.entries[0].call_patient()
+        self.allow_next_pass()
+        self.service.send_queue_notifications(self.queue)
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(Notification.objects.filter(user=self.entries[2].patient.user).count(), 1)
+
+    def test_pass_requested_inside_window_runs_when_it_closes(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service.send_queue_notifications(self.queue)
+        self.assertIn(
+            (self.queue.id, 30),
+            [callback.args for callback in callbacks if getattr(callback, "func", None) == self.service.schedule_trailing_pass]
+        )
+        # Two patients called within the window: the second pass is deferred
+        self.entries[0].call_patient()
+        self.service.send_queue_notifications(self.queue)
+        self.entries[1].call_patient()
+        self.service.send_queue_notifications(self.queue)
+        self.assertFalse(Notification.objects.filter(title="You're Next!", user=self.entries[2].patient.user).exists())
+        self.service.trailing_notification_pass(self.queue.id)
+        self.assertTrue(Notification.objects.filter(title="You're Next!", user=self.entries[2].patient.user).exists())
+        # Nothing was requested since, so the next window closes quietly
+        count = Notification.objects.count()
+        self.service.trailing_notification_pass(self.queue.id)
+        self.assertEqual(Notification.objects.count(), count)
+
+    def test_state_is_shared_and_one_process_runs_the_trailing_pass(self):
+        self.service.send_queue_notifications(self.queue)
+        # Another worker inside the same window defers to the trailing pass
+        other_worker = QueueManagementService()
+        self.entries[0].call_patient()
+        other_worker.send_queue_notifications(self.queue)
+        self.assertFalse(Notification.objects.filter(title="You're Next!", user=self.entries[1].patient.user).exists())
+        self.assertIsNone(cache.get(QueueManagementService.NOTIFY_DEBOUNCE_KEY.format(queue_id=self.queue.id)))
+        # Both workers check once the window closes; only one pass runs
+        self.service.trailing_notification_pass(self.queue.id)
+        other_worker.trailing_notification_pass(self.queue.id)
+        self.assertEqual(Notification.objects.filter(title="You're Next!", user=self.entries[1].patient.user).count(), 1)
+
+    def test_no_show_notices_name_each_queue(self):
+        patient = self.entries[0].patient
+        QueueEntry.objects.create(patient=patient, queue=self.other_queue)
+        QueueEntry.objects.filter(patient=patient).update(
+            status="in_progress", called_at=timezone.now() - datetime.timedelta(minutes=20)
+        )
+        self.service.process_no_shows()
+        messages = Notification.objects.filter(user=patient.user, title="Missed Appointment").values_list("message", flat=True)
+        self.assertEqual(sorted(messages), [
+            "You missed your appointment at Main Queue. Please reschedule.",
+            "You missed your appointment at Other Queue. Please reschedule.",
+        ])
+
+    def test_emergency_join_alerts_everyone_waiting(self):
+        patient = create_patient(99)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.join_queue(patient, self.queue.id, "emergency")
+        alerted = Notification.objects.filter(type="delay_alert", title="Emergency Patient Alert")
+        self.assertEqual(
+            set(alerted.values_list("user_id", flat=True)),
+            {entry.patient.user.id for entry in self.entries[:3]}
+        )
+        self.assertIn("Main Queue", alerted.first().message)
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    QUEUE_BOARD_COALESCE_SECONDS=0
+)
+class QueueBoardTest(TestCase):
+    def setUp(self):
+        self.dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=self.dept, is_active=True)
+        self.entries = [join(self.queue, i) for i in range(2)]
+        self.version = queue_board.version(self.queue.id)
+        self.channel_layer = get_channel_layer()
+        self.channel_name = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(queue_board.group(self.queue.id), self.channel_name)
+
+    def coalesce(self):
+        queue_board.coalescing = True
+        self.addCleanup(setattr, queue_board, "coalescing", False)
+
+    def received(self):
+        delta = async_to_sync(self.channel_layer.receive)(self.channel_name)
+        events = [(event["event"], event["entry"]["id"]) for event in delta["events"]]
+        return delta["from_version"] - self.version, delta["version"] - self.version, events
+
+    def test_lifecycle_publishes_diff_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            emergency = join(self.queue, 2, "emergency")
+        self.assertEqual(self.received(), (1, 1, [("joined", emergency.id)]))
+        with self.captureOnCommitCallbacks(execute=True):
+            emergency.call_patient()
+            self.entries[0].mark_no_show()
+            self.queue.rebalance_positions()
+        self.assertEqual(self.received(), (2, 2, [("called", emergency.id)]))
+        self.assertEqual(self.received(), (3, 3, [("left", self.entries[0].id)]))
+        self.assertEqual(self.received(), (4, 4, [("moved", self.entries[1].id)]))
+
+    @override_settings(QUEUE_BOARD_COALESCE_SECONDS=60)
+    def test_changes_within_window_are_coalesced(self):
+        self.coalesce()
+        with self.captureOnCommitCallbacks(execute=True):
+            emergency = join(self.queue, 2, "emergency")
+            self.queue.rebalance_positions()
+            self.entries[0].mark_no_show()
+        queue_board.flush(self.queue.id)
+        self.assertEqual(self.received(), (1, 3, [
+            ("joined", emergency.id), ("moved", self.entries[1].id), ("left", self.entries[0].id)
+        ]))
+
+    @override_settings(QUEUE_BOARD_COALESCE_SECONDS=60)
+    def test_versions_are_stamped_at_commit_and_gaps_split_deltas(self):
+        self.coalesce()
+        with self.captureOnCommitCallbacks(execute=True):
+            emergency = join(self.queue, 2, "emergency")
+        # Stamped with the change, so a buffer that is never flushed leaves a gap
+        self.assertEqual(queue_board.version(self.queue.id), self.version + 1)
+        # Another process publishes in between
+        QueueWorkload.objects.filter(queue=self.queue).update(board_version=F("board_version") + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[0].mark_no_show()
+        queue_board.flush(self.queue.id)
+        self.assertEqual(self.received(), (1, 1, [("joined", emergency.id)]))
+        self.assertEqual(self.received(), (3, 3, [("left", self.entries[0].id)]))
+
+    @override_settings(QUEUE_BOARD_COALESCE_SECONDS=60)
+    def test_processes_without_coalescing_send_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            emergency = join(self.queue, 2, "emergency")
+        self.assertEqual(self.received(), (1, 1, [("joined", emergency.id)]))
+
+    def test_rolled_back_changes_take_no_version(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            join(self.queue, 2, "emergency")
+            raise RuntimeError
+        self.assertEqual(queue_board.version(self.queue.id), self.version)
+
+    def test_snapshot_endpoint_returns_board_and_version(self):
+        QueueWorkload.objects.filter(queue=self.queue).update(board_version=7)
+        client = APIClient()
+        client.force_authenticate(user=self.entries[0].patient.user)
+        response = client.get(reverse("queue_snapshot", args=[self.queue.id]))
+        self.assertEqual(response.data["version"], 7)
+        self.assertEqual([entry["id"] for entry in response.data["waiting"]], [entry.id for entry in self.entries])
+        self.assertEqual(response.data["waiting"][0]["priority"], "walk_in")
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class QueueBoardConsumerTest(TransactionTestCase):
+    # database_sync_to_async closes the connection, so tests cannot run inside a transaction
+    def setUp(self):
+        dept = Department.objects.create(name="General", department_type="OPD", is_active=True)
+        self.queue = Queue.objects.create(name="Main Queue", department=dept, is_active=True)
+        user = User.objects.create_user(username="screen", email="screen@example.com", password="pass", role="staff")
+        self.token = AccessToken.for_user(user)
+
+    def websocket(self, query_string):
+        return ApplicationCommunicator(application, {
+            "type": "websocket",
+            "path": f"/ws/queues/{self.queue.id}/",
+            "query_string": query_string.encode(),
+            "headers": [],
+            "subprotocols": [],
+        })
+
+    async def test_consumer_relays_queue_group_events(self):
+        communicator = self.websocket(f"token={self.token}")
+        await communicator.send_input({"type": "websocket.connect"})
+        self.assertEqual((await communicator.receive_output())["type"], "websocket.accept")
+        self.assertEqual(json.loads((await communicator.receive_output())["text"])["type"], "connection_established")
+        await get_channel_layer().group_send(queue_board.group(self.queue.id), {
+            "type": "queue_delta", "queue_id": self.queue.id, "from_version": 1, "version": 1,
+            "events": [queue_board.event("moved", id=1, position=5)]
+        })
+        message = json.loads((await communicator.receive_output())["text"])
+        self.assertEqual(
+            (message["from_version"], message["version"], message["events"]),
+            (1, 1, [{"event": "moved", "entry": {"id": 1, "position": 5}}])
+        )
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+        denied = self.websocket("token=invalid")
+        await denied.send_input({"type": "websocket.connect"})
+        self.assertEqual((await denied.receive_output())["type"], "websocket.close")
+
 # Example API test (expand as needed)
-from rest_framework.test import APIClient
 class QueueAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -11,6 +11,9 @@ urlpatterns = [
     # Get estimated wait time for a queue
     path('wait-time/', views.get_wait_time, name='wait_time'),
 
+    # Live board state and delta version for resyncing WebSocket clients
+    path('<int:queue_id>/snapshot/', views.queue_snapshot, name='queue_snapshot'),
+
     # Get all queue entries for the current patient
     path('my-entries/', views.MyQueueEntriesView.as_view(), name='my_queue_entries'),
 
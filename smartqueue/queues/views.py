@@ -6,14 +6,19 @@ from .models import Queue, QueueEntry, QueueAnalytics
 from .serializers import (
     QueueSerializer, QueueEntrySerializer, JoinQueueSerializer, QueueAnalyticsSerializer
 )
-from .services import QueueManagementService
+from .board import queue_board
+from .services import QueueManagementService, QueueJoinError
 from .permissions import CanJoinQueue, CanManageQueue
 from .throttles import QueueJoinThrottle
+from users.authentication import auth_user_cache
 from users.models import Patient
-from hospital.models import Staff
 
 queue_service = QueueManagementService()
 
+def staff_department_id(user):
+    """The requesting staff member's department, served from the auth user cache"""
+    return auth_user_cache.get(user.id).staff_department_id
+
 class QueueListCreateView(generics.ListCreateAPIView):
     queryset = Queue.objects.filter(is_active=True)
     serializer_class = QueueSerializer
@@ -39,34 +44,13 @@ def join_queue(request):
         queue_id = serializer.validated_data['queue_id']
         priority = serializer.validated_data.get('priority', 'walk_in')
         try:
-            queue = Queue.objects.get(id=queue_id, is_active=True)
             patient = Patient.objects.get(user=request.user)
-            # Check if patient is already in this queue
-            existing_entry = QueueEntry.objects.filter(
-                patient=patient,
-                queue=queue,
-                status__in=['waiting', 'in_progress', 'in_test']
-            ).first()
-            if existing_entry:
-                return Response({'error': 'Already in this queue'}, status=status.HTTP_400_BAD_REQUEST)
-            # Check queue capacity
-            if queue.current_length >= queue.max_capacity:
-                return Response({'error': 'Queue is full'}, status=status.HTTP_400_BAD_REQUEST)
-            # Set patient priority if provided
-            if patient.priority_level != priority:
-                patient.priority_level = priority
-                patient.save()
-            # Use service for emergency
-            if priority == 'emergency':
-                entry = queue_service.handle_emergency_patient(patient, queue)
-            else:
-                entry = QueueEntry.objects.create(
-                    patient=patient,
-                    queue=queue
-                )
+            entry = queue_service.join_queue(patient, queue_id, priority)
             # Use service to send notifications
-            queue_service.send_queue_notifications()
+            queue_service.send_queue_notifications(entry.queue)
             return Response(QueueEntrySerializer(entry).data, status=status.HTTP_201_CREATED)
+        except QueueJoinError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Queue.DoesNotExist:
             return Response({'error': 'Queue not found'}, status=status.HTTP_404_NOT_FOUND)
         except Patient.DoesNotExist:
@@ -84,15 +68,27 @@ def get_wait_time(request):
         return Response({'error': 'queue_id required'}, status=status.HTTP_400_BAD_REQUEST)
     try:
         queue = Queue.objects.get(id=queue_id)
+        next_patient = queue.get_next_patient()
         return Response({
             'queue_id': queue.id,
             'estimated_wait_time': queue.estimated_wait_time,
             'current_length': queue.current_length,
-            'next_patient_eta': queue.get_next_patient().estimated_time if queue.get_next_patient() else None
+            'next_patient_eta': next_patient.estimated_time if next_patient else None
         })
     except Queue.DoesNotExist:
         return Response({'error': 'Queue not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def queue_snapshot(request, queue_id):
+    """
+    Full live board state for a queue plus its delta version, for clients
+    of ws/queues/<id>/ to (re)sync from.
+    """
+    if not Queue.objects.filter(id=queue_id, is_active=True).exists():
+        return Response({'error': 'Queue not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(queue_board.snapshot(queue_id))
+
 class MyQueueEntriesView(generics.ListAPIView):
     serializer_class = QueueEntrySerializer
     permission_classes = [IsAuthenticated, CanJoinQueue]
@@ -100,10 +96,10 @@ class MyQueueEntriesView(generics.ListAPIView):
     def get_queryset(self):
         try:
             patient = Patient.objects.get(user=self.request.user)
-            return QueueEntry.objects.filter(
+            return QueueEntry.with_queue_position(QueueEntry.objects.filter(
                 patient=patient,
                 status__in=['waiting', 'in_progress', 'in_test']
-            ).order_by('position')
+            )).order_by('position')
         except Patient.DoesNotExist:
             return QueueEntry.objects.none()
 
@@ -114,20 +110,20 @@ def call_next_patient(request, queue_id):
     Staff endpoint to call the next patient.
     Uses QueueManagementService for notifications.
     """
+    department_id = staff_department_id(request.user)
+    if department_id is None:
+        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-        staff = Staff.objects.get(user=request.user)
-        queue = Queue.objects.get(id=queue_id, department=staff.department)
+        queue = Queue.objects.get(id=queue_id, department_id=department_id)
         next_entry = queue.get_next_patient()
         if not next_entry:
             return Response({'message': 'No patients waiting'}, status=status.HTTP_200_OK)
         next_entry.call_patient()
-        queue_service.send_queue_notifications()
+        queue_service.send_queue_notifications(queue)
         return Response({
             'message': 'Patient called successfully',
             'patient': QueueEntrySerializer(next_entry).data
         })
-    except Staff.DoesNotExist:
-        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     except Queue.DoesNotExist:
         return Response({'error': 'Queue not found or access denied'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -138,18 +134,18 @@ def complete_consultation(request, entry_id):
     Staff endpoint to mark consultation as complete.
     Uses QueueManagementService for analytics update.
     """
+    department_id = staff_department_id(request.user)
+    if department_id is None:
+        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-        staff = Staff.objects.get(user=request.user)
         entry = QueueEntry.objects.get(
             id=entry_id,
-            queue__department=staff.department,
+            queue__department_id=department_id,
             status='in_progress'
         )
         entry.complete_consultation()
         queue_service.update_daily_analytics()
         return Response({'message': 'Consultation completed successfully'})
-    except Staff.DoesNotExist:
-        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     except QueueEntry.DoesNotExist:
         return Response({'error': 'Queue entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -160,18 +156,18 @@ def send_to_lab(request, entry_id):
     Staff endpoint to send patient to lab.
     Uses QueueManagementService for notifications.
     """
+    department_id = staff_department_id(request.user)
+    if department_id is None:
+        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-        staff = Staff.objects.get(user=request.user)
         entry = QueueEntry.objects.get(
             id=entry_id,
-            queue__department=staff.department,
+            queue__department_id=department_id,
             status='in_progress'
         )
         entry.send_to_lab()
-        queue_service.send_queue_notifications()
+        queue_service.send_queue_notifications(entry.queue)
         return Response({'message': 'Patient sent to lab successfully'})
-    except Staff.DoesNotExist:
-        return Response({'error': 'Staff profile not found'}, status=status.HTTP_404_NOT_FOUND)
     except QueueEntry.DoesNotExist:
         return Response({'error': 'Queue entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartqueue.settings')
 
 application = get_asgi_application()
+
+# Long-lived ASGI workers can hold live board deltas for the coalescing window
+from queues.board import queue_board  # noqa: E402
+
+queue_board.coalescing = True
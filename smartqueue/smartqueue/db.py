@@ -0,0 +1,26 @@
+from contextlib import contextmanager
+from django.db import transaction
+
+@contextmanager
+def write_locked_atomic():
+    """
+    transaction.atomic() that on SQLite starts with BEGIN IMMEDIATE, taking
+    the database write lock up front so concurrent callers wait on the busy
+    timeout instead of failing to upgrade a read lock (SQLite ignores
+    select_for_update). Other backends, and blocks nested in an existing
+    transaction, get a plain atomic().
+    """
+    connection = transaction.get_connection()
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection.ensure_connection()
+    transaction_mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic():
+            connection.transaction_mode = transaction_mode
+            yield
+    finally:
+        connection.transaction_mode = transaction_mode
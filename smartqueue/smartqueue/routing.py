@@ -1,11 +1,12 @@
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
-from notifications.routing import websocket_urlpatterns
+from notifications.routing import websocket_urlpatterns as notification_urlpatterns
+from queues.routing import websocket_urlpatterns as queue_urlpatterns
 
 application = ProtocolTypeRouter({
     'websocket': AuthMiddlewareStack(
         URLRouter(
-            websocket_urlpatterns
+            notification_urlpatterns + queue_urlpatterns
         )
     ),
 })
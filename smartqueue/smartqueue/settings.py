@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'notifications.audit.audit_log_middleware',
 ]
 
 ROOT_URLCONF = 'smartqueue.urls'
@@ -97,9 +98,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds to wait for SQLite's write lock; queue joins and notification
+            # claims take it up front (smartqueue.db.write_locked_atomic) and
+            # queue behind each other
+            'timeout': 20,
+        },
+        'TEST': {
+            # File-backed so threaded concurrency tests get real SQLite locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# 'default' is local to each process. 'shared' (Redis via django-redis) holds state
+# every process must agree on: unread counters, authenticated users, notification
+# preferences. Without SHARED_CACHE_URL those are read from the database.
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if SHARED_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': SHARED_CACHE_URL,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -152,7 +180,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'  # Default auto field for m
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # Use JWT for authentication
+        'users.authentication.CachedJWTAuthentication',  # JWT, with auth fields cached in the shared cache
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
@@ -196,6 +224,67 @@ CORS_ALLOW_CREDENTIALS = True
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+# Public URL of this API, used for provider status callbacks
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8000')
+
+# SMS provider used by every NotificationService in the process. The Twilio
+# transport keeps one pooled keep-alive session (pool_size connections);
+# rate_limit is sends per second. notifications.sms.FakeSMSTransport records
+# messages in memory for tests and load runs.
+SMS_TRANSPORT = {
+    'BACKEND': os.environ.get('SMS_TRANSPORT_BACKEND', 'notifications.sms.TwilioTransport'),
+    'OPTIONS': {
+        'rate_limit': 10,
+    },
+}
+
+# Queue wait-time estimates are cached per queue in the shared cache and invalidated
+# on entry/staff changes; the timeout bounds staleness from staff shifts starting or
+# ending
+QUEUE_WAIT_TIME_CACHE_TIMEOUT = 60  # seconds
+
+# Optional Redis mirror of each queue's waiting list (sorted sets) serving next-patient,
+# length and position lookups; leave unset to read everything from the database
+QUEUE_LIVE_STATE_REDIS_URL = os.environ.get('QUEUE_LIVE_STATE_REDIS_URL')
+
+# At most one "you're next" notification pass per queue within this window
+QUEUE_NOTIFICATION_DEBOUNCE_SECONDS = 30
+
+# ASGI workers collect live queue board changes per queue for this long and send
+# them as one versioned delta (0 sends each commit's changes immediately; other
+# processes always do)
+QUEUE_BOARD_COALESCE_SECONDS = 0.25
+
+# 'immediate' sends notifications inside the request; 'outbox' only stores them
+# for the dispatch_notifications worker
+NOTIFICATION_DELIVERY_MODE = os.environ.get('NOTIFICATION_DELIVERY_MODE', 'immediate')
+
+# Notification preferences are cached per process (LRU with a TTL); with SHARED and
+# the shared cache configured they are also kept there, version-stamped so that
+# invalidations reach every process at once
+NOTIFICATION_PREFERENCE_CACHE_SIZE = 1024
+NOTIFICATION_PREFERENCE_CACHE_TIMEOUT = 300  # seconds
+NOTIFICATION_PREFERENCE_CACHE_SHARED = True
+
+# Seconds the shared cache keeps a user's role, activity flags and profile ids
+# for token authentication (version-stamped, so saves take effect at once)
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Active notification templates are held in memory per process and reloaded
+# after an admin save or this many seconds
+NOTIFICATION_TEMPLATE_CACHE_TIMEOUT = 300
+
+# Per-user unread notification counters live in the shared cache and are adjusted
+# on create/read; the timeout bounds drift between reconcile_unread_counts runs
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = 60 * 60 * 24  # seconds
+
+# Concurrent sends per channel for each dispatch_notifications process
+NOTIFICATION_DISPATCH_CONCURRENCY = {
+    'sms': 4,
+    'email': 4,
+    'websocket': 8,
+    'push': 8,
+}
 
 # Logging Configuration for Security Monitoring
 LOGGING = {
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+SHARED_CACHE_ALIAS = 'shared'
+
+def get_shared_cache():
+    """
+    The cache every process reads and writes (CACHES['shared']), for state
+    they must agree on. Returns None when it is not configured or is local
+    to the process, and callers then go to the database instead.
+    """
+    if SHARED_CACHE_ALIAS not in settings.CACHES:
+        return None
+    shared = caches[SHARED_CACHE_ALIAS]
+    if isinstance(shared, (LocMemCache, DummyCache)):
+        return None
+    return shared
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from smartqueue.shared_cache import get_shared_cache
+from .models import User
+
+class AuthUserCache:
+    """
+    The user fields that authentication and permission checks read (id,
+    role, is_active, is_staff, is_superuser) and the profile ids (patient_id,
+    staff_id, staff_department_id), cached by user id in the shared cache so
+    authenticating a request costs no queries in steady state. Other fields,
+    the password hash among them, are never cached; served users load them
+    from the database on first access. Each user has a version stamp there,
+    bumped by invalidate() when the user or one of their profiles is saved or
+    deleted; queryset .update() calls bypass those signals, so callers must
+    invalidate() the affected users themselves. Without a shared cache every
+    call loads from the database.
+    """
+    CACHE_KEY = 'auth_user:{user_id}'
+    VERSION_KEY = 'auth_user_version:{user_id}'
+    FIELDS = ('id', 'role', 'is_active', 'is_staff', 'is_superuser')
+    PROFILE_FIELDS = ('patient_id', 'staff_id', 'staff_department_id')
+
+    def key(self, user_id):
+        return self.CACHE_KEY.format(user_id=user_id)
+
+    def version_key(self, user_id):
+        return self.VERSION_KEY.format(user_id=user_id)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+
+    def get(self, user_id):
+        """User with the cached fields and profile ids; raises User.DoesNotExist"""
+        shared = get_shared_cache()
+        if shared is None:
+            return self.load(user_id)
+        stored = shared.get_many([self.key(user_id), self.version_key(user_id)])
+        version = stored.get(self.version_key(user_id), 0)
+        entry = stored.get(self.key(user_id))
+        if entry is not None and entry[0] == version:
+            return self.build(entry[1])
+        user = self.load(user_id)
+        # Stamped with the version read before loading, so an invalidate() in between wins
+        shared.set(self.key(user_id), (version, {
+            name: getattr(user, name) for name in self.FIELDS + self.PROFILE_FIELDS
+        }), self.timeout)
+        return user
+
+    def load(self, user_id):
+        from hospital.models import Staff
+        staff = Staff.objects.filter(user_id=OuterRef('pk')).order_by('id')
+        return User.objects.annotate(
+            patient_id=F('patient_profile__id'),
+            staff_id=Subquery(staff.values('id')[:1]),
+            staff_department_id=Subquery(staff.values('department_id')[:1])
+        ).get(pk=user_id)
+
+    def build(self, fields):
+        """A User from cached fields, the rest deferred"""
+        concrete = [field.attname for field in User._meta.concrete_fields if field.attname in self.FIELDS]
+        user = User.from_db(User.objects.db, concrete, [fields[name] for name in concrete])
+        for name in self.PROFILE_FIELDS:
+            setattr(user, name, fields[name])
+        return user
+
+    def invalidate(self, user_id):
+        shared = get_shared_cache()
+        if shared is not None:
+            version_key = self.version_key(user_id)
+            shared.add(version_key, 0, None)
+            shared.incr(version_key)
+            shared.delete(self.key(user_id))
+
+auth_user_cache = AuthUserCache()
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves the token's user from AuthUserCache"""
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = auth_user_cache.get(user_id)
+        except User.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from functools import partial
+from hospital.models import Staff
+from .authentication import auth_user_cache
+from .models import User, Patient
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Role and activity changes must reach token authentication in every process"""
+    transaction.on_commit(partial(auth_user_cache.invalidate, instance.id))
+
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=Staff)
+def invalidate_cached_user_profiles(sender, instance, **kwargs):
+    """The cached user carries its patient and staff profile ids"""
+    transaction.on_commit(partial(auth_user_cache.invalidate, instance.user_id))
@@ -1,7 +1,26 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from unittest import skipIf
 from django.urls import reverse
-from rest_framework.test import APIClient
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from hospital.models import Department, Staff
+from smartqueue.shared_cache import get_shared_cache
+from .authentication import CachedJWTAuthentication, auth_user_cache
 from .models import User, Patient
+try:
+	import fakeredis
+except ImportError:
+	fakeredis = None
+
+SHARED_CACHES = {
+	"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+	"shared": {
+		"BACKEND": "django.core.cache.backends.redis.RedisCache",
+		"LOCATION": "redis://shared-cache-test/0",
+		"OPTIONS": {"connection_class": fakeredis.FakeConnection if fakeredis else None},
+	},
+}
 
 class UserModelTest(TestCase):
 	def test_create_user(self):
@@ -66,3 +85,49 @@ class UserAPITest(TestCase):
 		resp = self.client.get(profile_url)
 		self.assertEqual(resp.status_code, 200)
 		self.assertIn("pat@example.com", str(resp.content))
+
+@skipIf(fakeredis is None, "fakeredis not installed")
+@override_settings(CACHES=SHARED_CACHES)
+class CachedJWTAuthenticationTest(TestCase):
+	def setUp(self):
+		get_shared_cache().clear()
+		self.user = User.objects.create_user(username="nurse", email="nurse@example.com", password="pass", role="nurse")
+		self.department = Department.objects.create(name="General", department_type="OPD", is_active=True)
+		self.request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+	def authenticate(self):
+		return CachedJWTAuthentication().authenticate(self.request)[0]
+
+	def test_user_and_profile_ids_are_cached_until_saved(self):
+		self.assertIsNone(self.authenticate().staff_department_id)
+		with self.assertNumQueries(0):
+			self.assertEqual(self.authenticate(), self.user)
+		with self.captureOnCommitCallbacks(execute=True):
+			Staff.objects.create(user=self.user, department=self.department, role="nurse", license_number="LIC1", shift_start="08:00", shift_end="16:00")
+		self.assertEqual(self.authenticate().staff_department_id, self.department.id)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.is_active = False
+			self.user.save()
+		with self.assertRaises(AuthenticationFailed):
+			self.authenticate()
+
+	def test_password_hash_is_never_cached(self):
+		self.authenticate()
+		version, fields = get_shared_cache().get(auth_user_cache.key(self.user.id))
+		self.assertNotIn("password", fields)
+		user = self.authenticate()
+		with self.assertNumQueries(1):
+			self.assertEqual(user.password, self.user.password)
+
+	def test_queryset_updates_need_an_explicit_invalidate(self):
+		self.authenticate()
+		User.objects.filter(id=self.user.id).update(role="doctor")
+		self.assertEqual(self.authenticate().role, "nurse")
+		auth_user_cache.invalidate(self.user.id)
+		self.assertEqual(self.authenticate().role, "doctor")
+
+	@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+	def test_without_shared_cache_users_load_from_database(self):
+		self.authenticate()
+		with self.assertNumQueries(1):
+			self.assertEqual(self.authenticate(), self.user)